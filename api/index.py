@@ -1,5 +1,6 @@
 import sys
 import os
+import logging
 
 # Agregar el directorio padre al path para importar módulos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -7,76 +8,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app
 from models import db
 
-# Crear la aplicación Flask para producción
-app = create_app('production')
+# Arranque rápido: sin Flask-Migrate ni consultas a la base al importar. El esquema
+# se crea o actualiza en un paso explícito (flask --app app db upgrade, o
+# init_vercel_db.py), no en cada arranque en frío.
+app = create_app('serverless')
 
-# Debug: Imprimir variables de entorno importantes
-print(f"[DEBUG] FLASK_ENV: {os.environ.get('FLASK_ENV', 'Not set')}")
-print(f"[DEBUG] SECRET_KEY: {'Set' if os.environ.get('SECRET_KEY') else 'Not set'}")
-print(f"[DEBUG] POSTGRES_URL: {'Set' if os.environ.get('POSTGRES_URL') else 'Not set'}")
-print(f"[DEBUG] DATABASE_URL: {'Set' if os.environ.get('DATABASE_URL') else 'Not set'}")
-print(f"[DEBUG] POSTGRES_DATABASE: {'Set' if os.environ.get('POSTGRES_DATABASE') else 'Not set'}")
-print(f"[DEBUG] POSTGRES_PRISMA_URL: {'Set' if os.environ.get('POSTGRES_PRISMA_URL') else 'Not set'}")
-print(f"[DEBUG] POSTGRES_URL_NON_POOLING: {'Set' if os.environ.get('POSTGRES_URL_NON_POOLING') else 'Not set'}")
+logger = logging.getLogger('minicrm.api')
 
-# Mostrar la URL de base de datos que se está usando (sin credenciales)
-db_url = (
-    os.environ.get('POSTGRES_URL') or 
-    os.environ.get('DATABASE_URL') or 
-    os.environ.get('POSTGRES_DATABASE') or
-    os.environ.get('POSTGRES_PRISMA_URL') or
-    'fallback'
-)
+# Variables de entorno importantes (solo con LOG_LEVEL=DEBUG)
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug('Entorno', extra={'campos': {
+        'FLASK_ENV': os.environ.get('FLASK_ENV', 'Not set'),
+        **{nombre: 'Set' if os.environ.get(nombre) else 'Not set'
+           for nombre in ('SECRET_KEY', 'POSTGRES_URL', 'DATABASE_URL', 'POSTGRES_DATABASE',
+                          'POSTGRES_PRISMA_URL', 'POSTGRES_URL_NON_POOLING')}
+    }})
 
-if db_url != 'fallback':
-    # Ocultar credenciales para logging seguro
-    safe_url = db_url.split('@')[1] if '@' in db_url else db_url
-    print(f"[DEBUG] Using database: {safe_url}")
-    
-    # Verificar si es Vercel Postgres
-    if 'vercel-storage.com' in db_url:
-        print("[DEBUG] Detected Vercel Postgres - SSL required")
-        if 'sslmode' not in db_url:
-            print("[DEBUG] Adding SSL mode to database URL")
-    else:
-        print("[DEBUG] Not Vercel Postgres - standard connection")
-else:
-    print("[DEBUG] Using fallback database URL")
-
-# Inicializar la base de datos si no existe
-with app.app_context():
-    try:
-        # Verificar si las tablas existen
-        inspector = db.inspect(db.engine)
-        existing_tables = inspector.get_table_names()
-        print(f"[DEBUG] Existing tables: {existing_tables}")
-        
-        if not existing_tables or 'users' not in existing_tables:
-            print("[DEBUG] Creating database tables...")
-            db.create_all()
-            print("[DEBUG] Database tables created successfully")
-            
-            # Crear usuario de prueba si no existe
-            from models import User
-            test_user = User.query.filter_by(email="crettinocristian@gmail.com").first()
-            if not test_user:
-                print("[DEBUG] Creating test user...")
-                test_user = User(nombre="Cristian Crettino", email="crettinocristian@gmail.com")
-                test_user.set_password("123456")
-                db.session.add(test_user)
-                db.session.commit()
-                print("[DEBUG] Test user created successfully")
-        else:
-            print("[DEBUG] Database tables already exist")
-            
-    except Exception as e:
-        print(f"[DEBUG] Error inicializando base de datos: {e}")
-        # Intentar crear las tablas de todas formas
-        try:
-            db.create_all()
-            print("[DEBUG] Tables created after error")
-        except Exception as e2:
-            print(f"[DEBUG] Failed to create tables: {e2}")
+if not any(os.environ.get(nombre) for nombre in ('POSTGRES_URL', 'DATABASE_URL', 'POSTGRES_DATABASE',
+                                                  'POSTGRES_PRISMA_URL')):
+    logger.warning('Sin URL de base de datos configurada: usando la de respaldo')
 
 # Agregar endpoint de prueba para verificar que la aplicación funciona
 @app.route('/test')
@@ -94,17 +44,18 @@ def test_endpoint():
 # Agregar endpoint para verificar la base de datos
 @app.route('/test-db')
 def test_db_endpoint():
-    """Endpoint para probar la conexión a la base de datos"""
+    """Endpoint para probar la conexión a la base de datos (y ver si falta el esquema)"""
+    from models import User
     try:
         # Verificar conexión a la base de datos
         inspector = db.inspect(db.engine)
         tables = inspector.get_table_names()
-        
+
         # Contar usuarios
         user_count = 0
         if 'users' in tables:
             user_count = User.query.count()
-        
+
         return {
             "status": "success",
             "message": "Base de datos conectada",
@@ -113,4 +64,4 @@ def test_db_endpoint():
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}, 500
-# Vercel necesita que la aplicación se exporte directamente
\ No newline at end of file
+# Vercel necesita que la aplicación se exporte directamente
@@ -1,18 +1,30 @@
+import logging
 from flask import Flask
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from datetime import datetime
 from config import config
-from models import db, User
+from models import db
+from utils.cache import cache
+from utils.perfilador import perfilador
+from utils.sesion import cargar_principal
+from utils.registro import configurar_logging
 
 def create_app(config_name='development'):
     """Factory function para crear la aplicación Flask"""
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    configurar_logging(app)
+    logging.getLogger('minicrm.config').info('Base de datos: %s (pool: %s)', app.config.get('PROVEEDOR_BD'),
+                                             app.config.get('DB_POOL_PROFILE'))
     
     # Inicializar extensiones
     db.init_app(app)
-    migrate = Migrate(app, db)
+    cache.init_app(app)
+    perfilador.init_app(app)
+    if not app.config.get('FAST_START'):
+        # alembic tarda ~150 ms en importarse y solo lo usan los comandos `flask db`
+        from flask_migrate import Migrate
+        Migrate(app, db)
     
     # Configurar Flask-Login
     login_manager = LoginManager()
@@ -20,10 +32,13 @@ def create_app(config_name='development'):
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
     login_manager.login_message_category = 'info'
+    # La API responde 401 en JSON en lugar de redirigir al formulario de login
+    login_manager.blueprint_login_views['api'] = None
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Principal cacheado con id, nombre y activo; no carga la fila completa
+        return cargar_principal(user_id)
     
     # Filtros personalizados de Jinja2
     @app.template_filter('nl2br')
@@ -39,16 +54,39 @@ def create_app(config_name='development'):
         """Devuelve la fecha y hora actual"""
         return datetime.now()
     
+    @app.template_global()
+    def seguimiento_pendientes():
+        """Texto del contador de contactos sin seguimiento del menú (cacheado), o None"""
+        from flask_login import current_user
+        from utils.seguimiento import pendientes, texto_pendientes
+        return texto_pendientes(pendientes(current_user.id))
+    
     # Registrar blueprints
     from routes.auth import auth_bp
     from routes.main import main_bp
     from routes.contactos import contactos_bp
     from routes.interacciones import interacciones_bp
+    from routes.api import api_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(contactos_bp)
     app.register_blueprint(interacciones_bp)
+    app.register_blueprint(api_bp)
+    
+    # Comandos CLI
+    from utils.contadores import stats_cli
+    from utils.search import search_cli
+    from utils.importacion import import_cli
+    from utils.exportacion import export_cli
+    from utils.trabajos import jobs_cli
+    from utils.analitica import analytics_cli
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(analytics_cli)
     
     return app
 
@@ -0,0 +1,887 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks locales de Mini CRM Personal
+
+Crea una base SQLite temporal, la llena con datos sintéticos y mide la
+latencia de las rutas principales usando el cliente de pruebas de Flask.
+
+Uso:
+    python benchmark.py listado [--contactos 1000 10000 100000] [--repeticiones 20]   # vista original contra la actual
+    python benchmark.py explain [--contactos 5000]
+    python benchmark.py consultas [--contactos 100 5000]
+    python benchmark.py logins [--rounds 10 11 12] [--segundos 3] [--concurrencia N]
+    python benchmark.py exportacion [--contactos 200000] [--interacciones 10]
+    python benchmark.py estadisticas [--contactos 100000] [--repeticiones 5]
+    python benchmark.py auth [--repeticiones 300] [--rounds 4]
+    python benchmark.py arranque [--repeticiones 5] [--presupuesto-ms 800]
+    python benchmark.py conexiones [--url postgresql://...] [--conexion-ms 30 --rtt-ms 2]
+    python benchmark.py carga [--usuarios 3] [--contactos 5000] [--salida r.json] [--comparar base.json]
+    python benchmark.py carga --base-url http://127.0.0.1:8000 --usuarios 3   # contra gunicorn
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import tempfile
+import threading
+import statistics
+from datetime import datetime, timedelta
+
+ETIQUETAS_MUESTRA = ['cliente', 'prospecto', 'proveedor', 'importante', 'tecnología',
+                     'consultor', 'freelancer', 'diseño', 'estrategia', 'confiable']
+EMPRESAS_MUESTRA = ['Empresa ABC', 'Startup XYZ', 'Proveedores SA', 'Consultora Estratégica',
+                    'Freelancer', None]
+
+def crear_app_temporal():
+    """Crea la aplicación apuntando a una base SQLite temporal"""
+    fd, ruta = tempfile.mkstemp(suffix='.db', prefix='bench_crm_')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{ruta}'
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app
+    from models import db
+
+    app = create_app('development')
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+    return app, ruta
+
+def poblar_contactos(app, email, cantidad, lote=5000, interacciones=0):
+    """
+    Inserta `cantidad` contactos con etiquetas (y hasta `interacciones` cada uno) para un usuario nuevo.
+    Los INSERT masivos no pasan por los contadores ni los agregados: al final se reconstruyen.
+    """
+    from models import db, User, Etiqueta, Contacto, Interaccion, contacto_etiquetas
+    from utils import analitica
+    from utils.contadores import reconstruir
+
+    with app.app_context():
+        usuario = User(nombre='Benchmark', email=email)
+        usuario.set_password('benchmark')
+        db.session.add(usuario)
+        db.session.flush()
+
+        etiquetas = Etiqueta.obtener_o_crear(usuario.id, ETIQUETAS_MUESTRA)
+        db.session.flush()
+        ids_etiquetas = [etiqueta.id for etiqueta in etiquetas]
+        user_id = usuario.id
+        db.session.commit()
+
+        ahora = datetime.now()
+        siguiente_id = (db.session.query(db.func.max(Contacto.id)).scalar() or 0) + 1
+        for inicio in range(0, cantidad, lote):
+            filas, asociaciones, notas = [], [], []
+            for i in range(inicio, min(inicio + lote, cantidad)):
+                contacto_id = siguiente_id + i
+                fecha = ahora - timedelta(minutes=random.randint(0, 60 * 24 * 365))
+                fechas_notas = sorted(fecha - timedelta(days=random.randint(0, 90))
+                                      for _ in range(random.randint(0, interacciones)))
+                for fecha_nota in fechas_notas:
+                    notas.append({'contacto_id': contacto_id, 'user_id': user_id,
+                                  'nota': f'Seguimiento {i}', 'fecha': fecha_nota,
+                                  'fecha_creacion': fecha_nota})
+                filas.append({
+                    'id': contacto_id,
+                    'user_id': user_id,
+                    'nombre': f'Contacto {i}',
+                    'email': f'contacto{i}@example.com',
+                    'empresa': random.choice(EMPRESAS_MUESTRA),
+                    'ultima_interaccion': fecha,
+                    'fecha_creacion': fecha,
+                    'fecha_actualizacion': fecha,
+                    'interacciones_count': len(fechas_notas),
+                })
+                for etiqueta_id in random.sample(ids_etiquetas, random.randint(0, 3)):
+                    asociaciones.append({'contacto_id': contacto_id, 'etiqueta_id': etiqueta_id})
+            db.session.execute(Contacto.__table__.insert(), filas)
+            if asociaciones:
+                db.session.execute(contacto_etiquetas.insert(), asociaciones)
+            if notas:
+                db.session.execute(Interaccion.__table__.insert(), notas)
+            db.session.commit()
+
+        reconstruir(user_id)
+        analitica.reconstruir(user_id)
+        db.session.commit()
+
+def medir(cliente, url, repeticiones):
+    """Devuelve las latencias en milisegundos de `repeticiones` GET a `url`"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f'{url} respondió {respuesta.status_code}')
+    return tiempos
+
+def url_pagina(cliente, url, pagina):
+    """URL con cursor de la página `pagina` de un listado, siguiendo los enlaces 'Siguiente'"""
+    for _ in range(pagina - 1):
+        html = cliente.get(url).get_data(as_text=True)
+        enlaces = re.findall(r'href="([^"]*cursor=[^"]*)">\s*Siguiente', html)
+        if not enlaces:
+            break
+        url = enlaces[0].replace('&amp;', '&')
+    return url
+
+def registrar_listado_base(app):
+    """
+    Registra /benchmark/listado-base: la vista /contactos/ de antes de user-001/002,
+    que filtraba por etiqueta en Python (query.all() + json.loads por contacto +
+    IN (...) + paginación con OFFSET/COUNT) sobre la columna JSON contactos.etiquetas
+    """
+    from flask import Blueprint, request, render_template
+    from flask_login import login_required, current_user
+    from sqlalchemy import desc, literal_column
+    from models import db, Contacto
+
+    def etiquetas_de(valor):
+        # Contacto.get_etiquetas_list() de la versión original
+        if valor:
+            try:
+                return json.loads(valor)
+            except (json.JSONDecodeError, TypeError):
+                return [tag.strip() for tag in valor.split(',') if tag.strip()]
+        return []
+
+    base_bp = Blueprint('benchmark_base', __name__, url_prefix='/benchmark')
+    etiquetas_json = literal_column('contactos.etiquetas')
+
+    @base_bp.route('/listado-base')
+    @login_required
+    def listado_base():
+        page = request.args.get('page', 1, type=int)
+        etiqueta_filter = request.args.get('etiqueta', '')
+        query = Contacto.query.filter_by(user_id=current_user.id)
+
+        if etiqueta_filter:
+            contactos_con_etiqueta = [contacto.id for contacto, etiquetas in query.add_columns(etiquetas_json).all()
+                                      if etiqueta_filter in etiquetas_de(etiquetas)]
+            if contactos_con_etiqueta:
+                query = query.filter(Contacto.id.in_(contactos_con_etiqueta))
+            else:
+                query = query.filter(Contacto.id == -1)
+
+        contactos = query.order_by(desc(Contacto.ultima_interaccion)).paginate(page=page, per_page=10,
+                                                                               error_out=False)
+        todas_etiquetas = set()
+        for _, etiquetas in Contacto.query.filter_by(user_id=current_user.id).add_columns(etiquetas_json).all():
+            todas_etiquetas.update(etiquetas_de(etiquetas))
+
+        return render_template('contactos/listar.html', contactos=contactos, search='',
+                               etiqueta_filter=etiqueta_filter, todas_etiquetas=sorted(todas_etiquetas))
+
+    app.register_blueprint(base_bp)
+    with app.app_context():
+        db.session.execute(db.text('ALTER TABLE contactos ADD COLUMN etiquetas TEXT'))
+        db.session.commit()
+
+def copiar_etiquetas_legacy(app):
+    """Llena contactos.etiquetas (JSON) desde contacto_etiquetas, como estaba antes de normalizar"""
+    from models import db
+
+    with app.app_context():
+        db.session.execute(db.text("""
+            UPDATE contactos SET etiquetas = (
+                SELECT json_group_array(e.nombre)
+                  FROM contacto_etiquetas ce JOIN etiquetas e ON e.id = ce.etiqueta_id
+                 WHERE ce.contacto_id = contactos.id)
+             WHERE etiquetas IS NULL
+        """))
+        db.session.commit()
+
+def benchmark_listado(args):
+    """Latencia de /contactos/ filtrando por etiqueta: vista original (antes) contra la actual (después)"""
+    app, ruta = crear_app_temporal()
+    registrar_listado_base(app)
+    print(f"{'contactos':>10} {'url':<42} {'antes p50':>10} {'antes p95':>10} "
+          f"{'después p50':>12} {'después p95':>12}")
+    try:
+        for cantidad in args.contactos:
+            email = f'bench{cantidad}@example.com'
+            poblar_contactos(app, email, cantidad)
+            copiar_etiquetas_legacy(app)
+
+            cliente = app.test_client()
+            cliente.post('/auth/login', data={'email': email, 'password': 'benchmark'})
+            casos = [('/contactos/', '/benchmark/listado-base', '/contactos/'),
+                     ('/contactos/?etiqueta=cliente', '/benchmark/listado-base?etiqueta=cliente',
+                      '/contactos/?etiqueta=cliente'),
+                     ('/contactos/?etiqueta=cliente (pág. 50)', '/benchmark/listado-base?etiqueta=cliente&page=50',
+                      url_pagina(cliente, '/contactos/?etiqueta=cliente', 50))]
+            for nombre, url_antes, url_despues in casos:
+                antes = sorted(medir(cliente, url_antes, args.repeticiones))
+                despues = sorted(medir(cliente, url_despues, args.repeticiones))
+                print(f'{cantidad:>10} {nombre:<42} {statistics.median(antes):>10.1f} '
+                      f'{_percentil(antes, 95):>10.1f} {statistics.median(despues):>12.1f} '
+                      f'{_percentil(despues, 95):>12.1f}')
+    finally:
+        os.remove(ruta)
+
+def _plan(conexion, sentencia, parametros):
+    """Líneas del plan de ejecución de una sentencia capturada"""
+    if conexion.dialect.name == 'postgresql':
+        filas = conexion.exec_driver_sql('EXPLAIN ' + sentencia, parametros).fetchall()
+        return [fila[0] for fila in filas]
+    filas = conexion.exec_driver_sql('EXPLAIN QUERY PLAN ' + sentencia, parametros).fetchall()
+    return [fila[-1] for fila in filas]
+
+def _es_recorrido_completo(linea, tablas):
+    """True si la línea del plan recorre completa una de `tablas` sin usar índice"""
+    if 'Seq Scan on ' in linea:
+        return linea.split('Seq Scan on ')[1].split()[0] in tablas
+    # SQLite: 'SCAN tabla' sin índice (los SCAN de subconsultas no son tablas)
+    partes = linea.split()
+    return len(partes) > 1 and partes[0] == 'SCAN' and partes[1] in tablas and 'USING' not in linea
+
+def benchmark_explain(args):
+    """Ejecuta EXPLAIN sobre las consultas de cada ruta y falla si hay recorridos completos"""
+    from sqlalchemy import event
+    from models import db, Contacto
+
+    app, ruta = crear_app_temporal()
+    try:
+        email = 'explain@example.com'
+        poblar_contactos(app, email, args.contactos, interacciones=5)
+        # Un segundo usuario para que filtrar por user_id sea selectivo
+        poblar_contactos(app, 'otro@example.com', args.contactos, interacciones=5)
+
+        cliente = app.test_client()
+        cliente.post('/auth/login', data={'email': email, 'password': 'benchmark'})
+        with app.app_context():
+            contacto_id = db.session.query(Contacto.id).join(Contacto.usuario)\
+                                    .filter_by(email=email)\
+                                    .order_by(Contacto.interacciones_count.desc()).first()[0]
+            with db.engine.connect() as conexion:
+                # Solo las tablas grandes: con dos usuarios, las estadísticas de los contadores
+                # materializados harían creer al planificador que filtrar por user_id no es selectivo
+                for tabla in ('contactos', 'interacciones', 'etiquetas', 'contacto_etiquetas'):
+                    conexion.exec_driver_sql(f'ANALYZE {tabla}')
+                conexion.commit()
+
+        urls = ['/dashboard', '/contactos/', '/contactos/?etiqueta=cliente',
+                url_pagina(cliente, '/contactos/?etiqueta=cliente', 3),
+                '/contactos/?search=seguimiento', f'/contactos/{contacto_id}',
+                f'/interacciones/contacto/{contacto_id}', '/interacciones/recientes',
+                url_pagina(cliente, '/interacciones/recientes', 3),
+                '/contactos/api/etiquetas', '/contactos/api/buscar?q=contacto',
+                '/contactos/seguimiento?dias=30', url_pagina(cliente, '/contactos/seguimiento?dias=30', 3)]
+
+        fallos = 0
+        with app.app_context():
+            for url in urls:
+                capturadas = []
+
+                def capturar(conn, cursor, sentencia, parametros, contexto, executemany):
+                    if sentencia.lstrip().upper().startswith('SELECT'):
+                        capturadas.append((sentencia, parametros))
+
+                event.listen(db.engine, 'before_cursor_execute', capturar)
+                try:
+                    respuesta = cliente.get(url)
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', capturar)
+                if respuesta.status_code != 200:
+                    raise RuntimeError(f'{url} respondió {respuesta.status_code}')
+
+                with db.engine.connect() as conexion:
+                    for sentencia, parametros in capturadas:
+                        recorridos = [linea for linea in _plan(conexion, sentencia, parametros)
+                                      if _es_recorrido_completo(linea, db.metadata.tables)]
+                        if recorridos:
+                            fallos += 1
+                            print(f'✗ {url}')
+                            print(f'    {" ".join(sentencia.split())[:160]}')
+                            for linea in recorridos:
+                                print(f'    -> {linea}')
+                print(f'  {url}: {len(capturadas)} consultas revisadas')
+    finally:
+        os.remove(ruta)
+
+    if fallos:
+        print(f'✗ {fallos} consultas con recorridos completos')
+        sys.exit(1)
+    print('✓ Ninguna consulta recorre tablas completas')
+
+def benchmark_consultas(args):
+    """
+    Cuenta las consultas del dashboard y falla si DashboardStats.calcular() no
+    emite exactamente DashboardStats.CONSULTAS, o si /dashboard con la caché
+    fría emite más consultas a medida que crece la cantidad de contactos
+    """
+    from sqlalchemy import event
+    from models import db, User
+    from utils.cache import cache
+    from utils.statistics import DashboardStats
+
+    app, ruta = crear_app_temporal()
+    fallos = 0
+    por_pagina = {}
+    try:
+        print(f"{'contactos':>10} {'calcular()':>11} {'esperadas':>10} {'/dashboard (fría)':>18}")
+        for cantidad in args.contactos:
+            email = f'consultas{cantidad}@example.com'
+            poblar_contactos(app, email, cantidad, interacciones=3)
+            with app.app_context():
+                user_id = User.query.filter_by(email=email).one().id
+
+            cliente = app.test_client()
+            cliente.post('/auth/login', data={'email': email, 'password': 'benchmark'})
+            cliente.get('/dashboard')
+
+            sentencias = []
+
+            def contar(conn, cursor, sentencia, parametros, contexto, executemany):
+                sentencias.append(sentencia)
+
+            with app.app_context():
+                event.listen(db.engine, 'before_cursor_execute', contar)
+                try:
+                    db.session.expunge_all()
+                    DashboardStats(user_id).calcular()
+                    en_calcular = len(sentencias)
+
+                    sentencias.clear()
+                    cache.invalidar_usuario(user_id)
+                    respuesta = cliente.get('/dashboard')
+                    en_pagina = len(sentencias)
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', contar)
+            if respuesta.status_code != 200 or b'Error al cargar' in respuesta.data:
+                raise RuntimeError('/dashboard no se pudo renderizar')
+
+            por_pagina[cantidad] = en_pagina
+            marca = '✓' if en_calcular == DashboardStats.CONSULTAS else '✗'
+            if marca == '✗':
+                fallos += 1
+            print(f'{cantidad:>10} {en_calcular:>11} {DashboardStats.CONSULTAS:>10} {en_pagina:>18} {marca}')
+    finally:
+        os.remove(ruta)
+
+    if len(set(por_pagina.values())) > 1:
+        fallos += 1
+        print('✗ /dashboard emite distinta cantidad de consultas según el tamaño de los datos')
+    if fallos:
+        sys.exit(1)
+    print(f'✓ DashboardStats emite {DashboardStats.CONSULTAS} consultas a cualquier escala')
+
+def benchmark_logins(args):
+    """Logins por segundo (y por núcleo) con distintos costos de bcrypt"""
+    from models import db, User
+
+    app, ruta = crear_app_temporal()
+    nucleos = os.cpu_count() or 1
+    concurrencia = args.concurrencia or nucleos
+    print(f'{nucleos} núcleos, {concurrencia} clientes concurrentes, pool {app.config["BCRYPT_POOL"]}')
+    print(f"{'rounds':>6} {'logins/s':>10} {'por núcleo':>11} {'p50 ms':>8} {'rechazados':>11}")
+    try:
+        for rounds in args.rounds:
+            app.config['BCRYPT_ROUNDS'] = rounds
+            email = f'login{rounds}@example.com'
+            with app.app_context():
+                usuario = User(nombre='Login', email=email)
+                usuario.set_password('benchmark')
+                db.session.add(usuario)
+                db.session.commit()
+
+            tiempos, rechazados = [], []
+            fin = time.perf_counter() + args.segundos
+
+            def cliente_login():
+                cliente = app.test_client()
+                while time.perf_counter() < fin:
+                    inicio = time.perf_counter()
+                    respuesta = cliente.post('/auth/login', data={'email': email, 'password': 'benchmark'})
+                    if respuesta.status_code == 302:
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                    elif respuesta.status_code == 503:
+                        rechazados.append(1)
+                    else:
+                        raise RuntimeError(f'login respondió {respuesta.status_code}')
+                    cliente.get('/auth/logout')
+
+            hilos = [threading.Thread(target=cliente_login) for _ in range(concurrencia)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            por_segundo = len(tiempos) / (time.perf_counter() - inicio)
+            mediana = statistics.median(tiempos) if tiempos else 0
+            print(f'{rounds:>6} {por_segundo:>10.1f} {por_segundo / min(nucleos, concurrencia):>11.1f} '
+                  f'{mediana:>8.1f} {len(rechazados):>11}')
+    finally:
+        os.remove(ruta)
+
+def benchmark_auth(args):
+    """Latencia de las rutas de autenticación sin el costo de bcrypt (rounds bajos)"""
+    from models import db, User
+
+    app, ruta = crear_app_temporal()
+    app.config['BCRYPT_ROUNDS'] = args.rounds
+    try:
+        with app.app_context():
+            usuario = User(nombre='Auth', email='auth@example.com')
+            usuario.set_password('benchmark')
+            db.session.add(usuario)
+            db.session.commit()
+
+        cliente = app.test_client()
+        correcto = {'email': 'auth@example.com', 'password': 'benchmark'}
+        casos = [
+            ('GET /auth/login', lambda n: cliente.get('/auth/login'), 200),
+            ('POST login (usuario inexistente)',
+             lambda n: cliente.post('/auth/login', data={'email': 'nadie@example.com', 'password': 'x'}), 200),
+            ('POST login (correcto) + logout',
+             lambda n: (cliente.post('/auth/login', data=correcto), cliente.get('/auth/logout'))[0], 302),
+            ('POST register (email repetido)',
+             lambda n: cliente.post('/auth/register', data={'nombre': 'A', 'email': 'auth@example.com',
+                                                            'password': 'secreto', 'confirm_password': 'secreto'}),
+             200),
+            ('POST register (nuevo)',
+             lambda n: cliente.post('/auth/register', data={'nombre': 'A', 'email': f'nuevo{n}@example.com',
+                                                            'password': 'secreto', 'confirm_password': 'secreto'}),
+             302),
+        ]
+        print(f"{'ruta':<36} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for nombre, funcion, esperado in casos:
+            tiempos = []
+            for numero in range(args.repeticiones):
+                inicio = time.perf_counter()
+                respuesta = funcion(numero)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != esperado:
+                    raise RuntimeError(f'{nombre} respondió {respuesta.status_code}')
+            tiempos.sort()
+            print(f'{nombre:<36} {_percentil(tiempos, 50):>8.2f} {_percentil(tiempos, 95):>8.2f} '
+                  f'{_percentil(tiempos, 99):>8.2f}')
+    finally:
+        os.remove(ruta)
+
+ARRANQUE_HIJO = """
+import json, time
+inicio = time.perf_counter()
+import api.index
+importado = time.perf_counter()
+respuesta = api.index.app.test_client().get('/auth/login')
+fin = time.perf_counter()
+print(json.dumps({'import_ms': (importado - inicio) * 1000, 'primera_ms': (fin - importado) * 1000,
+                  'estado': respuesta.status_code}))
+"""
+
+def benchmark_arranque(args):
+    """Arranque en frío de api/index.py: proceso nuevo hasta la primera respuesta"""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    fd, ruta = tempfile.mkstemp(suffix='.db', prefix='bench_crm_')
+    os.close(fd)
+    entorno = dict(os.environ, DATABASE_URL=f'sqlite:///{ruta}', POSTGRES_URL='')
+    entorno.pop('POSTGRES_URL')
+    medidas = []
+    try:
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            salida = subprocess.run([sys.executable, '-c', ARRANQUE_HIJO], cwd=directorio, env=entorno,
+                                    capture_output=True, text=True, check=True).stdout
+            total = (time.perf_counter() - inicio) * 1000
+            datos = json.loads(salida.strip().splitlines()[-1])
+            if datos['estado'] != 200:
+                raise RuntimeError(f"/auth/login respondió {datos['estado']}")
+            medidas.append((total, datos['import_ms'], datos['primera_ms']))
+    finally:
+        os.remove(ruta)
+
+    total, importacion, primera = (statistics.median(columna) for columna in zip(*medidas))
+    print(f"{'medianas de ' + str(args.repeticiones) + ' arranques':<32} {'ms':>8}")
+    print(f"{'import api.index':<32} {importacion:>8.0f}")
+    print(f"{'primera respuesta':<32} {primera:>8.0f}")
+    print(f"{'proceso completo':<32} {total:>8.0f}")
+    if importacion + primera > args.presupuesto_ms:
+        print(f'✗ import + primera respuesta supera el presupuesto de {args.presupuesto_ms} ms')
+        sys.exit(1)
+    print(f'✓ Dentro del presupuesto de {args.presupuesto_ms} ms')
+
+def benchmark_conexiones(args):
+    """Costo de establecer conexiones por petición con cada perfil de pool"""
+    from sqlalchemy import create_engine
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from config import opciones_engine, opciones_pool, url_postgres
+
+    ruta = None
+    url = url_postgres(args.url)
+    # Con un servidor real los costos ya son reales: no se simula nada salvo que se pida
+    if args.conexion_ms is None:
+        args.conexion_ms = 0 if url else 30
+    if args.rtt_ms is None:
+        args.rtt_ms = 0 if url else 2
+    if not url:
+        # Sustituto local: SQLite con el costo de handshake y de ida y vuelta simulados
+        fd, ruta = tempfile.mkstemp(suffix='.db', prefix='bench_crm_')
+        os.close(fd)
+        url = f'sqlite:///{ruta}'
+        print(f'Sin --url: SQLite con {args.conexion_ms} ms por conexión y {args.rtt_ms} ms por ida y vuelta')
+
+    print(f"{'perfil':<11} {'conexiones':>10} {'pings':>6} {'ms conexión/pet.':>17} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for perfil in args.perfiles:
+            opciones = opciones_engine(url, perfil) if url.startswith('postgresql') else opciones_pool(perfil)
+            engine = create_engine(url, **opciones)
+            contadores = {'conexiones': 0, 'pings': 0, 'segundos_conexion': 0.0}
+            conectar, ping = engine.dialect.connect, engine.dialect.do_ping
+
+            def conectar_medido(*cargs, **cparams):
+                inicio = time.perf_counter()
+                conexion = conectar(*cargs, **cparams)
+                time.sleep(args.conexion_ms / 1000)
+                contadores['conexiones'] += 1
+                contadores['segundos_conexion'] += time.perf_counter() - inicio
+                return conexion
+
+            def ping_medido(conexion_dbapi):
+                contadores['pings'] += 1
+                time.sleep(args.rtt_ms / 1000)
+                return ping(conexion_dbapi)
+
+            engine.dialect.connect = conectar_medido
+            engine.dialect.do_ping = ping_medido
+
+            tiempos = []
+            for _ in range(args.peticiones):
+                inicio = time.perf_counter()
+                with engine.connect() as conexion:
+                    for _ in range(args.consultas):
+                        time.sleep(args.rtt_ms / 1000)
+                        conexion.exec_driver_sql('SELECT 1').scalar()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            engine.dispose()
+
+            tiempos.sort()
+            por_peticion = contadores['segundos_conexion'] * 1000 / args.peticiones
+            print(f"{perfil:<11} {contadores['conexiones']:>10} {contadores['pings']:>6} {por_peticion:>17.2f} "
+                  f"{_percentil(tiempos, 50):>8.2f} {_percentil(tiempos, 95):>8.2f}")
+    finally:
+        if ruta:
+            os.remove(ruta)
+
+def _percentil(ordenados, p):
+    """Percentil `p` (0-100) por rango más cercano de una lista ya ordenada"""
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+class ClienteHTTP:
+    """Cliente mínimo con cookies contra un servidor real (gunicorn); no sigue redirecciones"""
+
+    def __init__(self, base_url):
+        import urllib.request
+        from http.cookiejar import CookieJar
+
+        class SinRedirecciones(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()),
+                                                  SinRedirecciones())
+
+    def _pedir(self, url, data=None):
+        import urllib.error
+        import urllib.parse
+        cuerpo = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + url, data=cuerpo) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def get(self, url):
+        return self._pedir(url)
+
+    def post(self, url, data):
+        return self._pedir(url, data)
+
+def benchmark_carga(args):
+    """p50/p95/p99 y consultas por petición de las rutas principales sobre datos sintéticos"""
+    from urllib.parse import quote
+    from utils.datos_sinteticos import DOMINIO, PASSWORD
+
+    endpoints = [('dashboard', '/dashboard'),
+                 ('buscar', f'/contactos/?search={quote(args.buscar)}'),
+                 ('etiqueta', f'/contactos/?etiqueta={quote(args.etiqueta)}'),
+                 ('recientes', '/interacciones/recientes')]
+    emails = [f'sintetico{n}@{DOMINIO}' for n in range(1, args.usuarios + 1)]
+    ruta, consultas = None, None
+
+    if args.base_url:
+        # Los usuarios sintéticos ya deben existir: init_db.py --sample-data --usuarios N ...
+        nuevo_cliente = lambda: ClienteHTTP(args.base_url)
+        estado = lambda respuesta: respuesta
+        modo = args.base_url
+    else:
+        from sqlalchemy import event
+        from models import db
+        from utils.datos_sinteticos import GeneradorSintetico
+
+        app, ruta = crear_app_temporal()
+        print(f'Sembrando {args.usuarios} usuarios × {args.contactos} contactos '
+              f'(~{args.interacciones} interacciones por contacto)...')
+        with app.app_context():
+            GeneradorSintetico(semilla=args.semilla).generar(args.usuarios, args.contactos, args.interacciones)
+            with db.engine.connect() as conexion:
+                conexion.exec_driver_sql('ANALYZE')
+                conexion.commit()
+            consultas = [0]
+
+            def contar(*_):
+                consultas[0] += 1
+            event.listen(db.engine, 'before_cursor_execute', contar)
+        nuevo_cliente = app.test_client
+        estado = lambda respuesta: respuesta.status_code
+        modo = 'test_client'
+
+    resultados = {nombre: {'tiempos': [], 'consultas': []} for nombre, _ in [('login', None)] + endpoints}
+
+    def registrar(nombre, funcion, esperado):
+        antes = consultas[0] if consultas else 0
+        inicio = time.perf_counter()
+        codigo = estado(funcion())
+        resultados[nombre]['tiempos'].append((time.perf_counter() - inicio) * 1000)
+        if consultas:
+            resultados[nombre]['consultas'].append(consultas[0] - antes)
+        if codigo != esperado:
+            raise RuntimeError(f'{nombre} respondió {codigo}')
+
+    try:
+        clientes = []
+        for email in emails:
+            cliente = nuevo_cliente()
+            datos = {'email': email, 'password': PASSWORD}
+            registrar('login', lambda: cliente.post('/auth/login', data=datos), 302)
+            clientes.append(cliente)
+        # Más logins hasta completar las repeticiones (con logout entre medio)
+        for numero in range(args.repeticiones - len(emails)):
+            cliente = clientes[numero % len(clientes)]
+            cliente.get('/auth/logout')
+            datos = {'email': emails[numero % len(emails)], 'password': PASSWORD}
+            registrar('login', lambda: cliente.post('/auth/login', data=datos), 302)
+
+        for repeticion in range(args.repeticiones):
+            cliente = clientes[repeticion % len(clientes)]
+            for nombre, url in endpoints:
+                registrar(nombre, lambda: cliente.get(url), 200)
+    finally:
+        if ruta:
+            os.remove(ruta)
+
+    informe = {'fecha': datetime.now().isoformat(timespec='seconds'), 'modo': modo,
+               'parametros': {'usuarios': args.usuarios, 'contactos': args.contactos,
+                              'interacciones': args.interacciones, 'semilla': args.semilla,
+                              'repeticiones': args.repeticiones},
+               'endpoints': {}}
+    for nombre, datos in resultados.items():
+        tiempos = sorted(datos['tiempos'])
+        informe['endpoints'][nombre] = {
+            'peticiones': len(tiempos),
+            'p50_ms': round(_percentil(tiempos, 50), 2),
+            'p95_ms': round(_percentil(tiempos, 95), 2),
+            'p99_ms': round(_percentil(tiempos, 99), 2),
+            'consultas': round(statistics.mean(datos['consultas']), 1) if datos['consultas'] else None,
+        }
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)['endpoints']
+
+    print(f"{'endpoint':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>10}"
+          + (f" {'Δ p50':>8} {'Δ p95':>8}" if anterior else ''))
+    for nombre, fila in informe['endpoints'].items():
+        consultas_fila = '-' if fila['consultas'] is None else fila['consultas']
+        linea = (f"{nombre:<12} {fila['p50_ms']:>8.1f} {fila['p95_ms']:>8.1f} "
+                 f"{fila['p99_ms']:>8.1f} {consultas_fila:>10}")
+        if anterior and nombre in anterior:
+            for clave in ('p50_ms', 'p95_ms'):
+                base = anterior[nombre][clave]
+                linea += f' {(fila[clave] - base) / base * 100:>+7.0f}%' if base else f" {'-':>8}"
+        print(linea)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, ensure_ascii=False, indent=2)
+        print(f'✓ Resultados guardados en {args.salida}')
+
+def rss_actual_mb():
+    """Memoria residente actual del proceso en MB (solo Linux), o None"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+def benchmark_exportacion(args):
+    """Tiempo y memoria de las descargas en streaming de /contactos/exportar"""
+    app, ruta = crear_app_temporal()
+    try:
+        email = 'export@example.com'
+        print(f'Poblando {args.contactos} contactos con hasta {args.interacciones} interacciones cada uno...')
+        poblar_contactos(app, email, args.contactos, interacciones=args.interacciones)
+
+        cliente = app.test_client()
+        cliente.post('/auth/login', data={'email': email, 'password': 'benchmark'})
+        print(f"{'exportación':<36} {'MB':>8} {'segundos':>9} {'RSS inicial':>12} {'RSS pico':>9}")
+        for tipo, formato in (('contactos', 'csv'), ('interacciones', 'csv'), ('contactos', 'jsonl')):
+            url = f'/contactos/exportar?tipo={tipo}&formato={formato}'
+            rss_inicial = pico = rss_actual_mb() or 0
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url, buffered=False)
+            total = 0
+            for fragmento in respuesta.response:
+                total += len(fragmento)
+                pico = max(pico, rss_actual_mb() or 0)
+            respuesta.close()
+            segundos = time.perf_counter() - inicio
+            print(f'{tipo + " " + formato:<36} {total / 1024 / 1024:>8.1f} {segundos:>9.1f} '
+                  f'{rss_inicial:>12.1f} {pico:>9.1f}')
+    finally:
+        os.remove(ruta)
+
+def benchmark_estadisticas(args):
+    """Distribución de contactos: camino columnar contra el recorrido del ORM"""
+    app, ruta = crear_app_temporal()
+    try:
+        from models import db, User
+        from utils.statistics import distribucion_contactos
+
+        email = 'estadisticas@example.com'
+        print(f'Poblando {args.contactos} contactos...')
+        poblar_contactos(app, email, args.contactos)
+
+        with app.app_context():
+            user_id = User.query.filter_by(email=email).one().id
+            print(f"{'camino':<12} {'p50 ms':>9} {'mín ms':>9} {'contactos/s':>12}")
+            resultados = {}
+            for nombre, columnar in (('orm', False), ('columnar', True)):
+                tiempos = []
+                for _ in range(args.repeticiones):
+                    db.session.expunge_all()
+                    inicio = time.perf_counter()
+                    resultados[nombre] = distribucion_contactos(user_id, columnar=columnar)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                mediana = statistics.median(tiempos)
+                print(f'{nombre:<12} {mediana:>9.1f} {min(tiempos):>9.1f} '
+                      f'{args.contactos / mediana * 1000:>12.0f}')
+            if resultados['orm'] != resultados['columnar']:
+                raise RuntimeError('Los dos caminos devolvieron distribuciones distintas')
+    finally:
+        os.remove(ruta)
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Benchmarks locales de Mini CRM')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    listado = subparsers.add_parser('listado', help='Latencia del listado de contactos')
+    listado.add_argument('--contactos', type=int, nargs='+', default=[1000, 10000, 100000],
+                         help='Cantidades de contactos a probar')
+    listado.add_argument('--repeticiones', type=int, default=20,
+                         help='Peticiones por URL')
+    listado.set_defaults(func=benchmark_listado)
+
+    explain = subparsers.add_parser('explain', help='Revisa los planes de las consultas de cada ruta')
+    explain.add_argument('--contactos', type=int, default=5000,
+                         help='Contactos por usuario en los datos sembrados')
+    explain.set_defaults(func=benchmark_explain)
+
+    consultas = subparsers.add_parser('consultas', help='Comprueba la cantidad de consultas del dashboard')
+    consultas.add_argument('--contactos', type=int, nargs='+', default=[100, 5000],
+                           help='Cantidades de contactos a comparar')
+    consultas.set_defaults(func=benchmark_consultas)
+
+    logins = subparsers.add_parser('logins', help='Logins por segundo según el costo de bcrypt')
+    logins.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12],
+                        help='Costos de bcrypt a probar')
+    logins.add_argument('--segundos', type=float, default=3,
+                        help='Duración de cada medición')
+    logins.add_argument('--concurrencia', type=int, default=None,
+                        help='Clientes concurrentes (por defecto, uno por núcleo)')
+    logins.set_defaults(func=benchmark_logins)
+
+    exportacion = subparsers.add_parser('exportacion', help='Memoria y tiempo de la exportación en streaming')
+    exportacion.add_argument('--contactos', type=int, default=200000,
+                             help='Contactos a generar')
+    exportacion.add_argument('--interacciones', type=int, default=10,
+                             help='Máximo de interacciones por contacto (promedio: la mitad)')
+    exportacion.set_defaults(func=benchmark_exportacion)
+
+    estadisticas = subparsers.add_parser('estadisticas', help='Distribución de contactos: columnar contra ORM')
+    estadisticas.add_argument('--contactos', type=int, default=100000,
+                              help='Contactos a generar')
+    estadisticas.add_argument('--repeticiones', type=int, default=5,
+                              help='Cálculos por camino')
+    estadisticas.set_defaults(func=benchmark_estadisticas)
+
+    auth = subparsers.add_parser('auth', help='Latencia de login y registro (sin el costo de bcrypt)')
+    auth.add_argument('--repeticiones', type=int, default=300,
+                      help='Peticiones por caso')
+    auth.add_argument('--rounds', type=int, default=4,
+                      help='Costo de bcrypt durante la medición (bajo para aislar el resto)')
+    auth.set_defaults(func=benchmark_auth)
+
+    arranque = subparsers.add_parser('arranque', help='Arranque en frío de api/index.py contra un presupuesto')
+    arranque.add_argument('--repeticiones', type=int, default=5,
+                          help='Procesos nuevos a medir')
+    arranque.add_argument('--presupuesto-ms', type=float, default=800,
+                          help='Máximo para import + primera respuesta (mediana)')
+    arranque.set_defaults(func=benchmark_arranque)
+
+    conexiones = subparsers.add_parser('conexiones', help='Costo de conexión por petición según el perfil de pool')
+    conexiones.add_argument('--url', default=None,
+                            help='PostgreSQL o PgBouncer a medir; sin esto, SQLite con costos simulados')
+    conexiones.add_argument('--perfiles', nargs='+', default=['local', 'servidor', 'serverless', 'pooler'],
+                            help='Perfiles de DB_POOL_PROFILE a comparar')
+    conexiones.add_argument('--peticiones', type=int, default=200,
+                            help='Peticiones simuladas por perfil')
+    conexiones.add_argument('--consultas', type=int, default=3,
+                            help='Consultas por petición')
+    conexiones.add_argument('--conexion-ms', type=float, default=None,
+                            help='Costo simulado de abrir una conexión (TCP+TLS+auth); por defecto 30, o 0 con --url')
+    conexiones.add_argument('--rtt-ms', type=float, default=None,
+                            help='Ida y vuelta simulada por consulta o ping; por defecto 2, o 0 con --url')
+    conexiones.set_defaults(func=benchmark_conexiones)
+
+    carga = subparsers.add_parser('carga', help='Prueba de carga con datos sintéticos (p50/p95/p99)')
+    carga.add_argument('--usuarios', type=int, default=3,
+                       help='Usuarios sintéticos (sintetico<N>@minicrm.test) que hacen peticiones')
+    carga.add_argument('--contactos', type=int, default=5000,
+                       help='Contactos por usuario al sembrar la base temporal')
+    carga.add_argument('--interacciones', type=float, default=5,
+                       help='Interacciones promedio por contacto al sembrar')
+    carga.add_argument('--semilla', type=int, default=42,
+                       help='Semilla del generador de datos')
+    carga.add_argument('--repeticiones', type=int, default=50,
+                       help='Peticiones por endpoint')
+    carga.add_argument('--buscar', default='García',
+                       help='Término para /contactos/?search=')
+    carga.add_argument('--etiqueta', default='cliente',
+                       help='Etiqueta para /contactos/?etiqueta=')
+    carga.add_argument('--base-url', default=None,
+                       help='Servidor ya levantado (p. ej. gunicorn) sembrado con init_db.py; '
+                            'sin esto se usa una base temporal y el cliente de pruebas')
+    carga.add_argument('--salida', default=None,
+                       help='Guarda los resultados en este archivo JSON')
+    carga.add_argument('--comparar', default=None,
+                       help='JSON de una corrida anterior para mostrar las diferencias')
+    carga.set_defaults(func=benchmark_carga)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,16 @@ Script de inicialización de la base de datos para Mini CRM Personal
 Este script:
 1. Crea las tablas de la base de datos
 2. Inicializa las migraciones de Flask-Migrate
-3. Opcionalmente carga datos de ejemplo
+3. Opcionalmente carga datos de ejemplo, o datos sintéticos a escala
 
 Uso:
     python init_db.py [--sample-data]
+    python init_db.py --sample-data --usuarios 10 --contactos 10000 --interacciones 5 [--semilla 42]
 """
 
 import os
 import sys
+import time
 import argparse
 from datetime import datetime, timedelta
 from app import create_app
@@ -120,7 +122,7 @@ def create_sample_data(app):
                     notas=contacto_data["notas"],
                     fecha_creacion=datetime.now() - timedelta(days=len(contactos_creados) * 2)  # Usar hora local
                 )
-                contacto.etiquetas = contacto_data["etiquetas"]
+                contacto.set_etiquetas_from_str(', '.join(contacto_data["etiquetas"]))
                 db.session.add(contacto)
                 contactos_creados.append(contacto)
             
@@ -168,13 +170,11 @@ def create_sample_data(app):
             for interaccion_data in interacciones_ejemplo:
                 interaccion = Interaccion(
                     contacto_id=interaccion_data["contacto"].id,
+                    user_id=interaccion_data["contacto"].user_id,
                     nota=interaccion_data["nota"],
                     fecha=datetime.now() - timedelta(days=interaccion_data["dias_atras"])  # Usar hora local
                 )
                 db.session.add(interaccion)
-                
-                # Actualizar última interacción del contacto
-                interaccion_data["contacto"].actualizar_ultima_interaccion()
             
             # Guardar todos los cambios
             db.session.commit()
@@ -191,6 +191,33 @@ def create_sample_data(app):
             print(f"✗ Error creando datos de ejemplo: {str(e)}")
             return False
 
+def create_synthetic_data(app, usuarios, contactos, interacciones, semilla):
+    """Crea usuarios sintéticos con miles de contactos e interacciones (inserciones por lote)"""
+    from utils.datos_sinteticos import GeneradorSintetico, PASSWORD
+    
+    with app.app_context():
+        try:
+            print(f"Generando {usuarios} usuarios × {contactos} contactos "
+                  f"(~{interacciones} interacciones por contacto, semilla {semilla})...")
+            inicio = time.perf_counter()
+            
+            def progreso(numero, total):
+                print(f"  usuario {numero}/{total} listo ({time.perf_counter() - inicio:.1f} s)")
+            
+            generador = GeneradorSintetico(semilla=semilla)
+            user_ids, total_interacciones = generador.generar(usuarios, contactos, interacciones, progreso)
+            
+            print(f"✓ Datos sintéticos creados en {time.perf_counter() - inicio:.1f} s:")
+            print(f"  - {len(user_ids)} usuarios (sintetico<N>@minicrm.test, password: {PASSWORD})")
+            print(f"  - {len(user_ids) * contactos} contactos")
+            print(f"  - {total_interacciones} interacciones")
+            return True
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error creando datos sintéticos: {str(e)}")
+            return False
+
 def check_database_connection(app):
     """Verifica la conexión a la base de datos"""
     with app.app_context():
@@ -214,6 +241,14 @@ def main():
                        help='Crear datos de ejemplo para pruebas')
     parser.add_argument('--check-only', action='store_true',
                        help='Solo verificar la conexión a la base de datos')
+    parser.add_argument('--usuarios', type=int, default=None,
+                       help='Con --sample-data: cantidad de usuarios sintéticos')
+    parser.add_argument('--contactos', type=int, default=None,
+                       help='Con --sample-data: contactos por usuario sintético')
+    parser.add_argument('--interacciones', type=float, default=5,
+                       help='Con --sample-data: interacciones promedio por contacto')
+    parser.add_argument('--semilla', type=int, default=42,
+                       help='Semilla para que los datos sintéticos sean reproducibles')
     
     args = parser.parse_args()
     
@@ -237,7 +272,12 @@ def main():
         sys.exit(1)
     
     # Crear datos de ejemplo si se solicita
-    if args.sample_data:
+    sinteticos = args.usuarios is not None or args.contactos is not None
+    if args.sample_data and sinteticos:
+        if not create_synthetic_data(app, args.usuarios or 1, args.contactos or 1000,
+                                     args.interacciones, args.semilla):
+            sys.exit(1)
+    elif args.sample_data:
         if not create_sample_data(app):
             sys.exit(1)
     
@@ -245,7 +285,11 @@ def main():
     print("✓ Inicialización completada exitosamente")
     print("=" * 50)
     
-    if args.sample_data:
+    if args.sample_data and sinteticos:
+        print("\nPuedes iniciar sesión con:")
+        print("Email: sintetico1@minicrm.test")
+        print("Password: demo123")
+    elif args.sample_data:
         print("\nPuedes iniciar sesión con:")
         print("Email: demo@minicrm.com")
         print("Password: demo123")
@@ -1,53 +1,130 @@
 #!/usr/bin/env python3
 """
-Script para migrar las etiquetas de contactos al nuevo formato JSON
+Script para migrar las etiquetas de contactos desde la columna JSON legacy
+(contactos.etiquetas) a las tablas normalizadas etiquetas/contacto_etiquetas.
+
+Útil en bases creadas con db.create_all() que no pasan por Alembic. Recorre
+los contactos por id en lotes con un commit por lote (utils/lotes.py): si se
+interrumpe, la próxima ejecución sigue desde el último lote confirmado.
+
+Uso:
+    python migrate_tags.py [--lote 1000] [--dry-run] [--reiniciar]
 """
 
+import argparse
+from collections import Counter, defaultdict
+import sqlalchemy as sa
+from sqlalchemy import select, insert, tuple_
 from app import create_app
-from models import db, Contacto
-import json
+from models import db, contacto_etiquetas, parse_etiquetas
+from utils.cache import cache
+from utils import analitica
+from utils.contadores import ajustar_contadores, asegurar as asegurar_contadores
+from utils.importacion import ids_etiquetas
+from utils.lotes import MigracionPorLotes, LOTE, imprimir_progreso
+
+# Vista mínima de la tabla: la columna legacy ya no está en el modelo Contacto
+contactos_legacy = sa.table(
+    'contactos',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('etiquetas', sa.Text),
+)
+
+class MigrarEtiquetas(MigracionPorLotes):
+    """Crea las etiquetas y asociaciones que falten a partir de contactos.etiquetas"""
+    nombre = 'migrar_etiquetas'
+    tabla = contactos_legacy
+    columnas = ('user_id', 'etiquetas')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._conocidas = {}
+        self._usuarios = set()
+
+    def condicion(self):
+        return sa.and_(contactos_legacy.c.etiquetas.isnot(None),
+                       contactos_legacy.c.etiquetas.notin_(['', '[]']))
+
+    def procesar(self, filas, simulacion):
+        por_usuario = defaultdict(list)
+        for fila in filas:
+            nombres = parse_etiquetas(fila.etiquetas)
+            if nombres:
+                por_usuario[fila.user_id].append((fila.id, nombres))
+        if simulacion:
+            return sum(len(contactos) for contactos in por_usuario.values())
 
-def migrate_tags():
-    """Migra las etiquetas existentes al formato JSON"""
+        modificados = 0
+        for user_id, contactos in por_usuario.items():
+            asegurar_contadores(user_id)
+            nombres = sorted({nombre for _, nombres_contacto in contactos for nombre in nombres_contacto})
+            ids = ids_etiquetas(user_id, nombres, self._conocidas.setdefault(user_id, {}))
+            pares = [(contacto_id, ids[nombre]) for contacto_id, nombres_contacto in contactos
+                     for nombre in nombres_contacto]
+            existentes = set(db.session.execute(
+                select(contacto_etiquetas.c.contacto_id, contacto_etiquetas.c.etiqueta_id)
+                .where(tuple_(contacto_etiquetas.c.contacto_id, contacto_etiquetas.c.etiqueta_id).in_(pares))
+            ).all())
+            nuevos = [par for par in pares if par not in existentes]
+            if not nuevos:
+                continue
+            db.session.execute(insert(contacto_etiquetas),
+                               [{'contacto_id': contacto_id, 'etiqueta_id': etiqueta_id}
+                                for contacto_id, etiqueta_id in nuevos])
+            nombre_por_id = {etiqueta_id: nombre for nombre, etiqueta_id in ids.items()}
+            ajustar_contadores(user_id, etiquetas=Counter(nombre_por_id[etiqueta_id] for _, etiqueta_id in nuevos))
+            analitica.registrar_asociaciones(user_id, nuevos)
+            modificados += len({contacto_id for contacto_id, _ in nuevos})
+            self._usuarios.add(user_id)
+        return modificados
+
+    def despues_del_lote(self):
+        for user_id in self._usuarios:
+            cache.invalidar_usuario(user_id)
+        self._usuarios.clear()
+
+def columna_legacy_existe():
+    columnas = [col['name'] for col in db.inspect(db.engine).get_columns('contactos')]
+    return 'etiquetas' in columnas
+
+def migrar_etiquetas(lote=LOTE, simulacion=False, reiniciar=False, progreso=None):
+    """
+    Migra las etiquetas existentes a la tabla de etiquetas (requiere contexto de app).
+    Devuelve un ResultadoLotes, o None si la columna legacy no existe.
+    """
+    if not columna_legacy_existe():
+        return None
+    return MigrarEtiquetas(lote=lote, simulacion=simulacion, reiniciar=reiniciar, progreso=progreso).ejecutar()
+
+def migrate_tags(lote=LOTE, simulacion=False, reiniciar=False):
+    """Migra las etiquetas existentes a la tabla de etiquetas"""
     app = create_app()
-    
+
     with app.app_context():
-        contactos = Contacto.query.all()
-        print(f'Migrando {len(contactos)} contactos...')
-        
-        migrated_count = 0
-        
-        for contacto in contactos:
-            if contacto.etiquetas and contacto.etiquetas.strip():
-                try:
-                    # Verificar si ya es JSON válido
-                    json.loads(contacto.etiquetas)
-                    print(f'Contacto {contacto.id} ({contacto.nombre}) ya tiene formato JSON')
-                except (json.JSONDecodeError, TypeError):
-                    # Convertir string separado por comas a JSON
-                    if ',' in contacto.etiquetas or contacto.etiquetas.strip():
-                        etiquetas_list = [tag.strip() for tag in contacto.etiquetas.split(',') if tag.strip()]
-                        contacto.etiquetas = json.dumps(etiquetas_list)
-                        print(f'Contacto {contacto.id} ({contacto.nombre}): {etiquetas_list}')
-                        migrated_count += 1
-                    else:
-                        etiquetas_list = [contacto.etiquetas.strip()]
-                        contacto.etiquetas = json.dumps(etiquetas_list)
-                        print(f'Contacto {contacto.id} ({contacto.nombre}): {etiquetas_list}')
-                        migrated_count += 1
-            else:
-                contacto.etiquetas = json.dumps([])
-                print(f'Contacto {contacto.id} ({contacto.nombre}): sin etiquetas')
-        
         try:
-            db.session.commit()
-            print(f'¡Migración completada! {migrated_count} contactos migrados.')
+            resultado = migrar_etiquetas(lote, simulacion, reiniciar, progreso=imprimir_progreso())
         except Exception as e:
-            db.session.rollback()
             print(f'Error durante la migración: {e}')
+            print('Los lotes confirmados se conservan; vuelve a ejecutar el script para continuar.')
             return False
-        
+
+        if resultado is None:
+            print('La columna contactos.etiquetas no existe: nada que migrar.')
+        elif resultado.terminada and not resultado.lotes and resultado.leidas:
+            print('La migración ya estaba completa (usa --reiniciar para repetirla).')
+        else:
+            print(f'¡Migración completada! {resultado.resumen()}')
         return True
 
 if __name__ == '__main__':
-    migrate_tags()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Migrar etiquetas legacy a tablas normalizadas')
+    parser.add_argument('--lote', type=int, default=LOTE,
+                        help='Contactos por lote (un commit por lote)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Solo contar los contactos a migrar, sin escribir')
+    parser.add_argument('--reiniciar', action='store_true',
+                        help='Ignorar el punto de control y empezar desde el primer contacto')
+    args = parser.parse_args()
+
+    migrate_tags(args.lote, args.dry_run, args.reiniciar)
@@ -0,0 +1,146 @@
+"""Normalize etiquetas into etiquetas and contacto_etiquetas tables
+
+Revision ID: 5a1d7c2e9b40
+Revises: c3b9f234f00d
+Create Date: 2026-10-18 10:12:31.418220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1d7c2e9b40'
+down_revision = 'c3b9f234f00d'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+contactos = sa.table(
+    'contactos',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('etiquetas', sa.Text),
+)
+
+etiquetas = sa.table(
+    'etiquetas',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('nombre', sa.String),
+)
+
+contacto_etiquetas = sa.table(
+    'contacto_etiquetas',
+    sa.column('contacto_id', sa.Integer),
+    sa.column('etiqueta_id', sa.Integer),
+)
+
+
+def _parse_etiquetas(valor):
+    # Mismas reglas que migrate_tags.py / models.parse_etiquetas, copiadas
+    # aquí para que la migración no dependa de la versión actual de los modelos
+    if not valor:
+        return []
+    if isinstance(valor, (list, tuple)):
+        etiquetas_list = valor
+    else:
+        try:
+            etiquetas_list = json.loads(valor)
+        except (json.JSONDecodeError, TypeError):
+            etiquetas_list = valor.split(',')
+        if not isinstance(etiquetas_list, list):
+            etiquetas_list = [str(etiquetas_list)]
+
+    resultado = []
+    for tag in etiquetas_list:
+        tag = str(tag).strip()[:50]
+        if tag and tag not in resultado:
+            resultado.append(tag)
+    return resultado
+
+
+def upgrade():
+    op.create_table(
+        'etiquetas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'nombre', name='uq_etiquetas_user_id_nombre')
+    )
+    op.create_table(
+        'contacto_etiquetas',
+        sa.Column('contacto_id', sa.Integer(), nullable=False),
+        sa.Column('etiqueta_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['contacto_id'], ['contactos.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['etiqueta_id'], ['etiquetas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('contacto_id', 'etiqueta_id')
+    )
+    op.create_index('ix_contacto_etiquetas_etiqueta_contacto', 'contacto_etiquetas',
+                    ['etiqueta_id', 'contacto_id'], unique=False)
+
+    # Backfill desde la columna JSON, recorriendo contactos por id en lotes
+    bind = op.get_bind()
+    ids_etiquetas = {}
+    ultimo_id = 0
+    while True:
+        filas = bind.execute(
+            sa.select(contactos.c.id, contactos.c.user_id, contactos.c.etiquetas)
+            .where(contactos.c.id > ultimo_id)
+            .order_by(contactos.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not filas:
+            break
+        ultimo_id = filas[-1].id
+
+        asociaciones = []
+        for fila in filas:
+            for nombre in _parse_etiquetas(fila.etiquetas):
+                clave = (fila.user_id, nombre)
+                if clave not in ids_etiquetas:
+                    ids_etiquetas[clave] = bind.execute(
+                        etiquetas.insert()
+                        .values(user_id=fila.user_id, nombre=nombre)
+                        .returning(etiquetas.c.id)
+                    ).scalar_one()
+                asociaciones.append({'contacto_id': fila.id, 'etiqueta_id': ids_etiquetas[clave]})
+
+        if asociaciones:
+            bind.execute(contacto_etiquetas.insert(), asociaciones)
+
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.drop_column('etiquetas')
+
+
+def downgrade():
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('etiquetas', sa.JSON(), nullable=True))
+
+    # Reconstruir la lista JSON de cada contacto a partir de la tabla de asociación
+    bind = op.get_bind()
+    filas = bind.execute(
+        sa.select(contacto_etiquetas.c.contacto_id, etiquetas.c.nombre)
+        .select_from(contacto_etiquetas.join(etiquetas, etiquetas.c.id == contacto_etiquetas.c.etiqueta_id))
+        .order_by(contacto_etiquetas.c.contacto_id, etiquetas.c.nombre)
+    ).fetchall()
+
+    por_contacto = {}
+    for fila in filas:
+        por_contacto.setdefault(fila.contacto_id, []).append(fila.nombre)
+
+    contactos_json = sa.table('contactos', sa.column('id', sa.Integer), sa.column('etiquetas', sa.JSON))
+    for contacto_id, nombres in por_contacto.items():
+        bind.execute(
+            contactos_json.update()
+            .where(contactos_json.c.id == contacto_id)
+            .values(etiquetas=nombres)
+        )
+
+    op.drop_index('ix_contacto_etiquetas_etiqueta_contacto', table_name='contacto_etiquetas')
+    op.drop_table('contacto_etiquetas')
+    op.drop_table('etiquetas')
@@ -0,0 +1,73 @@
+"""Add user_stats, user_stats_etiquetas and user_stats_empresas tables
+
+Revision ID: 8e3f1b6a4d27
+Revises: 5a1d7c2e9b40
+Create Date: 2026-10-18 12:40:05.102934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3f1b6a4d27'
+down_revision = '5a1d7c2e9b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_contactos', sa.Integer(), nullable=False),
+        sa.Column('total_interacciones', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table(
+        'user_stats_etiquetas',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'nombre')
+    )
+    op.create_table(
+        'user_stats_empresas',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('empresa', sa.String(length=100), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'empresa')
+    )
+
+    # Backfill con agregados set-based (misma lógica que `flask stats rebuild`)
+    op.execute("""
+        INSERT INTO user_stats (user_id, total_contactos, total_interacciones)
+        SELECT u.id,
+               (SELECT COUNT(*) FROM contactos c WHERE c.user_id = u.id),
+               (SELECT COUNT(*) FROM interacciones i
+                  JOIN contactos c ON c.id = i.contacto_id
+                 WHERE c.user_id = u.id)
+          FROM users u
+    """)
+    op.execute("""
+        INSERT INTO user_stats_etiquetas (user_id, nombre, cantidad)
+        SELECT e.user_id, e.nombre, COUNT(*)
+          FROM etiquetas e
+          JOIN contacto_etiquetas ce ON ce.etiqueta_id = e.id
+         GROUP BY e.user_id, e.nombre
+    """)
+    op.execute("""
+        INSERT INTO user_stats_empresas (user_id, empresa, cantidad)
+        SELECT user_id, COALESCE(TRIM(empresa), ''), COUNT(*)
+          FROM contactos
+         GROUP BY user_id, COALESCE(TRIM(empresa), '')
+    """)
+
+
+def downgrade():
+    op.drop_table('user_stats_empresas')
+    op.drop_table('user_stats_etiquetas')
+    op.drop_table('user_stats')
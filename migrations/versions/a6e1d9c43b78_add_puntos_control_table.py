@@ -0,0 +1,33 @@
+"""Add puntos_control table (checkpoints for batched data migrations)
+
+Revision ID: a6e1d9c43b78
+Revises: f4c7a2d85e16
+Create Date: 2026-10-18 22:31:17.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e1d9c43b78'
+down_revision = 'f4c7a2d85e16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'puntos_control',
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('ultimo_id', sa.Integer(), nullable=False),
+        sa.Column('leidas', sa.Integer(), nullable=False),
+        sa.Column('modificadas', sa.Integer(), nullable=False),
+        sa.Column('terminada', sa.Boolean(), nullable=False),
+        sa.Column('actualizado', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nombre')
+    )
+
+
+def downgrade():
+    op.drop_table('puntos_control')
@@ -0,0 +1,74 @@
+"""Add interacciones_periodo table (daily/weekly/monthly interaction rollups)
+
+Revision ID: b2f8e4a61c39
+Revises: a6e1d9c43b78
+Create Date: 2026-10-18 23:52:41.208315
+
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2f8e4a61c39'
+down_revision = 'a6e1d9c43b78'
+branch_labels = None
+depends_on = None
+
+
+def _inicios(dia):
+    """Inicio del día, la semana (lunes) y el mes que contienen a `dia`"""
+    if isinstance(dia, str):
+        dia = date.fromisoformat(dia[:10])
+    elif isinstance(dia, datetime):
+        dia = dia.date()
+    return (('dia', dia), ('semana', dia - timedelta(days=dia.weekday())), ('mes', dia.replace(day=1)))
+
+
+def upgrade():
+    tabla = op.create_table(
+        'interacciones_periodo',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('dimension', sa.String(length=10), nullable=False),
+        sa.Column('clave', sa.Integer(), nullable=False),
+        sa.Column('periodo', sa.String(length=6), nullable=False),
+        sa.Column('inicio', sa.Date(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'dimension', 'clave', 'periodo', 'inicio')
+    )
+
+    # Backfill: una pasada agrupada por contacto y día, el resto se deriva en Python
+    # (misma lógica que `flask analytics rebuild`)
+    conexion = op.get_bind()
+    etiquetas = defaultdict(list)
+    for contacto_id, etiqueta_id in conexion.execute(sa.text(
+            'SELECT contacto_id, etiqueta_id FROM contacto_etiquetas')):
+        etiquetas[contacto_id].append(etiqueta_id)
+
+    filas = conexion.execute(sa.text("""
+        SELECT c.user_id, i.contacto_id, DATE(i.fecha) AS dia, COUNT(*)
+          FROM interacciones i
+          JOIN contactos c ON c.id = i.contacto_id
+         GROUP BY c.user_id, i.contacto_id, DATE(i.fecha)
+    """))
+    cantidades = Counter()
+    for user_id, contacto_id, dia, cantidad in filas:
+        dimensiones = [('total', 0), ('contacto', contacto_id)]
+        dimensiones += [('etiqueta', etiqueta_id) for etiqueta_id in etiquetas.get(contacto_id, ())]
+        for periodo, inicio in _inicios(dia):
+            for dimension, clave in dimensiones:
+                cantidades[(user_id, dimension, clave, periodo, inicio)] += cantidad
+
+    if cantidades:
+        op.bulk_insert(tabla, [
+            {'user_id': user_id, 'dimension': dimension, 'clave': clave,
+             'periodo': periodo, 'inicio': inicio, 'cantidad': cantidad}
+            for (user_id, dimension, clave, periodo, inicio), cantidad in cantidades.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('interacciones_periodo')
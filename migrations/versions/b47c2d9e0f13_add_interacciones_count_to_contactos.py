@@ -0,0 +1,36 @@
+"""Add interacciones_count to contactos and recompute ultima_interaccion
+
+Revision ID: b47c2d9e0f13
+Revises: 8e3f1b6a4d27
+Create Date: 2026-10-18 15:02:47.663120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47c2d9e0f13'
+down_revision = '8e3f1b6a4d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('interacciones_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # A partir de aquí los eventos de Interaccion mantienen ambas columnas
+    op.execute("""
+        UPDATE contactos
+           SET interacciones_count = (SELECT COUNT(*) FROM interacciones i
+                                       WHERE i.contacto_id = contactos.id),
+               ultima_interaccion = COALESCE((SELECT MAX(i.fecha) FROM interacciones i
+                                               WHERE i.contacto_id = contactos.id),
+                                             contactos.fecha_creacion)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.drop_column('interacciones_count')
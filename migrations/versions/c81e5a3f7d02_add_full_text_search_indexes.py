@@ -0,0 +1,87 @@
+"""Add full-text search indexes (tsvector GIN on PostgreSQL, FTS5 on SQLite)
+
+Revision ID: c81e5a3f7d02
+Revises: b47c2d9e0f13
+Create Date: 2026-10-18 16:25:11.874512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e5a3f7d02'
+down_revision = 'b47c2d9e0f13'
+branch_labels = None
+depends_on = None
+
+# Copia de utils/search.py al momento de esta revisión
+VECTOR_CONTACTO = ("to_tsvector('spanish'::regconfig, coalesce({t}nombre, '') || ' ' || "
+                   "coalesce({t}email, '') || ' ' || coalesce({t}empresa, '') || ' ' || "
+                   "coalesce({t}notas, ''))")
+VECTOR_INTERACCION = "to_tsvector('spanish'::regconfig, coalesce({t}nota, ''))"
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_contactos_busqueda ON contactos USING gin ({VECTOR_CONTACTO.format(t='')})",
+    f"CREATE INDEX IF NOT EXISTS ix_interacciones_busqueda ON interacciones USING gin ({VECTOR_INTERACCION.format(t='')})",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contactos_fts USING fts5(
+           nombre, email, empresa, notas,
+           content='contactos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ai AFTER INSERT ON contactos BEGIN
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ad AFTER DELETE ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_au AFTER UPDATE OF nombre, email, empresa, notas ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS interacciones_fts USING fts5(
+           nota, content='interacciones', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ai AFTER INSERT ON interacciones BEGIN
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ad AFTER DELETE ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_au AFTER UPDATE OF nota ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+]
+
+SQLITE_REBUILD = [
+    "INSERT INTO contactos_fts(contactos_fts) VALUES ('rebuild')",
+    "INSERT INTO interacciones_fts(interacciones_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        for sentencia in POSTGRES_DDL:
+            op.execute(sentencia)
+    elif dialecto == 'sqlite':
+        for sentencia in SQLITE_DDL + SQLITE_REBUILD:
+            op.execute(sentencia)
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_interacciones_busqueda")
+        op.execute("DROP INDEX IF EXISTS ix_contactos_busqueda")
+    elif dialecto == 'sqlite':
+        for trigger in ('contactos_fts_ai', 'contactos_fts_ad', 'contactos_fts_au',
+                        'interacciones_fts_ai', 'interacciones_fts_ad', 'interacciones_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS interacciones_fts")
+        op.execute("DROP TABLE IF EXISTS contactos_fts")
@@ -0,0 +1,31 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: d9a4f6b21c58
+Revises: c81e5a3f7d02
+Create Date: 2026-10-18 17:48:30.219047
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4f6b21c58'
+down_revision = 'c81e5a3f7d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_contactos_user_ultima_interaccion', 'contactos',
+                    ['user_id', 'ultima_interaccion', 'id'], unique=False)
+    op.create_index('ix_interacciones_contacto_fecha', 'interacciones',
+                    ['contacto_id', 'fecha', 'id'], unique=False)
+    op.create_index('ix_interacciones_fecha_id', 'interacciones',
+                    ['fecha', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_interacciones_fecha_id', table_name='interacciones')
+    op.drop_index('ix_interacciones_contacto_fecha', table_name='interacciones')
+    op.drop_index('ix_contactos_user_ultima_interaccion', table_name='contactos')
@@ -0,0 +1,42 @@
+"""Add composite indexes and per-user unique email on contactos
+
+Revision ID: e2b8c4d17a93
+Revises: d9a4f6b21c58
+Create Date: 2026-10-18 19:12:05.841266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c4d17a93'
+down_revision = 'd9a4f6b21c58'
+branch_labels = None
+depends_on = None
+
+CON_EMAIL = sa.text("email IS NOT NULL AND email <> ''")
+
+
+def upgrade():
+    # El índice único fallaría con duplicados previos: reportarlos con claridad antes
+    # de crear ningún índice (SQLite no revierte el DDL y el reintento fallaría)
+    conn = op.get_bind()
+    duplicados = conn.execute(sa.text(
+        "SELECT user_id, email, COUNT(*) FROM contactos "
+        "WHERE email IS NOT NULL AND email <> '' "
+        "GROUP BY user_id, email HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicados:
+        detalle = ', '.join(f'user_id={u} email={e} ({n})' for u, e, n in duplicados[:10])
+        raise RuntimeError(f'Hay contactos con email duplicado; corrígelos antes de migrar: {detalle}')
+
+    op.create_index('ix_contactos_user_fecha_creacion', 'contactos',
+                    ['user_id', 'fecha_creacion'], unique=False)
+    op.create_index('uq_contactos_user_email', 'contactos', ['user_id', 'email'], unique=True,
+                    postgresql_where=CON_EMAIL, sqlite_where=CON_EMAIL)
+
+
+def downgrade():
+    op.drop_index('uq_contactos_user_email', table_name='contactos')
+    op.drop_index('ix_contactos_user_fecha_creacion', table_name='contactos')
@@ -0,0 +1,95 @@
+"""Add user_id to interacciones and make contactos.ultima_interaccion NOT NULL
+
+Revision ID: e7a3c5b91d24
+Revises: b2f8e4a61c39
+Create Date: 2026-10-19 10:14:52.390417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5b91d24'
+down_revision = 'b2f8e4a61c39'
+branch_labels = None
+depends_on = None
+
+# Copia de los triggers FTS5 de utils/search.py: en SQLite batch_alter_table recrea
+# las tablas y con ellas se pierden los triggers
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ai AFTER INSERT ON contactos BEGIN
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ad AFTER DELETE ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_au AFTER UPDATE OF nombre, email, empresa, notas ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ai AFTER INSERT ON interacciones BEGIN
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ad AFTER DELETE ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_au AFTER UPDATE OF nota ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+]
+
+
+def _restaurar_triggers_fts():
+    conexion = op.get_bind()
+    if conexion.dialect.name != 'sqlite':
+        return
+    existe = conexion.execute(sa.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contactos_fts'")).first()
+    if existe:
+        for sentencia in SQLITE_TRIGGERS:
+            op.execute(sentencia)
+
+
+def upgrade():
+    # Los cursores ordenan por (ultima_interaccion, id): un NULL rompe la comparación
+    op.execute("""
+        UPDATE contactos
+           SET ultima_interaccion = COALESCE((SELECT MAX(i.fecha) FROM interacciones i
+                                               WHERE i.contacto_id = contactos.id),
+                                             contactos.fecha_creacion, CURRENT_TIMESTAMP)
+         WHERE ultima_interaccion IS NULL
+    """)
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.alter_column('ultima_interaccion', existing_type=sa.DateTime(), nullable=False)
+
+    with op.batch_alter_table('interacciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE interacciones
+           SET user_id = (SELECT c.user_id FROM contactos c WHERE c.id = interacciones.contacto_id)
+    """)
+    with op.batch_alter_table('interacciones', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_interacciones_user_id', 'users', ['user_id'], ['id'],
+                                    ondelete='CASCADE')
+        batch_op.drop_index('ix_interacciones_fecha_id')
+        batch_op.create_index('ix_interacciones_user_fecha', ['user_id', 'fecha', 'id'], unique=False)
+    _restaurar_triggers_fts()
+
+
+def downgrade():
+    with op.batch_alter_table('interacciones', schema=None) as batch_op:
+        batch_op.drop_index('ix_interacciones_user_fecha')
+        batch_op.create_index('ix_interacciones_fecha_id', ['fecha', 'id'], unique=False)
+        batch_op.drop_constraint('fk_interacciones_user_id', type_='foreignkey')
+        batch_op.drop_column('user_id')
+
+    with op.batch_alter_table('contactos', schema=None) as batch_op:
+        batch_op.alter_column('ultima_interaccion', existing_type=sa.DateTime(), nullable=True)
+    _restaurar_triggers_fts()
@@ -0,0 +1,32 @@
+"""Drop trabajos.entrada (uploads are stored in JOBS_UPLOAD_DIR)
+
+Revision ID: f1d6b3a82c57
+Revises: e7a3c5b91d24
+Create Date: 2026-10-19 11:02:17.548203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1d6b3a82c57'
+down_revision = 'e7a3c5b91d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las importaciones pendientes con el archivo en la fila no se pueden retomar
+    op.execute("""
+        UPDATE trabajos
+           SET estado = 'fallido', mensaje = 'Archivo no disponible tras la actualización'
+         WHERE tipo = 'importar' AND estado IN ('pendiente', 'en_curso')
+    """)
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.drop_column('entrada')
+
+
+def downgrade():
+    with op.batch_alter_table('trabajos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('entrada', sa.Text(), nullable=True))
@@ -0,0 +1,51 @@
+"""Add trabajos table (background job queue)
+
+Revision ID: f4c7a2d85e16
+Revises: e2b8c4d17a93
+Create Date: 2026-10-18 21:05:43.218604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c7a2d85e16'
+down_revision = 'e2b8c4d17a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'trabajos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('parametros', sa.JSON(), nullable=True),
+        sa.Column('entrada', sa.Text(), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=False),
+        sa.Column('max_intentos', sa.Integer(), nullable=False),
+        sa.Column('progreso', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('mensaje', sa.String(length=255), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('disponible_en', sa.DateTime(), nullable=False),
+        sa.Column('latido', sa.DateTime(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.Column('fecha_inicio', sa.DateTime(), nullable=True),
+        sa.Column('fecha_fin', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_trabajos_user_id', 'trabajos', ['user_id'])
+    op.create_index('ix_trabajos_estado_disponible', 'trabajos', ['estado', 'disponible_en'])
+
+
+def downgrade():
+    op.drop_index('ix_trabajos_estado_disponible', table_name='trabajos')
+    op.drop_index('ix_trabajos_user_id', table_name='trabajos')
+    op.drop_table('trabajos')
@@ -1,11 +1,50 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.util import identity_key
 from datetime import datetime
-import bcrypt
+from utils.passwords import hash_password, verify_password, necesita_rehash
 import json
 
 db = SQLAlchemy()
 
+def parse_etiquetas(valor):
+    """
+    Convierte etiquetas en formato JSON o separado por comas a una lista limpia.
+    ValueError si no es texto ni una lista.
+    """
+    if not valor:
+        return []
+    if isinstance(valor, (list, tuple)):
+        etiquetas_list = valor
+    elif not isinstance(valor, str):
+        raise ValueError('etiquetas debe ser texto o una lista')
+    else:
+        try:
+            etiquetas_list = json.loads(valor)
+        except (json.JSONDecodeError, TypeError):
+            etiquetas_list = valor.split(',')
+        if not isinstance(etiquetas_list, list):
+            etiquetas_list = [str(etiquetas_list)]
+    
+    # Limpiar espacios y eliminar duplicados conservando el orden
+    resultado = []
+    for tag in etiquetas_list:
+        tag = str(tag).strip()[:50]
+        if tag and tag not in resultado:
+            resultado.append(tag)
+    return resultado
+
+# Tabla de asociación contacto <-> etiqueta
+contacto_etiquetas = db.Table(
+    'contacto_etiquetas',
+    db.Column('contacto_id', db.Integer, db.ForeignKey('contactos.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('etiqueta_id', db.Integer, db.ForeignKey('etiquetas.id', ondelete='CASCADE'), primary_key=True),
+    # Índice inverso para resolver "contactos con la etiqueta X" sin recorrer la PK
+    db.Index('ix_contacto_etiquetas_etiqueta_contacto', 'etiqueta_id', 'contacto_id')
+)
+
 class User(UserMixin, db.Model):
     """Modelo de usuario para autenticación"""
     __tablename__ = 'users'
@@ -19,14 +58,19 @@ class User(UserMixin, db.Model):
     
     # Relación con contactos
     contactos = db.relationship('Contacto', backref='usuario', lazy=True, cascade='all, delete-orphan')
+    etiquetas = db.relationship('Etiqueta', backref='usuario', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hashea y guarda la contraseña"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hashea y guarda la contraseña (en el pool de utils.passwords)"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Verifica la contraseña"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return verify_password(password, self.password_hash)
+    
+    def password_necesita_rehash(self):
+        """True si el hash guardado no usa el costo BCRYPT_ROUNDS actual"""
+        return necesita_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -41,62 +85,321 @@ class Contacto(db.Model):
     email = db.Column(db.String(120), nullable=True)
     telefono = db.Column(db.String(20), nullable=True)
     empresa = db.Column(db.String(100), nullable=True)
-    etiquetas = db.Column(db.Text, nullable=True, default='')  # Almacenar como JSON string para compatibilidad
     notas = db.Column(db.Text, nullable=True)
-    ultima_interaccion = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: es la primera columna del cursor de los listados (sin interacciones, fecha de creación)
+    ultima_interaccion = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Contador desnormalizado, mantenido por los eventos de Interaccion (ver más abajo)
+    interacciones_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relación con interacciones
     interacciones = db.relationship('Interaccion', backref='contacto', lazy=True, cascade='all, delete-orphan')
     
-    def actualizar_ultima_interaccion(self):
-        """Actualiza la fecha de última interacción"""
-        self.ultima_interaccion = datetime.now()  # Usar hora local
-        self.fecha_actualizacion = datetime.now()  # Usar hora local
+    # Relación con etiquetas (selectin: una sola consulta extra por página de contactos)
+    etiquetas = db.relationship('Etiqueta', secondary=contacto_etiquetas, lazy='selectin',
+                                order_by='Etiqueta.nombre', back_populates='contactos')
     
     def get_etiquetas_str(self):
         """Retorna las etiquetas como string separado por comas"""
-        if self.etiquetas:
-            try:
-                # Intentar cargar como JSON
-                etiquetas_list = json.loads(self.etiquetas)
-                return ', '.join(etiquetas_list) if etiquetas_list else ''
-            except (json.JSONDecodeError, TypeError):
-                # Si no es JSON válido, asumir que es string separado por comas
-                return self.etiquetas
-        return ''
+        return ', '.join(self.get_etiquetas_list())
     
     def set_etiquetas_from_str(self, etiquetas_str):
         """Establece las etiquetas desde un string separado por comas"""
-        if etiquetas_str:
-            etiquetas_list = [tag.strip() for tag in etiquetas_str.split(',') if tag.strip()]
-            self.etiquetas = json.dumps(etiquetas_list)  # Guardar como JSON
-        else:
-            self.etiquetas = json.dumps([])  # Lista vacía como JSON
+        nombres = parse_etiquetas(etiquetas_str.split(',') if etiquetas_str else [])
+        self.etiquetas = Etiqueta.obtener_o_crear(self.user_id, nombres)
     
     def get_etiquetas_list(self):
         """Retorna las etiquetas como lista de Python"""
-        if self.etiquetas:
-            try:
-                return json.loads(self.etiquetas)
-            except (json.JSONDecodeError, TypeError):
-                # Si no es JSON válido, convertir string a lista
-                return [tag.strip() for tag in self.etiquetas.split(',') if tag.strip()]
-        return []
+        return [etiqueta.nombre for etiqueta in self.etiquetas]
     
     def __repr__(self):
         return f'<Contacto {self.nombre}>'
 
+class Etiqueta(db.Model):
+    """Modelo de etiqueta, única por usuario"""
+    __tablename__ = 'etiquetas'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'nombre', name='uq_etiquetas_user_id_nombre'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    nombre = db.Column(db.String(50), nullable=False)
+    
+    contactos = db.relationship('Contacto', secondary=contacto_etiquetas, lazy='dynamic',
+                                back_populates='etiquetas')
+    
+    @classmethod
+    def obtener_o_crear(cls, user_id, nombres):
+        """Devuelve las etiquetas del usuario con esos nombres, creando las que falten"""
+        if not nombres:
+            return []
+        
+        with db.session.no_autoflush:
+            existentes = {
+                etiqueta.nombre: etiqueta
+                for etiqueta in cls.query.filter(cls.user_id == user_id, cls.nombre.in_(nombres))
+            }
+        
+        etiquetas = []
+        for nombre in nombres:
+            etiqueta = existentes.get(nombre)
+            if etiqueta is None:
+                etiqueta = cls(user_id=user_id, nombre=nombre)
+                db.session.add(etiqueta)
+                existentes[nombre] = etiqueta
+            etiquetas.append(etiqueta)
+        return etiquetas
+    
+    def cantidad_contactos(self):
+        """Cantidad de contactos con esta etiqueta (solo lee el índice de la asociación)"""
+        return db.session.query(db.func.count())\
+                         .select_from(contacto_etiquetas)\
+                         .filter(contacto_etiquetas.c.etiqueta_id == self.id)\
+                         .scalar()
+    
+    @classmethod
+    def nombres_en_uso(cls, user_id):
+        """Nombres de las etiquetas del usuario asignadas a algún contacto"""
+        en_uso = db.exists().where(contacto_etiquetas.c.etiqueta_id == cls.id)
+        filas = db.session.query(cls.nombre)\
+                          .filter(cls.user_id == user_id, en_uso)\
+                          .order_by(cls.nombre)\
+                          .all()
+        return [fila.nombre for fila in filas]
+    
+    @classmethod
+    def conteo_por_usuario(cls, user_id, limite=None):
+        """Lista de (nombre, cantidad de contactos) ordenada por frecuencia"""
+        cantidad = db.func.count(contacto_etiquetas.c.contacto_id)
+        query = db.session.query(cls.nombre, cantidad.label('cantidad'))\
+                          .join(contacto_etiquetas, contacto_etiquetas.c.etiqueta_id == cls.id)\
+                          .filter(cls.user_id == user_id)\
+                          .group_by(cls.nombre)\
+                          .order_by(cantidad.desc(), cls.nombre)
+        if limite:
+            query = query.limit(limite)
+        return [(fila.nombre, fila.cantidad) for fila in query.all()]
+    
+    def __repr__(self):
+        return f'<Etiqueta {self.nombre}>'
+
 class Interaccion(db.Model):
     """Modelo de interacción con contactos"""
     __tablename__ = 'interacciones'
     
     id = db.Column(db.Integer, primary_key=True)
     contacto_id = db.Column(db.Integer, db.ForeignKey('contactos.id'), nullable=False, index=True)
+    # Copia de contactos.user_id para paginar las interacciones de un usuario sin recorrer las de todos
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     fecha = db.Column(db.DateTime, default=datetime.now, nullable=False)  # Usar hora local
     nota = db.Column(db.Text, nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.now)  # Usar hora local
     
     def __repr__(self):
-        return f'<Interaccion {self.id} - {self.fecha}>'
\ No newline at end of file
+        return f'<Interaccion {self.id} - {self.fecha}>'
+
+# Índices compuestos para la paginación por cursor (se recorren en orden inverso para DESC)
+db.Index('ix_contactos_user_ultima_interaccion', Contacto.user_id, Contacto.ultima_interaccion, Contacto.id)
+db.Index('ix_interacciones_contacto_fecha', Interaccion.contacto_id, Interaccion.fecha, Interaccion.id)
+db.Index('ix_interacciones_user_fecha', Interaccion.user_id, Interaccion.fecha, Interaccion.id)
+
+# Contactos creados en un período (estadísticas del mes)
+db.Index('ix_contactos_user_fecha_creacion', Contacto.user_id, Contacto.fecha_creacion)
+
+# Email único por usuario; los contactos sin email no participan
+_con_email = db.and_(Contacto.email.isnot(None), Contacto.email != '')
+db.Index('uq_contactos_user_email', Contacto.user_id, Contacto.email, unique=True,
+         postgresql_where=_con_email, sqlite_where=_con_email)
+
+# Mantenimiento de Contacto.interacciones_count y Contacto.ultima_interaccion.
+# Se ejecuta dentro del flush, en la misma transacción que la escritura.
+def _registrar_contacto_afectado(connection, target, contacto_id):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('contactos_afectados', set()).add(contacto_id)
+
+def _recalcular_ultima_interaccion(connection, contacto_id, delta):
+    contactos = Contacto.__table__
+    interacciones = Interaccion.__table__
+    ultima_fecha = db.select(db.func.max(interacciones.c.fecha))\
+                     .where(interacciones.c.contacto_id == contacto_id)\
+                     .scalar_subquery()
+    connection.execute(
+        contactos.update()
+        .where(contactos.c.id == contacto_id)
+        .values(interacciones_count=contactos.c.interacciones_count + delta,
+                ultima_interaccion=db.func.coalesce(ultima_fecha, contactos.c.fecha_creacion))
+    )
+
+@event.listens_for(Interaccion, 'before_insert')
+@event.listens_for(Interaccion, 'before_update')
+def _copiar_user_id(mapper, connection, target):
+    """Interaccion.user_id sigue al contacto (también si la interacción cambia de contacto)"""
+    if target.user_id is None or db.inspect(target).attrs.contacto_id.history.has_changes():
+        contactos = Contacto.__table__
+        target.user_id = connection.execute(
+            db.select(contactos.c.user_id).where(contactos.c.id == target.contacto_id)
+        ).scalar()
+
+@event.listens_for(Interaccion, 'after_insert')
+def _interaccion_insertada(mapper, connection, target):
+    contactos = Contacto.__table__
+    # Con valores previos a la actualización: la primera interacción reemplaza la fecha de alta
+    connection.execute(
+        contactos.update()
+        .where(contactos.c.id == target.contacto_id)
+        .values(interacciones_count=contactos.c.interacciones_count + 1,
+                ultima_interaccion=db.case(
+                    (db.or_(contactos.c.interacciones_count == 0,
+                            contactos.c.ultima_interaccion < target.fecha), target.fecha),
+                    else_=contactos.c.ultima_interaccion))
+    )
+    _registrar_contacto_afectado(connection, target, target.contacto_id)
+
+@event.listens_for(Interaccion, 'after_update')
+def _interaccion_actualizada(mapper, connection, target):
+    estado = db.inspect(target)
+    cambio_contacto = estado.attrs.contacto_id.history
+    if cambio_contacto.has_changes():
+        for contacto_id in cambio_contacto.deleted or ():
+            _recalcular_ultima_interaccion(connection, contacto_id, -1)
+            _registrar_contacto_afectado(connection, target, contacto_id)
+        _recalcular_ultima_interaccion(connection, target.contacto_id, 1)
+    elif estado.attrs.fecha.history.has_changes():
+        _recalcular_ultima_interaccion(connection, target.contacto_id, 0)
+    else:
+        return
+    _registrar_contacto_afectado(connection, target, target.contacto_id)
+
+@event.listens_for(Interaccion, 'after_delete')
+def _interaccion_eliminada(mapper, connection, target):
+    # Si el contacto se elimina en el mismo flush (cascada) no hay nada que mantener
+    session = object_session(target)
+    if session is not None:
+        contacto = session.identity_map.get(identity_key(Contacto, target.contacto_id))
+        if contacto is not None and contacto in session.deleted:
+            return
+    _recalcular_ultima_interaccion(connection, target.contacto_id, -1)
+    _registrar_contacto_afectado(connection, target, target.contacto_id)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expirar_contactos_afectados(session, flush_context):
+    """Los valores se cambiaron por SQL: se expiran para releerlos al próximo acceso"""
+    for contacto_id in session.info.pop('contactos_afectados', ()):
+        contacto = session.identity_map.get(identity_key(Contacto, contacto_id))
+        if contacto is not None:
+            session.expire(contacto, ['interacciones_count', 'ultima_interaccion'])
+
+class UserStats(db.Model):
+    """Totales materializados por usuario, mantenidos en cada escritura"""
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total_contactos = db.Column(db.Integer, nullable=False, default=0)
+    total_interacciones = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<UserStats {self.user_id}>'
+
+class UserStatsEtiqueta(db.Model):
+    """Cantidad de contactos por etiqueta y usuario"""
+    __tablename__ = 'user_stats_etiquetas'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    nombre = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<UserStatsEtiqueta {self.nombre}: {self.cantidad}>'
+
+class UserStatsEmpresa(db.Model):
+    """Cantidad de contactos por empresa y usuario ('' = sin empresa)"""
+    __tablename__ = 'user_stats_empresas'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    empresa = db.Column(db.String(100), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<UserStatsEmpresa {self.empresa}: {self.cantidad}>'
+
+class Trabajo(db.Model):
+    """Trabajo en segundo plano; la tabla es la cola (ver utils/trabajos.py)"""
+    __tablename__ = 'trabajos'
+    
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    TERMINADO = 'terminado'
+    FALLIDO = 'fallido'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default=PENDIENTE)
+    parametros = db.Column(db.JSON, nullable=True)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    max_intentos = db.Column(db.Integer, nullable=False, default=3)
+    progreso = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    mensaje = db.Column(db.String(255), nullable=True)
+    resultado = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    disponible_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    latido = db.Column(db.DateTime, nullable=True)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_inicio = db.Column(db.DateTime, nullable=True)
+    fecha_fin = db.Column(db.DateTime, nullable=True)
+    
+    @property
+    def porcentaje(self):
+        if self.estado == self.TERMINADO:
+            return 100
+        if not self.total:
+            return None
+        return min(100, round(self.progreso * 100 / self.total))
+    
+    @property
+    def terminado(self):
+        return self.estado in (self.TERMINADO, self.FALLIDO)
+    
+    def __repr__(self):
+        return f'<Trabajo {self.id} {self.tipo} {self.estado}>'
+
+# Próximo trabajo a reclamar: pendientes por fecha de disponibilidad
+db.Index('ix_trabajos_estado_disponible', Trabajo.estado, Trabajo.disponible_en)
+
+class PuntoControl(db.Model):
+    """Avance guardado de una migración de datos por lotes (ver utils/lotes.py)"""
+    __tablename__ = 'puntos_control'
+    
+    nombre = db.Column(db.String(100), primary_key=True)
+    ultimo_id = db.Column(db.Integer, nullable=False, default=0)
+    leidas = db.Column(db.Integer, nullable=False, default=0)
+    modificadas = db.Column(db.Integer, nullable=False, default=0)
+    terminada = db.Column(db.Boolean, nullable=False, default=False)
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PuntoControl {self.nombre}: {self.ultimo_id}>'
+
+class InteraccionesPeriodo(db.Model):
+    """
+    Interacciones agregadas por período (día, semana, mes) para el total del
+    usuario, cada contacto y cada etiqueta; mantenidas en cada escritura (utils/analitica.py)
+    """
+    __tablename__ = 'interacciones_periodo'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # 'total' (clave 0), 'contacto' (clave = contacto_id) o 'etiqueta' (clave = etiqueta_id)
+    dimension = db.Column(db.String(10), primary_key=True)
+    clave = db.Column(db.Integer, primary_key=True)
+    # 'dia', 'semana' (inicio = lunes) o 'mes' (inicio = día 1)
+    periodo = db.Column(db.String(6), primary_key=True)
+    inicio = db.Column(db.Date, primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<InteraccionesPeriodo {self.dimension}:{self.clave} {self.periodo} {self.inicio}: {self.cantidad}>'
@@ -0,0 +1,336 @@
+"""
+API JSON versionada (/api/v1) para integraciones.
+
+- Campos a elección con ?fields=id,nombre,... (solo se leen esas columnas).
+- Paginación por cursor con ?cursor= y ?limit= (la misma de los listados HTML).
+- ETag débil en cada respuesta: con If-None-Match se responde 304 sin cuerpo.
+- Compresión brotli/gzip según Accept-Encoding (utils/compresion.py).
+
+Las comprobaciones de propiedad son las mismas que en routes/contactos.py y
+routes/interacciones.py: un recurso de otro usuario responde 404.
+"""
+from dataclasses import asdict
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify, abort, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.orm import contains_eager, load_only, lazyload
+from werkzeug.exceptions import HTTPException
+from models import db, Contacto, Interaccion, Etiqueta, UserStatsEtiqueta, Trabajo, contacto_etiquetas
+from utils.contadores import leer as leer_contadores
+from utils.pagination import paginate_keyset
+from utils.search import search_contacts
+from utils.statistics import DashboardStats, EstadisticasDashboard, DistribucionContactos, distribucion_contactos
+from utils.cache import cache
+from utils.compresion import comprimir
+from utils import analitica, seguimiento as seguimiento_contactos
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def _fecha(valor):
+    return valor.isoformat() if valor is not None else None
+
+# Campo -> función que lo obtiene del modelo
+CAMPOS_CONTACTO = {
+    'id': lambda c: c.id,
+    'nombre': lambda c: c.nombre,
+    'email': lambda c: c.email,
+    'telefono': lambda c: c.telefono,
+    'empresa': lambda c: c.empresa,
+    'notas': lambda c: c.notas,
+    'etiquetas': lambda c: c.get_etiquetas_list(),
+    'ultima_interaccion': lambda c: _fecha(c.ultima_interaccion),
+    'fecha_creacion': lambda c: _fecha(c.fecha_creacion),
+    'fecha_actualizacion': lambda c: _fecha(c.fecha_actualizacion),
+    'interacciones_count': lambda c: c.interacciones_count,
+}
+CAMPOS_CONTACTO_DEFECTO = ('id', 'nombre', 'email', 'telefono', 'empresa', 'etiquetas', 'ultima_interaccion')
+
+CAMPOS_INTERACCION = {
+    'id': lambda i: i.id,
+    'contacto_id': lambda i: i.contacto_id,
+    'fecha': lambda i: _fecha(i.fecha),
+    'nota': lambda i: i.nota,
+    'fecha_creacion': lambda i: _fecha(i.fecha_creacion),
+    'contacto': lambda i: {'id': i.contacto.id, 'nombre': i.contacto.nombre},
+}
+CAMPOS_INTERACCION_DEFECTO = ('id', 'contacto_id', 'fecha', 'nota')
+
+CAMPOS_ESTADISTICAS = tuple(EstadisticasDashboard.__dataclass_fields__)
+CAMPOS_DISTRIBUCION = tuple(DistribucionContactos.__dataclass_fields__)
+
+CAMPOS_TRABAJO = {
+    'id': lambda t: t.id,
+    'tipo': lambda t: t.tipo,
+    'estado': lambda t: t.estado,
+    'progreso': lambda t: t.progreso,
+    'total': lambda t: t.total,
+    'porcentaje': lambda t: t.porcentaje,
+    'mensaje': lambda t: t.mensaje,
+    'resultado': lambda t: t.resultado,
+    'error': lambda t: t.error,
+    'intentos': lambda t: t.intentos,
+    'max_intentos': lambda t: t.max_intentos,
+    'disponible_en': lambda t: _fecha(t.disponible_en),
+    'fecha_creacion': lambda t: _fecha(t.fecha_creacion),
+    'fecha_inicio': lambda t: _fecha(t.fecha_inicio),
+    'fecha_fin': lambda t: _fecha(t.fecha_fin),
+}
+CAMPOS_TRABAJO_DEFECTO = ('id', 'tipo', 'estado', 'progreso', 'total', 'porcentaje', 'mensaje', 'fecha_creacion')
+
+def _campos(disponibles, por_defecto):
+    """Campos pedidos en ?fields= (400 si alguno no existe) o los de por defecto"""
+    pedidos = request.args.get('fields')
+    if not pedidos:
+        return list(por_defecto)
+    campos = list(dict.fromkeys(campo.strip() for campo in pedidos.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos:
+        abort(400, description=f"Campos desconocidos: {', '.join(desconocidos)}")
+    return campos or list(por_defecto)
+
+def _limite():
+    limite = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limite, current_app.config['API_MAX_PAGE_SIZE']))
+
+def _serializar(objeto, campos, disponibles):
+    return {campo: disponibles[campo](objeto) for campo in campos}
+
+def _columnas(modelo, campos, claves):
+    """load_only con las columnas pedidas más las de la clave de orden"""
+    nombres = dict.fromkeys(list(claves) + [campo for campo in campos if campo in modelo.__table__.c])
+    return load_only(*(getattr(modelo, nombre) for nombre in nombres))
+
+def _opciones_contacto(campos):
+    opciones = [_columnas(Contacto, campos, ('id', 'ultima_interaccion'))]
+    if 'etiquetas' not in campos:
+        # Sin etiquetas no hace falta la consulta selectin
+        opciones.append(lazyload(Contacto.etiquetas))
+    return opciones
+
+def _pagina(pagina, campos, disponibles):
+    return {
+        'data': [_serializar(item, campos, disponibles) for item in pagina.items],
+        'total': pagina.total,
+        'next_cursor': pagina.next_cursor,
+        'prev_cursor': pagina.prev_cursor,
+    }
+
+def _rango():
+    """?desde= y ?hasta= (AAAA-MM-DD, incluidas); por defecto los últimos 30 días"""
+    try:
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else date.today()
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else hasta - timedelta(days=29)
+    except ValueError:
+        abort(400, description='Fechas inválidas: usa el formato AAAA-MM-DD')
+    if desde > hasta:
+        abort(400, description='La fecha desde no puede ser posterior a hasta')
+    return desde, hasta
+
+def _responder(datos):
+    """JSON con ETag débil; 304 si coincide con If-None-Match"""
+    response = jsonify(datos)
+    response.add_etag(weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@api_bp.after_request
+def _comprimir(response):
+    return comprimir(response, request, current_app.config['API_COMPRESS_MIN_BYTES'])
+
+@api_bp.errorhandler(HTTPException)
+def _error(error):
+    response = jsonify({'error': {'codigo': error.code, 'mensaje': error.description}})
+    response.status_code = error.code
+    return response
+
+@api_bp.route('/contactos')
+@login_required
+def contactos():
+    """Contactos del usuario: ?search=, ?etiqueta=, ?fields=, ?cursor=, ?limit="""
+    campos = _campos(CAMPOS_CONTACTO, CAMPOS_CONTACTO_DEFECTO)
+    limite = _limite()
+    search = request.args.get('search', '')
+    etiqueta_filter = request.args.get('etiqueta', '')
+
+    etiqueta = None
+    if etiqueta_filter:
+        etiqueta = Etiqueta.query.filter_by(user_id=current_user.id, nombre=etiqueta_filter).first()
+        if not etiqueta:
+            return _responder({'data': [], 'total': 0, 'next_cursor': None, 'prev_cursor': None})
+
+    if search:
+        # Ordenada por relevancia: paginación por número de página como /contactos/api/buscar
+        resultados = search_contacts(current_user.id, search, page=request.args.get('page', 1, type=int),
+                                     per_page=limite, etiqueta_id=etiqueta.id if etiqueta else None)
+        return _responder({
+            'data': [_serializar(contacto, campos, CAMPOS_CONTACTO) for contacto in resultados.items],
+            'total': resultados.total,
+            'page': resultados.page,
+            'pages': resultados.pages,
+        })
+
+    query = Contacto.query.filter_by(user_id=current_user.id).options(*_opciones_contacto(campos))
+    if etiqueta:
+        query = query.join(contacto_etiquetas, contacto_etiquetas.c.contacto_id == Contacto.id)\
+                     .filter(contacto_etiquetas.c.etiqueta_id == etiqueta.id)
+        stats_etiqueta = db.session.get(UserStatsEtiqueta, (current_user.id, etiqueta.nombre))
+        total = stats_etiqueta.cantidad if stats_etiqueta else 0
+    else:
+        total = leer_contadores(current_user.id).total_contactos
+
+    pagina = paginate_keyset(query, [Contacto.ultima_interaccion, Contacto.id],
+                             cursor=request.args.get('cursor'), per_page=limite, total=total)
+    return _responder(_pagina(pagina, campos, CAMPOS_CONTACTO))
+
+@api_bp.route('/contactos/seguimiento')
+@login_required
+def contactos_seguimiento():
+    """Contactos sin interacciones en ?dias= días, del más olvidado al más reciente"""
+    campos = _campos(CAMPOS_CONTACTO, CAMPOS_CONTACTO_DEFECTO)
+    dias = seguimiento_contactos.dias_validos(request.args.get('dias', type=int))
+    pagina = seguimiento_contactos.pagina(current_user.id, dias, cursor=request.args.get('cursor'),
+                                          per_page=_limite(), opciones=_opciones_contacto(campos))
+    datos = _pagina(pagina, campos, CAMPOS_CONTACTO)
+    # Total acotado a FOLLOWUP_BADGE_MAX + 1 (el mismo valor cacheado del menú)
+    datos['total'] = seguimiento_contactos.pendientes(current_user.id, dias)
+    datos['dias'] = dias
+    return _responder(datos)
+
+@api_bp.route('/contactos/<int:id>')
+@login_required
+def contacto(id):
+    """Un contacto del usuario"""
+    campos = _campos(CAMPOS_CONTACTO, CAMPOS_CONTACTO_DEFECTO)
+    contacto = Contacto.query.filter_by(id=id, user_id=current_user.id)\
+                             .options(*_opciones_contacto(campos))\
+                             .first_or_404()
+    return _responder({'data': _serializar(contacto, campos, CAMPOS_CONTACTO)})
+
+@api_bp.route('/contactos/<int:id>/interacciones')
+@login_required
+def interacciones_contacto(id):
+    """Interacciones de un contacto, de la más reciente a la más antigua"""
+    campos = _campos(CAMPOS_INTERACCION, CAMPOS_INTERACCION_DEFECTO)
+    contacto = Contacto.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+
+    query = Interaccion.query.filter_by(contacto_id=contacto.id)\
+                             .options(_columnas(Interaccion, campos, ('id', 'fecha', 'contacto_id')))
+    pagina = paginate_keyset(query, [Interaccion.fecha, Interaccion.id],
+                             cursor=request.args.get('cursor'), per_page=_limite(),
+                             total=contacto.interacciones_count)
+    return _responder(_pagina(pagina, campos, CAMPOS_INTERACCION))
+
+@api_bp.route('/interacciones')
+@login_required
+def interacciones():
+    """Interacciones recientes de todos los contactos del usuario"""
+    campos = _campos(CAMPOS_INTERACCION, CAMPOS_INTERACCION_DEFECTO)
+    query = db.session.query(Interaccion)\
+                      .join(Contacto)\
+                      .options(_columnas(Interaccion, campos, ('id', 'fecha', 'contacto_id')))\
+                      .filter(Interaccion.user_id == current_user.id)
+    if 'contacto' in campos:
+        query = query.options(contains_eager(Interaccion.contacto).load_only(Contacto.id, Contacto.nombre))
+
+    pagina = paginate_keyset(query, [Interaccion.fecha, Interaccion.id],
+                             cursor=request.args.get('cursor'), per_page=_limite(),
+                             total=leer_contadores(current_user.id).total_interacciones)
+    return _responder(_pagina(pagina, campos, CAMPOS_INTERACCION))
+
+@api_bp.route('/interacciones/<int:id>')
+@login_required
+def interaccion(id):
+    """Una interacción de un contacto del usuario"""
+    campos = _campos(CAMPOS_INTERACCION, CAMPOS_INTERACCION_DEFECTO)
+    interaccion = Interaccion.query.join(Contacto)\
+                                   .options(contains_eager(Interaccion.contacto))\
+                                   .filter(Interaccion.id == id,
+                                           Contacto.user_id == current_user.id)\
+                                   .first_or_404()
+    return _responder({'data': _serializar(interaccion, campos, CAMPOS_INTERACCION)})
+
+@api_bp.route('/estadisticas')
+@login_required
+def estadisticas():
+    """Cifras del dashboard, cacheadas hasta la próxima escritura del usuario"""
+    campos = _campos(CAMPOS_ESTADISTICAS, CAMPOS_ESTADISTICAS)
+    resultado = asdict(cache.obtener(current_user.id, 'dashboard', DashboardStats(current_user.id).calcular))
+    return _responder({'data': {campo: resultado[campo] for campo in campos}})
+
+@api_bp.route('/estadisticas/distribucion')
+@login_required
+def estadisticas_distribucion():
+    """Contactos por empresa, etiqueta y mes de alta, cacheados hasta la próxima escritura del usuario"""
+    campos = _campos(CAMPOS_DISTRIBUCION, CAMPOS_DISTRIBUCION)
+    resultado = asdict(cache.obtener(current_user.id, 'distribucion',
+                                     lambda: distribucion_contactos(current_user.id)))
+    return _responder({'data': {campo: resultado[campo] for campo in campos}})
+
+@api_bp.route('/analitica/interacciones')
+@login_required
+def analitica_interacciones():
+    """
+    Serie de interacciones por ?periodo=dia|semana|mes entre ?desde= y ?hasta=,
+    con los períodos vacíos en 0; de un ?contacto=<id> o una ?etiqueta=<nombre>
+    """
+    desde, hasta = _rango()
+    periodo = request.args.get('periodo', 'dia')
+    if periodo not in analitica.PERIODOS:
+        abort(400, description=f"Período desconocido: {periodo} (usa {', '.join(analitica.PERIODOS)})")
+    if analitica.cantidad_puntos(desde, hasta, periodo) > analitica.MAX_PUNTOS:
+        abort(400, description=f'El rango supera los {analitica.MAX_PUNTOS} puntos: usa un período más largo')
+
+    dimension, clave = analitica.TOTAL, 0
+    if request.args.get('contacto'):
+        contacto = Contacto.query.filter_by(id=request.args.get('contacto', type=int), user_id=current_user.id)\
+                                 .options(load_only(Contacto.id), lazyload(Contacto.etiquetas))\
+                                 .first_or_404()
+        dimension, clave = analitica.CONTACTO, contacto.id
+    elif request.args.get('etiqueta'):
+        etiqueta = Etiqueta.query.filter_by(user_id=current_user.id, nombre=request.args['etiqueta']).first_or_404()
+        dimension, clave = analitica.ETIQUETA, etiqueta.id
+
+    serie = analitica.serie(current_user.id, desde, hasta, periodo, dimension, clave)
+    return _responder({
+        'data': [{'inicio': inicio.isoformat(), 'cantidad': cantidad} for inicio, cantidad in serie],
+        'total': sum(cantidad for _, cantidad in serie),
+        'periodo': periodo,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+    })
+
+@api_bp.route('/analitica/desglose')
+@login_required
+def analitica_desglose():
+    """Etiquetas (?dimension=etiqueta) o contactos (?dimension=contacto) con más interacciones en el rango"""
+    desde, hasta = _rango()
+    dimension = request.args.get('dimension', analitica.ETIQUETA)
+    if dimension not in (analitica.ETIQUETA, analitica.CONTACTO):
+        abort(400, description=f'Dimensión desconocida: {dimension} (usa etiqueta o contacto)')
+
+    filas = analitica.desglose(current_user.id, desde, hasta, dimension, limite=_limite())
+    return _responder({
+        'data': [{'id': clave, 'nombre': nombre, 'cantidad': cantidad} for clave, nombre, cantidad in filas],
+        'total': analitica.total(current_user.id, desde, hasta),
+        'dimension': dimension,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+    })
+
+@api_bp.route('/trabajos')
+@login_required
+def trabajos():
+    """Trabajos en segundo plano del usuario, del más nuevo al más viejo"""
+    campos = _campos(CAMPOS_TRABAJO, CAMPOS_TRABAJO_DEFECTO)
+    pagina = paginate_keyset(Trabajo.query.filter_by(user_id=current_user.id), [Trabajo.id],
+                             cursor=request.args.get('cursor'), per_page=_limite())
+    return _responder(_pagina(pagina, campos, CAMPOS_TRABAJO))
+
+@api_bp.route('/trabajos/<int:id>')
+@login_required
+def trabajo(id):
+    """Estado y avance de un trabajo, para consultar periódicamente"""
+    campos = _campos(CAMPOS_TRABAJO, CAMPOS_TRABAJO_DEFECTO)
+    trabajo = Trabajo.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    return _responder({'data': _serializar(trabajo, campos, CAMPOS_TRABAJO)})
@@ -1,55 +1,58 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User
+from utils.sesion import invalidar_principal
+from utils.passwords import ServicioSaturado
 from urllib.parse import urlparse
-import os
+import logging
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
+logger = logging.getLogger('minicrm.auth')
+
+def _servicio_saturado(template):
+    """Respuesta 503 cuando el pool de contraseñas rechaza el trabajo"""
+    flash('Hay demasiados intentos en este momento. Inténtalo de nuevo en unos segundos.', 'error')
+    return render_template(template), 503, {'Retry-After': '5'}
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Ruta de inicio de sesión"""
     if request.method == 'POST':
         try:
-            print("[DEBUG VERCEL] Iniciando proceso de login")
             email = request.form.get('email')
             password = request.form.get('password')
             
-            print(f"[DEBUG VERCEL] Email recibido: {email}")
-            print(f"[DEBUG VERCEL] Password length: {len(password) if password else 0}")
-            
             if not email or not password:
-                print("[DEBUG VERCEL] Email o password faltante")
+                logger.debug('Login con campos faltantes')
                 flash('Por favor, completa todos los campos.', 'error')
                 return render_template('auth/login.html')
             
-            print("[DEBUG VERCEL] Buscando usuario en base de datos")
             user = User.query.filter_by(email=email).first()
             
             if not user:
-                print(f"[DEBUG VERCEL] Usuario no encontrado: {email}")
+                logger.info('Login fallido', extra={'campos': {'motivo': 'usuario_inexistente'}})
                 flash('Credenciales inválidas.', 'error')
                 return render_template('auth/login.html')
             
-            print(f"[DEBUG VERCEL] Usuario encontrado: {user.nombre}")
-            print(f"[DEBUG VERCEL] Verificando contraseña...")
-            
             if user.check_password(password):
-                print("[DEBUG VERCEL] Contraseña correcta, iniciando sesión")
+                if user.password_necesita_rehash():
+                    # BCRYPT_ROUNDS cambió: regenerar el hash con el costo actual
+                    user.set_password(password)
+                    db.session.commit()
                 login_user(user, remember=request.form.get('remember'))
+                logger.info('Login correcto', extra={'campos': {'user_id': user.id}})
                 next_page = request.args.get('next')
-                print(f"[DEBUG VERCEL] Redirigiendo a: {next_page or '/dashboard'}")
                 return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
             else:
-                print("[DEBUG VERCEL] Contraseña incorrecta")
+                logger.info('Login fallido', extra={'campos': {'motivo': 'password', 'user_id': user.id}})
                 flash('Credenciales inválidas.', 'error')
                 return render_template('auth/login.html')
                 
-        except Exception as e:
-            print(f"[DEBUG VERCEL] Error en login: {str(e)}")
-            print(f"[DEBUG VERCEL] Error type: {type(e).__name__}")
-            import traceback
-            print(f"[DEBUG VERCEL] Traceback: {traceback.format_exc()}")
+        except ServicioSaturado:
+            logger.warning('Login rechazado: pool de contraseñas saturado')
+            return _servicio_saturado('auth/login.html')
+        except Exception:
+            logger.exception('Error en login')
             flash('Error de conexión. Inténtalo de nuevo.', 'error')
             return render_template('auth/login.html')
     
@@ -82,43 +85,34 @@ def register():
         
         # Verificar si el email ya existe
         try:
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] Checking if email exists: {email}")
-            
             existing_user = User.query.filter_by(email=email).first()
             
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] Email exists: {'Yes' if existing_user else 'No'}")
-            
             if existing_user:
+                logger.debug('Registro con email ya existente')
                 flash('Este email ya está registrado.', 'error')
                 return render_template('auth/register.html')
-        except Exception as e:
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] Error checking existing user: {str(e)}")
+        except Exception:
+            logger.exception('Error verificando si el email existe')
             flash('Error de conexión. Inténtalo de nuevo.', 'error')
             return render_template('auth/register.html')
         
         # Crear nuevo usuario
         try:
-            # Debug logging para producción
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] Attempting to create user: {email}")
-            
             user = User(nombre=nombre, email=email)
             user.set_password(password)
             db.session.add(user)
             db.session.commit()
-            
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] User created successfully: {user.id}")
+            logger.info('Usuario registrado', extra={'campos': {'user_id': user.id}})
             
             flash('¡Registro exitoso! Ahora puedes iniciar sesión.', 'success')
             return redirect(url_for('auth.login'))
-        except Exception as e:
+        except ServicioSaturado:
+            db.session.rollback()
+            logger.warning('Registro rechazado: pool de contraseñas saturado')
+            return _servicio_saturado('auth/register.html')
+        except Exception:
             db.session.rollback()
-            if os.environ.get('FLASK_ENV') == 'production':
-                print(f"[DEBUG] Error creating user: {str(e)}")
+            logger.exception('Error creando usuario')
             flash('Error al crear la cuenta. Inténtalo de nuevo.', 'error')
     
     return render_template('auth/register.html')
@@ -127,6 +121,7 @@ def register():
 @login_required
 def logout():
     """Cerrar sesión"""
+    invalidar_principal(current_user.id)
     logout_user()
     flash('Has cerrado sesión correctamente.', 'info')
     return redirect(url_for('main.index'))
\ No newline at end of file
@@ -1,61 +1,84 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+import os
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, \
+    Response, stream_with_context, abort
 from flask_login import login_required, current_user
-from models import db, Contacto, Interaccion
-from sqlalchemy import or_, desc
+from models import db, Contacto, Interaccion, Etiqueta, UserStatsEtiqueta, Trabajo, contacto_etiquetas
+from sqlalchemy import desc, false
 from datetime import datetime
+from utils.contadores import registrar_contacto, registrar_cambio_contacto, snapshot_contacto, \
+    asegurar as asegurar_contadores, leer as leer_contadores
+from utils.pagination import paginate_keyset
+from utils.search import search_contacts
+from utils.cache import cache
+from utils.importacion import formato_por_nombre, ErrorImportacion, ResultadoImportacion
+from utils.trabajos import encolar, guardar_adjunto
+from utils import exportacion, analitica, seguimiento as seguimiento_contactos
 
 contactos_bp = Blueprint('contactos', __name__, url_prefix='/contactos')
 
+def _etiquetas_en_uso(user_id):
+    """Nombres de etiquetas en uso, cacheados hasta la próxima escritura del usuario"""
+    return cache.obtener(user_id, 'etiquetas', lambda: Etiqueta.nombres_en_uso(user_id))
+
 @contactos_bp.route('/')
 @login_required
 def listar():
     """Lista todos los contactos del usuario con búsqueda y filtros"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     etiqueta_filter = request.args.get('etiqueta', '')
     
-    # Query base
-    query = Contacto.query.filter_by(user_id=current_user.id)
-    
-    # Aplicar búsqueda
-    if search:
-        query = query.filter(
-            or_(
-                Contacto.nombre.ilike(f'%{search}%'),
-                Contacto.email.ilike(f'%{search}%'),
-                Contacto.empresa.ilike(f'%{search}%')
-            )
-        )
-    
-    # Aplicar filtro por etiqueta
+    # Resolver la etiqueta por el índice (user_id, nombre)
+    etiqueta = None
     if etiqueta_filter:
-        # Buscar en el campo JSON de etiquetas
-        contactos_con_etiqueta = []
-        for contacto in query.all():
-            if etiqueta_filter in contacto.get_etiquetas_list():
-                contactos_con_etiqueta.append(contacto.id)
+        etiqueta = Etiqueta.query.filter_by(user_id=current_user.id, nombre=etiqueta_filter).first()
+    
+    if etiqueta_filter and not etiqueta:
+        # Si la etiqueta no existe, devolver página vacía sin tocar contactos
+        contactos = Contacto.query.filter(false()).paginate(page=page, per_page=10, error_out=False, count=False)
+        contactos.total = 0
+    elif search:
+        # Búsqueda de texto completo, ordenada por relevancia
+        contactos = search_contacts(current_user.id, search, page=page, per_page=10,
+                                    etiqueta_id=etiqueta.id if etiqueta else None)
+    else:
+        query = Contacto.query.filter_by(user_id=current_user.id)
         
-        if contactos_con_etiqueta:
-            query = query.filter(Contacto.id.in_(contactos_con_etiqueta))
+        if etiqueta:
+            # Unir directamente con contacto_etiquetas por (etiqueta_id, contacto_id)
+            query = query.join(contacto_etiquetas, contacto_etiquetas.c.contacto_id == Contacto.id)\
+                         .filter(contacto_etiquetas.c.etiqueta_id == etiqueta.id)
+            stats_etiqueta = db.session.get(UserStatsEtiqueta, (current_user.id, etiqueta.nombre))
+            total = stats_etiqueta.cantidad if stats_etiqueta else 0
         else:
-            # Si no hay contactos con esa etiqueta, devolver query vacío
-            query = query.filter(Contacto.id == -1)
-    
-    # Ordenar por última interacción
-    contactos = query.order_by(desc(Contacto.ultima_interaccion)).paginate(
-        page=page, per_page=10, error_out=False
-    )
+            total = leer_contadores(current_user.id).total_contactos
+        
+        # Paginación por cursor sobre (ultima_interaccion, id), índice ix_contactos_user_ultima_interaccion
+        contactos = paginate_keyset(query, [Contacto.ultima_interaccion, Contacto.id],
+                                    cursor=cursor, per_page=10, total=total)
     
     # Obtener todas las etiquetas únicas para el filtro
-    todas_etiquetas = set()
-    for contacto in Contacto.query.filter_by(user_id=current_user.id).all():
-        todas_etiquetas.update(contacto.get_etiquetas_list())
+    todas_etiquetas = _etiquetas_en_uso(current_user.id)
     
     return render_template('contactos/listar.html', 
                          contactos=contactos,
                          search=search,
                          etiqueta_filter=etiqueta_filter,
-                         todas_etiquetas=sorted(todas_etiquetas))
+                         todas_etiquetas=todas_etiquetas)
+
+@contactos_bp.route('/seguimiento')
+@login_required
+def seguimiento():
+    """Contactos sin interacciones en los últimos N días, del más olvidado al más reciente"""
+    dias = seguimiento_contactos.dias_validos(request.args.get('dias', type=int))
+    contactos = seguimiento_contactos.pagina(current_user.id, dias, cursor=request.args.get('cursor'))
+    
+    return render_template('contactos/seguimiento.html',
+                         contactos=contactos,
+                         dias=dias,
+                         pendientes=seguimiento_contactos.texto_pendientes(
+                             seguimiento_contactos.pendientes(current_user.id, dias)))
 
 @contactos_bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
@@ -84,6 +107,7 @@ def nuevo():
                 return render_template('contactos/form.html')
         
         try:
+            asegurar_contadores(current_user.id)
             # Crear nuevo contacto
             contacto = Contacto(
                 user_id=current_user.id,
@@ -98,7 +122,9 @@ def nuevo():
             contacto.set_etiquetas_from_str(etiquetas_str)
             
             db.session.add(contacto)
+            registrar_contacto(contacto)
             db.session.commit()
+            cache.invalidar_usuario(current_user.id)
             
             flash(f'Contacto "{nombre}" creado exitosamente.', 'success')
             return redirect(url_for('contactos.listar'))
@@ -154,6 +180,9 @@ def editar(id):
         
         try:
             # Actualizar contacto
+            asegurar_contadores(current_user.id)
+            antes = snapshot_contacto(contacto)
+            etiquetas_antes = analitica.snapshot_etiquetas(contacto)
             contacto.nombre = nombre
             contacto.email = email
             contacto.telefono = telefono
@@ -161,8 +190,11 @@ def editar(id):
             contacto.notas = notas
             contacto.set_etiquetas_from_str(etiquetas_str)
             contacto.fecha_actualizacion = datetime.now()  # Usar hora local
+            registrar_cambio_contacto(contacto, antes)
+            analitica.registrar_cambio_etiquetas(contacto, etiquetas_antes)
             
             db.session.commit()
+            cache.invalidar_usuario(current_user.id)
             
             flash(f'Contacto "{nombre}" actualizado exitosamente.', 'success')
             return redirect(url_for('contactos.ver', id=id))
@@ -181,8 +213,12 @@ def eliminar(id):
     
     try:
         nombre = contacto.nombre
+        asegurar_contadores(current_user.id)
+        registrar_contacto(contacto, signo=-1, interacciones=contacto.interacciones_count)
+        analitica.eliminar_contacto(contacto)
         db.session.delete(contacto)
         db.session.commit()
+        cache.invalidar_usuario(current_user.id)
         
         flash(f'Contacto "{nombre}" eliminado exitosamente.', 'success')
     except Exception as e:
@@ -191,14 +227,86 @@ def eliminar(id):
     
     return redirect(url_for('contactos.listar'))
 
+@contactos_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    """Importación masiva de contactos o interacciones, como trabajo en segundo plano"""
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        tipo = request.form.get('tipo', 'contactos')
+        
+        if not archivo or not archivo.filename:
+            flash('Selecciona un archivo para importar.', 'error')
+            return render_template('contactos/importar.html')
+        
+        try:
+            formato = formato_por_nombre(archivo.filename)
+        except ErrorImportacion as e:
+            flash(str(e), 'error')
+            return render_template('contactos/importar.html')
+        
+        # El archivo queda en JOBS_UPLOAD_DIR y el trabajo solo lleva su nombre;
+        # el worker lo lee como flujo y la página consulta el avance hasta que termine
+        adjunto = guardar_adjunto(archivo.stream, os.path.splitext(archivo.filename)[1].lower())
+        trabajo = encolar('importar', user_id=current_user.id,
+                          parametros={'tipo': tipo, 'formato': formato, 'archivo': archivo.filename,
+                                      'adjunto': adjunto})
+        return redirect(url_for('contactos.importar', trabajo=trabajo.id))
+    
+    trabajo = None
+    trabajo_id = request.args.get('trabajo', type=int)
+    if trabajo_id:
+        trabajo = Trabajo.query.filter_by(id=trabajo_id, user_id=current_user.id, tipo='importar').first_or_404()
+    
+    resultado = None
+    if trabajo is not None and trabajo.resultado:
+        resultado = ResultadoImportacion.desde_dict(trabajo.resultado)
+    
+    return render_template('contactos/importar.html', trabajo=trabajo, resultado=resultado)
+
+@contactos_bp.route('/exportar')
+@login_required
+def exportar():
+    """Descarga de contactos o interacciones en CSV, CSV para Excel o JSON Lines (en streaming)"""
+    tipo = request.args.get('tipo', 'contactos')
+    formato = request.args.get('formato', 'csv')
+    if tipo not in exportacion.TIPOS or formato not in exportacion.FORMATOS:
+        abort(400)
+    
+    fragmentos = exportacion.exportar(current_user.id, tipo, formato)
+    nombre = exportacion.nombre_archivo(tipo, formato)
+    return Response(stream_with_context(fragmentos),
+                    mimetype=exportacion.mimetype(formato),
+                    headers={'Content-Disposition': f'attachment; filename={nombre}'})
+
 @contactos_bp.route('/api/etiquetas')
 @login_required
 def api_etiquetas():
     """API para obtener todas las etiquetas del usuario (para autocompletado)"""
-    etiquetas = set()
-    contactos = Contacto.query.filter_by(user_id=current_user.id).all()
-    
-    for contacto in contactos:
-        etiquetas.update(contacto.get_etiquetas_list())
+    return jsonify(_etiquetas_en_uso(current_user.id))
+
+@contactos_bp.route('/api/buscar')
+@login_required
+def api_buscar():
+    """API de búsqueda de contactos (mismo motor que el listado)"""
+    q = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    resultados = search_contacts(current_user.id, q, page=page, per_page=10)
     
-    return jsonify(sorted(list(etiquetas)))
\ No newline at end of file
+    return jsonify({
+        'q': q,
+        'page': resultados.page,
+        'total': resultados.total,
+        'pages': resultados.pages,
+        'contactos': [
+            {
+                'id': contacto.id,
+                'nombre': contacto.nombre,
+                'email': contacto.email,
+                'empresa': contacto.empresa,
+                'etiquetas': contacto.get_etiquetas_list(),
+                'url': url_for('contactos.ver', id=contacto.id)
+            }
+            for contacto in resultados.items
+        ]
+    })
\ No newline at end of file
@@ -1,8 +1,12 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
 from flask_login import login_required, current_user
 from models import db, Contacto, Interaccion
-from sqlalchemy import desc
+from sqlalchemy.orm import contains_eager
 from datetime import datetime
+from utils.contadores import ajustar_contadores, asegurar as asegurar_contadores, leer as leer_contadores
+from utils.pagination import paginate_keyset
+from utils.cache import cache
+from utils import analitica
 
 interacciones_bp = Blueprint('interacciones', __name__, url_prefix='/interacciones')
 
@@ -12,10 +16,11 @@ def listar(contacto_id):
     """Lista todas las interacciones de un contacto"""
     contacto = Contacto.query.filter_by(id=contacto_id, user_id=current_user.id).first_or_404()
     
-    page = request.args.get('page', 1, type=int)
-    interacciones = Interaccion.query.filter_by(contacto_id=contacto_id)\
-                                   .order_by(desc(Interaccion.fecha))\
-                                   .paginate(page=page, per_page=10, error_out=False)
+    # Paginación por cursor sobre (fecha, id), índice ix_interacciones_contacto_fecha
+    interacciones = paginate_keyset(Interaccion.query.filter_by(contacto_id=contacto_id),
+                                    [Interaccion.fecha, Interaccion.id],
+                                    cursor=request.args.get('cursor'), per_page=10,
+                                    total=contacto.interacciones_count)
     
     return render_template('interacciones/listar.html', 
                          contacto=contacto, 
@@ -48,19 +53,22 @@ def nueva(contacto_id):
             return render_template('interacciones/form.html', contacto=contacto)
         
         try:
+            asegurar_contadores(current_user.id)
             # Crear nueva interacción
             interaccion = Interaccion(
                 contacto_id=contacto_id,
+                user_id=current_user.id,
                 fecha=fecha,
                 nota=nota
             )
             
             db.session.add(interaccion)
-            
-            # Actualizar última interacción del contacto
-            contacto.actualizar_ultima_interaccion()
+            # La última interacción y el contador del contacto los actualizan los eventos del modelo
+            ajustar_contadores(current_user.id, interacciones=1)
+            analitica.registrar_interacciones(current_user.id, [(contacto_id, fecha, 1)])
             
             db.session.commit()
+            cache.invalidar_usuario(current_user.id)
             
             flash('Interacción agregada exitosamente.', 'success')
             return redirect(url_for('interacciones.listar', contacto_id=contacto_id))
@@ -116,11 +124,17 @@ def editar(id):
                                  interaccion=interaccion)
         
         try:
-            # Actualizar interacción
+            # Actualizar interacción (si cambia el día, mover la interacción entre períodos)
+            if fecha.date() != interaccion.fecha.date():
+                analitica.registrar_interacciones(current_user.id, [
+                    (interaccion.contacto_id, interaccion.fecha, -1),
+                    (interaccion.contacto_id, fecha, 1),
+                ])
             interaccion.fecha = fecha
             interaccion.nota = nota
             
             db.session.commit()
+            cache.invalidar_usuario(current_user.id)
             
             flash('Interacción actualizada exitosamente.', 'success')
             return redirect(url_for('interacciones.ver', id=id))
@@ -145,8 +159,12 @@ def eliminar(id):
     contacto_id = interaccion.contacto_id
     
     try:
+        asegurar_contadores(current_user.id)
         db.session.delete(interaccion)
+        ajustar_contadores(current_user.id, interacciones=-1)
+        analitica.registrar_interacciones(current_user.id, [(contacto_id, interaccion.fecha, -1)])
         db.session.commit()
+        cache.invalidar_usuario(current_user.id)
         
         flash('Interacción eliminada exitosamente.', 'success')
     except Exception as e:
@@ -159,12 +177,15 @@ def eliminar(id):
 @login_required
 def recientes():
     """Ver las interacciones más recientes del usuario"""
-    page = request.args.get('page', 1, type=int)
+    query = db.session.query(Interaccion)\
+                      .join(Contacto)\
+                      .options(contains_eager(Interaccion.contacto))\
+                      .filter(Interaccion.user_id == current_user.id)
     
-    interacciones = db.session.query(Interaccion)\
-                             .join(Contacto)\
-                             .filter(Contacto.user_id == current_user.id)\
-                             .order_by(desc(Interaccion.fecha))\
-                             .paginate(page=page, per_page=15, error_out=False)
+    # Paginación por cursor sobre (fecha, id) dentro del índice ix_interacciones_user_fecha;
+    # el total sale de los contadores materializados
+    interacciones = paginate_keyset(query, [Interaccion.fecha, Interaccion.id],
+                                    cursor=request.args.get('cursor'), per_page=15,
+                                    total=leer_contadores(current_user.id).total_interacciones)
     
     return render_template('interacciones/recientes.html', interacciones=interacciones)
\ No newline at end of file
@@ -1,14 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+import hmac
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort, Response
 from flask_login import login_required, current_user
-from models import Contacto, Interaccion, db
+from models import Contacto, Interaccion, Etiqueta, db
 from sqlalchemy import func, desc
-from collections import Counter
-from utils.statistics import (
-    generar_grafico_etiquetas, 
-    generar_grafico_interacciones_tiempo,
-    generar_grafico_contactos_empresa,
-    obtener_estadisticas_generales
-)
+from utils.statistics import DashboardStats
+from utils.cache import cache
+from utils.perfilador import perfilador
 
 main_bp = Blueprint('main', __name__)
 
@@ -22,27 +19,20 @@ def index():
 def dashboard():
     """Dashboard principal del usuario con estadísticas completas"""
     try:
-        # Obtener estadísticas generales
-        estadisticas = obtener_estadisticas_generales(current_user.id)
+        # Todas las cifras del dashboard con un número fijo de consultas agregadas,
+        # cacheadas hasta la próxima escritura del usuario
+        resultado = cache.obtener(current_user.id, 'dashboard', DashboardStats(current_user.id).calcular)
+        estadisticas = resultado.generales()
         
         # Últimos 5 contactos agregados
         ultimos_contactos = Contacto.query.filter_by(user_id=current_user.id)\
                                          .order_by(desc(Contacto.fecha_creacion))\
                                          .limit(5).all()
         
-        # Generar datos usando las funciones del módulo statistics
-        resultado_etiquetas = generar_grafico_etiquetas(current_user.id)
-        if resultado_etiquetas and len(resultado_etiquetas) == 2:
-            grafico_etiquetas_img, grafico_etiquetas_data = resultado_etiquetas
-        else:
-            grafico_etiquetas_img, grafico_etiquetas_data = None, None
-            
-        grafico_interacciones_data = generar_grafico_interacciones_tiempo(current_user.id)
-        grafico_empresas_data = generar_grafico_contactos_empresa(current_user.id)
-        
-        # Si no hay datos de etiquetas del módulo, usar función de fallback
-        if not grafico_etiquetas_data:
-            grafico_etiquetas_data = generar_grafico_etiquetas_fallback(current_user.id)
+        grafico_etiquetas_img = None
+        grafico_etiquetas_data = resultado.etiquetas
+        grafico_interacciones_data = resultado.interacciones_tiempo
+        grafico_empresas_data = resultado.empresas
         
         return render_template('dashboard.html', 
                              estadisticas=estadisticas,
@@ -86,28 +76,48 @@ def dashboard():
 def generar_grafico_etiquetas_fallback(user_id):
     """Genera datos de distribución de etiquetas (versión simplificada de fallback)"""
     try:
-        # Obtener todos los contactos del usuario
-        contactos = Contacto.query.filter_by(user_id=user_id).all()
-        
-        # Contar etiquetas
-        todas_etiquetas = []
-        for contacto in contactos:
-            if contacto.get_etiquetas_list():
-                todas_etiquetas.extend(contacto.get_etiquetas_list())
+        # Contar frecuencia de etiquetas en la base de datos
+        etiquetas_top = Etiqueta.conteo_por_usuario(user_id, limite=10)
         
-        if not todas_etiquetas:
+        if not etiquetas_top:
             return None
         
-        # Contar frecuencia de etiquetas
-        contador_etiquetas = Counter(todas_etiquetas)
-        
         # Retornar datos para mostrar en tabla
-        return dict(contador_etiquetas.most_common(10))
+        return dict(etiquetas_top)
         
     except Exception as e:
         current_app.logger.error(f'Error generando datos de etiquetas: {str(e)}')
         return None
 
+def _autorizar_metricas():
+    """404 si no hay METRICS_TOKEN configurado, 401 si no llega Authorization: Bearer <METRICS_TOKEN>"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    recibido = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(recibido.encode(), f'Bearer {token}'.encode()):
+        abort(401)
+
+@main_bp.route('/api/cache')
+def cache_estadisticas():
+    """Aciertos y fallos de la caché de todo el proceso; requiere el mismo token que /metrics"""
+    _autorizar_metricas()
+    return jsonify(cache.estadisticas())
+
+@main_bp.route('/metrics')
+def metrics():
+    """Métricas de este proceso en formato Prometheus; requiere Authorization: Bearer <METRICS_TOKEN>"""
+    _autorizar_metricas()
+
+    estadisticas = cache.estadisticas()
+    extras = [('minicrm_cache_hits_total', 'counter', 'Aciertos de la caché.', estadisticas['hits']),
+              ('minicrm_cache_misses_total', 'counter', 'Fallos de la caché.', estadisticas['misses']),
+              ('minicrm_cache_principal_hits_total', 'counter', 'Aciertos del principal de sesión.',
+               estadisticas['principal']['hits']),
+              ('minicrm_cache_principal_misses_total', 'counter', 'Fallos del principal de sesión.',
+               estadisticas['principal']['misses'])]
+    return Response(perfilador.prometheus(extras), mimetype='text/plain; version=0.0.4')
+
 @main_bp.route('/about')
 def about():
     """Página acerca de"""
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La configuración lee DATABASE_URL al importarse: se apunta a una base temporal antes
+_BASE = os.path.join(tempfile.mkdtemp(prefix='minicrm-tests-'), 'app.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_BASE}'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = create_app('development')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
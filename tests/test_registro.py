@@ -0,0 +1,47 @@
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from utils.registro import FormatoJSON, ManejadorCola
+
+
+def _registrar_en_cola(registrar):
+    salida = io.StringIO()
+    escritor = logging.StreamHandler(salida)
+    escritor.setFormatter(FormatoJSON())
+    cola = ManejadorCola(queue.SimpleQueue())
+    listener = QueueListener(cola.queue, escritor)
+    logger = logging.getLogger('tests.registro')
+    logger.propagate = False
+    logger.addHandler(cola)
+    listener.start()
+    try:
+        registrar(logger)
+    finally:
+        listener.stop()
+        logger.removeHandler(cola)
+    return [json.loads(linea) for linea in salida.getvalue().splitlines()]
+
+
+def test_exception_en_cola_incluye_excepcion():
+    def registrar(logger):
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception('fallo %s', 'dividiendo')
+
+    [linea] = _registrar_en_cola(registrar)
+    assert linea['mensaje'] == 'fallo dividiendo'
+    assert 'ZeroDivisionError' in linea['excepcion']
+
+
+def test_argumentos_se_resuelven_al_encolar():
+    def registrar(logger):
+        datos = ['antes']
+        logger.warning('valor %s', datos)
+        datos[0] = 'despues'
+
+    [linea] = _registrar_en_cola(registrar)
+    assert linea['mensaje'] == "valor ['antes']"
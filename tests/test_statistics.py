@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import Contacto, Etiqueta, User, db
+from utils import statistics
+from utils.statistics import distribucion_contactos
+
+
+def _poblar():
+    usuario = User(nombre='Ana', email='ana@example.com', password_hash='x')
+    db.session.add(usuario)
+    db.session.flush()
+    vip = Etiqueta(user_id=usuario.id, nombre='vip')
+    for nombre, empresa, fecha, etiquetas in [('A', 'Acme', datetime(2026, 1, 5), [vip]),
+                                              ('B', ' Acme ', datetime(2026, 1, 20), []),
+                                              ('C', None, datetime(2026, 3, 2), [vip])]:
+        db.session.add(Contacto(user_id=usuario.id, nombre=nombre, empresa=empresa,
+                                fecha_creacion=fecha, etiquetas=etiquetas))
+    db.session.commit()
+    return usuario.id
+
+
+def test_columnar_y_orm_coinciden(app):
+    user_id = _poblar()
+    columnar = distribucion_contactos(user_id, columnar=True)
+    assert columnar == distribucion_contactos(user_id, columnar=False)
+    assert columnar.total == 3
+    assert columnar.empresas == {'Acme': 2, 'Sin empresa': 1}
+    assert columnar.etiquetas == [('vip', 2)]
+    assert columnar.contactos_por_mes == {'2026-01': 2, '2026-03': 1}
+
+
+def test_fallo_columnar_recurre_al_orm(app, monkeypatch, caplog):
+    user_id = _poblar()
+    esperado = distribucion_contactos(user_id, columnar=False)
+    # Una función que la base no conoce hace fallar la consulta del camino columnar
+    monkeypatch.setattr(statistics, 'extract', lambda campo, columna: func.funcion_inexistente(columna))
+
+    with caplog.at_level(logging.WARNING, logger='minicrm.estadisticas'):
+        resultado = distribucion_contactos(user_id, columnar=True)
+
+    assert resultado == esperado
+    assert 'Distribución columnar no disponible' in caplog.text
+    # El savepoint deja la sesión usable después del fallo
+    assert db.session.query(Contacto).count() == 3
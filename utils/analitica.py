@@ -0,0 +1,287 @@
+"""
+Analítica de interacciones sobre agregados por período (tabla interacciones_periodo).
+
+Cada escritura ajusta, en la misma transacción, los contadores por día, semana
+(inicio lunes) y mes del total del usuario, del contacto y de cada etiqueta del
+contacto. Las consultas leen solo esos agregados: un rango arbitrario se cubre
+con meses completos más los días sueltos de los extremos, así un año son unas
+docenas de filas y nunca se recorren las interacciones.
+
+Las etiquetas se atribuyen con las etiquetas actuales del contacto: al agregar
+o quitar una etiqueta se suman o restan las interacciones de ese contacto,
+tomadas de sus propios agregados diarios.
+
+Las rutas llaman a estas funciones antes del commit, como con utils.contadores.
+`flask analytics rebuild` recalcula los agregados desde las interacciones.
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, or_, and_
+from models import db, User, Contacto, Interaccion, Etiqueta, InteraccionesPeriodo, contacto_etiquetas
+from utils.contadores import incrementar_lote
+
+PERIODOS = ('dia', 'semana', 'mes')
+TOTAL = 'total'
+CONTACTO = 'contacto'
+ETIQUETA = 'etiqueta'
+CLAVES = ('user_id', 'dimension', 'clave', 'periodo', 'inicio')
+MAX_PUNTOS = 1000
+
+def _dia(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor
+
+def inicio_periodo(valor, periodo):
+    """Primer día del período que contiene a `valor`"""
+    dia = _dia(valor)
+    if periodo == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if periodo == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+def siguiente_periodo(inicio, periodo):
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    if periodo == 'mes':
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+# Mantenimiento
+
+def _aplicar(user_id, deltas):
+    """Suma deltas {(dimension, clave, dia): cantidad} a los tres períodos"""
+    filas = Counter()
+    for (dimension, clave, dia), delta in deltas.items():
+        if delta:
+            for periodo in PERIODOS:
+                filas[(dimension, clave, periodo, inicio_periodo(dia, periodo))] += delta
+    tabla = InteraccionesPeriodo.__table__
+    incrementar_lote(tabla, CLAVES, [
+        {'user_id': user_id, 'dimension': dimension, 'clave': clave, 'periodo': periodo,
+         'inicio': inicio, 'cantidad': cantidad}
+        for (dimension, clave, periodo, inicio), cantidad in filas.items() if cantidad
+    ])
+
+    # Como en utils.contadores: las filas que quedan en cero se borran, igual que
+    # si se hubieran reconstruido
+    restadas = defaultdict(set)
+    for (dimension, clave, _, _), cantidad in filas.items():
+        if cantidad < 0:
+            restadas[dimension].add(clave)
+    if restadas:
+        db.session.execute(tabla.delete().where(
+            tabla.c.user_id == user_id,
+            or_(*(and_(tabla.c.dimension == dimension, tabla.c.clave.in_(claves))
+                  for dimension, claves in restadas.items())),
+            tabla.c.cantidad <= 0
+        ))
+
+def _etiquetas_de(contacto_ids):
+    """{contacto_id: [etiqueta_id, ...]} con una sola consulta"""
+    etiquetas = defaultdict(list)
+    if contacto_ids:
+        filas = db.session.execute(
+            select(contacto_etiquetas.c.contacto_id, contacto_etiquetas.c.etiqueta_id)
+            .where(contacto_etiquetas.c.contacto_id.in_(contacto_ids))
+        )
+        for contacto_id, etiqueta_id in filas:
+            etiquetas[contacto_id].append(etiqueta_id)
+    return etiquetas
+
+def _dias_de_contactos(user_id, contacto_ids):
+    """{contacto_id: [(dia, cantidad), ...]} desde los agregados diarios de cada contacto"""
+    dias = defaultdict(list)
+    if contacto_ids:
+        tabla = InteraccionesPeriodo.__table__
+        filas = db.session.execute(
+            select(tabla.c.clave, tabla.c.inicio, tabla.c.cantidad)
+            .where(tabla.c.user_id == user_id, tabla.c.dimension == CONTACTO,
+                   tabla.c.clave.in_(contacto_ids), tabla.c.periodo == 'dia', tabla.c.cantidad != 0)
+        )
+        for contacto_id, dia, cantidad in filas:
+            dias[contacto_id].append((dia, cantidad))
+    return dias
+
+def registrar_interacciones(user_id, cambios):
+    """Aplica interacciones agregadas o quitadas: `cambios` son (contacto_id, fecha, +1/-1)"""
+    por_dia = Counter()
+    for contacto_id, fecha, delta in cambios:
+        por_dia[(contacto_id, _dia(fecha))] += delta
+    if not por_dia:
+        return
+    etiquetas = _etiquetas_de({contacto_id for contacto_id, _ in por_dia})
+
+    deltas = Counter()
+    for (contacto_id, dia), delta in por_dia.items():
+        deltas[(TOTAL, 0, dia)] += delta
+        deltas[(CONTACTO, contacto_id, dia)] += delta
+        for etiqueta_id in etiquetas.get(contacto_id, ()):
+            deltas[(ETIQUETA, etiqueta_id, dia)] += delta
+    _aplicar(user_id, deltas)
+
+def registrar_asociaciones(user_id, pares, signo=1):
+    """Suma (o resta) las interacciones de cada contacto a la etiqueta de cada par (contacto_id, etiqueta_id)"""
+    if not pares:
+        return
+    dias = _dias_de_contactos(user_id, {contacto_id for contacto_id, _ in pares})
+    deltas = Counter()
+    for contacto_id, etiqueta_id in pares:
+        for dia, cantidad in dias.get(contacto_id, ()):
+            deltas[(ETIQUETA, etiqueta_id, dia)] += signo * cantidad
+    _aplicar(user_id, deltas)
+
+def snapshot_etiquetas(contacto):
+    """Ids de las etiquetas del contacto, para calcular diferencias al editarlo"""
+    return {etiqueta.id for etiqueta in contacto.etiquetas}
+
+def registrar_cambio_etiquetas(contacto, antes):
+    """Aplica la diferencia entre los ids `antes` y las etiquetas actuales del contacto"""
+    db.session.flush()
+    despues = snapshot_etiquetas(contacto)
+    registrar_asociaciones(contacto.user_id, [(contacto.id, etiqueta_id) for etiqueta_id in despues - antes])
+    registrar_asociaciones(contacto.user_id, [(contacto.id, etiqueta_id) for etiqueta_id in antes - despues], -1)
+
+def eliminar_contacto(contacto):
+    """Resta las interacciones del contacto del total y de sus etiquetas y borra sus agregados"""
+    dias = _dias_de_contactos(contacto.user_id, [contacto.id]).get(contacto.id, [])
+    deltas = Counter()
+    for dia, cantidad in dias:
+        deltas[(TOTAL, 0, dia)] -= cantidad
+        for etiqueta_id in snapshot_etiquetas(contacto):
+            deltas[(ETIQUETA, etiqueta_id, dia)] -= cantidad
+    _aplicar(contacto.user_id, deltas)
+    tabla = InteraccionesPeriodo.__table__
+    db.session.execute(tabla.delete().where(tabla.c.user_id == contacto.user_id,
+                                            tabla.c.dimension == CONTACTO,
+                                            tabla.c.clave == contacto.id))
+
+def reconstruir(user_id):
+    """Recalcula desde cero los agregados de un usuario (una pasada por sus interacciones). No hace commit."""
+    tabla = InteraccionesPeriodo.__table__
+    db.session.execute(tabla.delete().where(tabla.c.user_id == user_id))
+
+    dia = func.date(Interaccion.fecha)
+    filas = db.session.execute(
+        select(Interaccion.contacto_id, dia, func.count())
+        .join(Contacto, Contacto.id == Interaccion.contacto_id)
+        .where(Contacto.user_id == user_id)
+        .group_by(Interaccion.contacto_id, dia)
+    ).all()
+    etiquetas = _etiquetas_de({contacto_id for contacto_id, _, _ in filas})
+
+    deltas = Counter()
+    for contacto_id, valor, cantidad in filas:
+        dia_fila = _dia(valor)
+        deltas[(TOTAL, 0, dia_fila)] += cantidad
+        deltas[(CONTACTO, contacto_id, dia_fila)] += cantidad
+        for etiqueta_id in etiquetas.get(contacto_id, ()):
+            deltas[(ETIQUETA, etiqueta_id, dia_fila)] += cantidad
+    _aplicar(user_id, deltas)
+    return sum(cantidad for _, _, cantidad in filas)
+
+# Consultas
+
+def _tramos(desde, hasta):
+    """Cubre [desde, hasta] con (periodo, primer inicio, último inicio): días sueltos y meses completos"""
+    primer_mes = desde if desde.day == 1 else siguiente_periodo(inicio_periodo(desde, 'mes'), 'mes')
+    fin_meses = inicio_periodo(hasta + timedelta(days=1), 'mes')
+    if primer_mes >= fin_meses:
+        return [('dia', desde, hasta)]
+    tramos = [('mes', primer_mes, fin_meses - timedelta(days=1))]
+    if desde < primer_mes:
+        tramos.append(('dia', desde, primer_mes - timedelta(days=1)))
+    if fin_meses <= hasta:
+        tramos.append(('dia', fin_meses, hasta))
+    return tramos
+
+def _filtro_rango(tabla, desde, hasta):
+    return or_(*(and_(tabla.c.periodo == periodo, tabla.c.inicio >= primero, tabla.c.inicio <= ultimo)
+                 for periodo, primero, ultimo in _tramos(desde, hasta)))
+
+def total(user_id, desde, hasta, dimension=TOTAL, clave=0):
+    """Interacciones entre `desde` y `hasta` (fechas incluidas)"""
+    tabla = InteraccionesPeriodo.__table__
+    return db.session.execute(
+        select(func.coalesce(func.sum(tabla.c.cantidad), 0))
+        .where(tabla.c.user_id == user_id, tabla.c.dimension == dimension, tabla.c.clave == clave,
+               _filtro_rango(tabla, desde, hasta))
+    ).scalar()
+
+def serie(user_id, desde, hasta, periodo='dia', dimension=TOTAL, clave=0):
+    """
+    Lista [(inicio, cantidad)] de cada período que toca el rango, incluidos los
+    vacíos (cantidad 0), lista para graficar
+    """
+    primero, ultimo = inicio_periodo(desde, periodo), inicio_periodo(hasta, periodo)
+    tabla = InteraccionesPeriodo.__table__
+    cantidades = {
+        _dia(inicio): cantidad
+        for inicio, cantidad in db.session.execute(
+            select(tabla.c.inicio, tabla.c.cantidad)
+            .where(tabla.c.user_id == user_id, tabla.c.dimension == dimension, tabla.c.clave == clave,
+                   tabla.c.periodo == periodo, tabla.c.inicio >= primero, tabla.c.inicio <= ultimo)
+        )
+    }
+    puntos = []
+    inicio = primero
+    while inicio <= ultimo:
+        puntos.append((inicio, cantidades.get(inicio, 0)))
+        inicio = siguiente_periodo(inicio, periodo)
+    return puntos
+
+def cantidad_puntos(desde, hasta, periodo='dia'):
+    """Cantidad de puntos de serie() para el rango (para limitar el tamaño de una respuesta)"""
+    primero, ultimo = inicio_periodo(desde, periodo), inicio_periodo(hasta, periodo)
+    if periodo == 'mes':
+        return (ultimo.year - primero.year) * 12 + ultimo.month - primero.month + 1
+    return (ultimo - primero).days // (7 if periodo == 'semana' else 1) + 1
+
+def desglose(user_id, desde, hasta, dimension=ETIQUETA, limite=10):
+    """[(id, nombre, cantidad)] de las etiquetas o contactos con más interacciones en el rango"""
+    tabla = InteraccionesPeriodo.__table__
+    suma = func.sum(tabla.c.cantidad).label('cantidad')
+    filas = db.session.execute(
+        select(tabla.c.clave, suma)
+        .where(tabla.c.user_id == user_id, tabla.c.dimension == dimension, _filtro_rango(tabla, desde, hasta))
+        .group_by(tabla.c.clave)
+        .having(suma > 0)
+        .order_by(suma.desc(), tabla.c.clave)
+        .limit(limite)
+    ).all()
+    if not filas:
+        return []
+
+    modelo = Etiqueta if dimension == ETIQUETA else Contacto
+    nombres = dict(db.session.execute(
+        select(modelo.id, modelo.nombre).where(modelo.id.in_([clave for clave, _ in filas]),
+                                               modelo.user_id == user_id)
+    ).all())
+    return [(clave, nombres[clave], cantidad) for clave, cantidad in filas if clave in nombres]
+
+# Comandos CLI
+
+@click.group('analytics')
+def analytics_cli():
+    """Mantenimiento de los agregados de interacciones por período"""
+
+@analytics_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario')
+@with_appcontext
+def rebuild_command(user_id):
+    """Recalcula los agregados por período desde las interacciones"""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [fila.id for fila in db.session.query(User.id).order_by(User.id)]
+
+    total_interacciones = 0
+    for uid in user_ids:
+        total_interacciones += reconstruir(uid)
+        db.session.commit()
+    click.echo(f'✓ {len(user_ids)} usuarios reconstruidos ({total_interacciones} interacciones)')
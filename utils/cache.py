@@ -0,0 +1,234 @@
+"""
+Caché de lectura por usuario para datos agregados (dashboard, autocompletado de etiquetas).
+
+Las claves incluyen una versión por usuario. Las rutas que escriben llaman a
+invalidar_usuario() después del commit: la versión sube y las entradas
+anteriores quedan huérfanas hasta que las expulse el LRU o el TTL.
+
+Backends (CACHE_BACKEND):
+- 'memory' (por defecto): LRU en proceso con TTL. Cada proceso tiene su propia
+  caché, así que con varios workers conviene 'redis'.
+- 'redis': cualquier servidor que hable el protocolo Redis (CACHE_REDIS_URL).
+  Requiere el paquete `redis`.
+- 'null': sin caché.
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app
+
+_AUSENTE = object()
+
+class MemoryCache:
+    """LRU en memoria con TTL por entrada"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._datos = OrderedDict()
+        # Las versiones no pasan por el LRU: perder una reutilizaría claves viejas
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return _AUSENTE
+            valor, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return _AUSENTE
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entries:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def version(self, clave):
+        with self._lock:
+            return self._versiones.get(clave, 0)
+
+    def incr(self, clave):
+        with self._lock:
+            self._versiones[clave] = self._versiones.get(clave, 0) + 1
+            return self._versiones[clave]
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self._versiones.clear()
+
+class RedisCache:
+    """Backend sobre un servidor compatible con Redis; los valores se guardan con pickle"""
+
+    def __init__(self, url=None, cliente=None, prefijo='crm:'):
+        if cliente is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND='redis' requiere el paquete redis (pip install redis)")
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    def get(self, clave):
+        datos = self.cliente.get(self.prefijo + clave)
+        return _AUSENTE if datos is None else pickle.loads(datos)
+
+    def set(self, clave, valor, ttl=None):
+        datos = pickle.dumps(valor)
+        if ttl:
+            self.cliente.setex(self.prefijo + clave, int(ttl), datos)
+        else:
+            self.cliente.set(self.prefijo + clave, datos)
+
+    def delete(self, clave):
+        self.cliente.delete(self.prefijo + clave)
+
+    def version(self, clave):
+        return int(self.cliente.get(self.prefijo + clave) or 0)
+
+    def incr(self, clave):
+        return self.cliente.incr(self.prefijo + clave)
+
+    def clear(self):
+        for clave in self.cliente.scan_iter(match=self.prefijo + '*'):
+            self.cliente.delete(clave)
+
+class NullCache:
+    """Backend que no guarda nada (CACHE_BACKEND='null')"""
+
+    def get(self, clave):
+        return _AUSENTE
+
+    def set(self, clave, valor, ttl=None):
+        pass
+
+    def delete(self, clave):
+        pass
+
+    def version(self, clave):
+        return 0
+
+    def incr(self, clave):
+        return 0
+
+    def clear(self):
+        pass
+
+class Cache:
+    """
+    Extensión de Flask: elige el backend según la configuración y cuenta aciertos
+    por grupo ('datos' para las entradas por usuario, 'principal' para la sesión)
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._aciertos = Counter()
+        self._fallos = Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+
+        tipo = app.config['CACHE_BACKEND']
+        if tipo == 'redis':
+            backend = RedisCache(app.config['CACHE_REDIS_URL'])
+        elif tipo == 'null':
+            backend = NullCache()
+        elif tipo == 'memory':
+            backend = MemoryCache(app.config['CACHE_MAX_ENTRIES'])
+        else:
+            raise ValueError(f'CACHE_BACKEND desconocido: {tipo}')
+        app.extensions['cache'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    @property
+    def compartida(self):
+        """True si todos los procesos ven la misma caché (y sus invalidaciones)"""
+        return isinstance(self.backend, RedisCache)
+
+    @property
+    def hits(self):
+        return self._aciertos['datos']
+
+    @property
+    def misses(self):
+        return self._fallos['datos']
+
+    def _contar(self, acierto, grupo='datos'):
+        with self._lock:
+            if acierto:
+                self._aciertos[grupo] += 1
+            else:
+                self._fallos[grupo] += 1
+
+    def _clave(self, user_id, nombre):
+        version = self.backend.version(f'v:{user_id}')
+        return f'u:{user_id}:{version}:{nombre}'
+
+    def obtener(self, user_id, nombre, calcular, ttl=None):
+        """Valor cacheado de `nombre` para el usuario, o el resultado de calcular()"""
+        clave = self._clave(user_id, nombre)
+        valor = self.backend.get(clave)
+        if valor is not _AUSENTE:
+            self._contar(True)
+            return valor
+
+        self._contar(False)
+        valor = calcular()
+        self.backend.set(clave, valor, ttl or current_app.config['CACHE_DEFAULT_TTL'])
+        return valor
+
+    def leer(self, clave, default=None, grupo='datos'):
+        """Valor guardado bajo una clave sin versión, o `default`"""
+        valor = self.backend.get(clave)
+        self._contar(valor is not _AUSENTE, grupo)
+        return default if valor is _AUSENTE else valor
+
+    def guardar(self, clave, valor, ttl=None):
+        self.backend.set(clave, valor, ttl or current_app.config['CACHE_DEFAULT_TTL'])
+
+    def borrar(self, clave):
+        self.backend.delete(clave)
+
+    def invalidar_usuario(self, user_id):
+        """Descarta todas las entradas del usuario (llamar después del commit)"""
+        self.backend.incr(f'v:{user_id}')
+
+    def _resumen(self, grupo):
+        aciertos, fallos = self._aciertos[grupo], self._fallos[grupo]
+        total = aciertos + fallos
+        return {
+            'hits': aciertos,
+            'misses': fallos,
+            'hit_ratio': round(aciertos / total, 3) if total else None
+        }
+
+    def estadisticas(self):
+        """Aciertos y fallos de este proceso; los del principal de sesión van aparte"""
+        with self._lock:
+            return {
+                'backend': current_app.config['CACHE_BACKEND'],
+                **self._resumen('datos'),
+                'principal': self._resumen('principal')
+            }
+
+cache = Cache()
@@ -0,0 +1,47 @@
+"""
+Compresión de respuestas según Accept-Encoding.
+
+Usa brotli si el paquete está instalado (pip install brotli) y el cliente lo
+acepta, y si no gzip de la biblioteca estándar. Las respuestas pequeñas, en
+streaming o ya comprimidas se devuelven tal cual.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MINIMO_BYTES = 512
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+
+def _elegir_codificacion(aceptadas):
+    if brotli is not None and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+def comprimir(response, request, minimo=MINIMO_BYTES):
+    """Comprime el cuerpo de `response` si el cliente lo acepta y vale la pena"""
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    datos = response.get_data()
+    if len(datos) < minimo:
+        return response
+
+    codificacion = _elegir_codificacion(request.accept_encodings)
+    if codificacion == 'br':
+        comprimido = brotli.compress(datos, quality=CALIDAD_BROTLI)
+    elif codificacion == 'gzip':
+        comprimido = gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+    else:
+        return response
+
+    response.set_data(comprimido)
+    response.headers['Content-Encoding'] = codificacion
+    return response
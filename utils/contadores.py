@@ -0,0 +1,225 @@
+"""
+Contadores materializados por usuario (user_stats, user_stats_etiquetas, user_stats_empresas).
+
+Las rutas que crean, editan o eliminan contactos e interacciones llaman a estas
+funciones antes del commit, de modo que los contadores se actualizan en la misma
+transacción. Antes de modificar nada llaman a `asegurar`, para que un usuario sin
+fila en user_stats (p. ej. una base creada con create_all que ya tenía datos)
+parta de los valores reales y no solo del delta. `flask stats rebuild` los
+recalcula desde cero y reporta diferencias.
+"""
+from collections import Counter
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from models import db, Contacto, Interaccion, Etiqueta, \
+    UserStats, UserStatsEtiqueta, UserStatsEmpresa
+
+def clave_empresa(empresa):
+    """Clave usada en user_stats_empresas ('' agrupa a los contactos sin empresa)"""
+    return empresa.strip() if empresa and empresa.strip() else ''
+
+def snapshot_contacto(contacto):
+    """Empresa y etiquetas de un contacto, para calcular diferencias al editarlo"""
+    return clave_empresa(contacto.empresa), contacto.get_etiquetas_list()
+
+def _insert(tabla):
+    """insert() con soporte ON CONFLICT para el dialecto de la sesión, o None"""
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(tabla)
+
+def _incrementar(tabla, claves, deltas):
+    """UPSERT que suma `deltas` a la fila identificada por `claves`"""
+    insert = _insert(tabla)
+    if insert is not None:
+        stmt = insert.values(**claves, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={col: tabla.c[col] + stmt.excluded[col] for col in deltas}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Dialectos sin ON CONFLICT: UPDATE y, si no había fila, INSERT
+    condicion = [tabla.c[col] == valor for col, valor in claves.items()]
+    resultado = db.session.execute(
+        tabla.update().where(*condicion).values({col: tabla.c[col] + delta for col, delta in deltas.items()})
+    )
+    if resultado.rowcount == 0:
+        db.session.execute(tabla.insert().values(**claves, **deltas))
+
+def incrementar_lote(tabla, claves, filas, columna='cantidad'):
+    """
+    Varios UPSERT en un solo executemany: cada fila es un dict con las columnas
+    `claves` y `columna`, cuyo valor se suma al existente
+    """
+    if not filas:
+        return
+    insert = _insert(tabla)
+    if insert is not None:
+        stmt = insert.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={columna: tabla.c[columna] + insert.excluded[columna]}
+        )
+        db.session.execute(stmt, filas)
+        return
+    for fila in filas:
+        _incrementar(tabla, {clave: fila[clave] for clave in claves}, {columna: fila[columna]})
+
+def ajustar_contadores(user_id, contactos=0, interacciones=0, etiquetas=None, empresas=None):
+    """Aplica deltas a los contadores del usuario dentro de la transacción actual"""
+    if contactos or interacciones:
+        _incrementar(UserStats.__table__, {'user_id': user_id},
+                     {'total_contactos': contactos, 'total_interacciones': interacciones})
+
+    for modelo, columna, deltas in ((UserStatsEtiqueta, 'nombre', etiquetas),
+                                    (UserStatsEmpresa, 'empresa', empresas)):
+        deltas = {clave: delta for clave, delta in (deltas or {}).items() if delta}
+        if not deltas:
+            continue
+        tabla = modelo.__table__
+        for clave, delta in deltas.items():
+            _incrementar(tabla, {'user_id': user_id, columna: clave}, {'cantidad': delta})
+        db.session.execute(
+            tabla.delete().where(tabla.c.user_id == user_id,
+                                 tabla.c[columna].in_(list(deltas)),
+                                 tabla.c.cantidad <= 0)
+        )
+
+def registrar_contacto(contacto, signo=1, interacciones=0):
+    """Suma (signo=1) o resta (signo=-1) un contacto y sus etiquetas/empresa"""
+    empresa, etiquetas = snapshot_contacto(contacto)
+    ajustar_contadores(
+        contacto.user_id,
+        contactos=signo,
+        interacciones=signo * interacciones,
+        etiquetas={nombre: signo for nombre in etiquetas},
+        empresas={empresa: signo}
+    )
+
+def registrar_cambio_contacto(contacto, antes):
+    """Aplica la diferencia entre el snapshot `antes` y el estado actual del contacto"""
+    empresa_antes, etiquetas_antes = antes
+    empresa_despues, etiquetas_despues = snapshot_contacto(contacto)
+
+    etiquetas = Counter(etiquetas_despues)
+    etiquetas.subtract(etiquetas_antes)
+    empresas = Counter({empresa_despues: 1})
+    empresas.subtract({empresa_antes: 1})
+    ajustar_contadores(contacto.user_id, etiquetas=dict(etiquetas), empresas=dict(empresas))
+
+def asegurar(user_id):
+    """
+    Crea los contadores del usuario desde los datos reales si todavía no existen.
+    Se llama antes de modificar contactos o interacciones, para que el primer
+    delta se sume sobre los valores reales. No hace commit.
+    """
+    if db.session.get(UserStats, user_id) is None:
+        reconstruir(user_id)
+
+def leer(user_id):
+    """
+    Fila de user_stats del usuario. Si todavía no existe la calcula dentro de la
+    transacción actual sin hacer commit: queda guardada con la próxima escritura
+    del usuario o con `flask stats rebuild`.
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        reconstruir(user_id)
+        stats = db.session.get(UserStats, user_id)
+    return stats
+
+def _calcular(user_id):
+    """Contadores calculados desde cero con consultas agregadas"""
+    total_contactos = db.session.query(func.count(Contacto.id))\
+                                .filter(Contacto.user_id == user_id).scalar()
+    total_interacciones = db.session.query(func.count(Interaccion.id))\
+                                    .join(Contacto)\
+                                    .filter(Contacto.user_id == user_id).scalar()
+
+    empresas = Counter()
+    filas = db.session.query(Contacto.empresa, func.count(Contacto.id))\
+                      .filter(Contacto.user_id == user_id)\
+                      .group_by(Contacto.empresa).all()
+    for empresa, cantidad in filas:
+        empresas[clave_empresa(empresa)] += cantidad
+
+    etiquetas = dict(Etiqueta.conteo_por_usuario(user_id))
+    return {
+        'total_contactos': total_contactos,
+        'total_interacciones': total_interacciones,
+        'etiquetas': etiquetas,
+        'empresas': dict(empresas)
+    }
+
+def _leer_guardados(user_id):
+    stats = db.session.get(UserStats, user_id)
+    return {
+        'total_contactos': stats.total_contactos if stats else 0,
+        'total_interacciones': stats.total_interacciones if stats else 0,
+        'etiquetas': dict(db.session.query(UserStatsEtiqueta.nombre, UserStatsEtiqueta.cantidad)
+                          .filter_by(user_id=user_id).all()),
+        'empresas': dict(db.session.query(UserStatsEmpresa.empresa, UserStatsEmpresa.cantidad)
+                         .filter_by(user_id=user_id).all())
+    }
+
+def reconstruir(user_id):
+    """
+    Recalcula los contadores de un usuario y devuelve las diferencias encontradas
+    como {campo: (guardado, real)}. No hace commit.
+    """
+    guardados = _leer_guardados(user_id)
+    reales = _calcular(user_id)
+    drift = {campo: (guardados[campo], reales[campo])
+             for campo in reales if guardados[campo] != reales[campo]}
+
+    UserStatsEtiqueta.query.filter_by(user_id=user_id).delete()
+    UserStatsEmpresa.query.filter_by(user_id=user_id).delete()
+
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats(user_id=user_id)
+        db.session.add(stats)
+    stats.total_contactos = reales['total_contactos']
+    stats.total_interacciones = reales['total_interacciones']
+
+    db.session.add_all(UserStatsEtiqueta(user_id=user_id, nombre=nombre, cantidad=cantidad)
+                       for nombre, cantidad in reales['etiquetas'].items())
+    db.session.add_all(UserStatsEmpresa(user_id=user_id, empresa=empresa, cantidad=cantidad)
+                       for empresa, cantidad in reales['empresas'].items())
+    db.session.flush()
+    return drift
+
+@click.group('stats')
+def stats_cli():
+    """Comandos de mantenimiento de las estadísticas materializadas"""
+
+@stats_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Reconstruir solo este usuario')
+@with_appcontext
+def rebuild_command(user_id):
+    """Recalcula los contadores desde cero y reporta las diferencias"""
+    from models import User
+
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [fila.id for fila in db.session.query(User.id).order_by(User.id)]
+
+    con_drift = 0
+    for uid in user_ids:
+        drift = reconstruir(uid)
+        db.session.commit()
+        if drift:
+            con_drift += 1
+            click.echo(f'Usuario {uid}: diferencias encontradas')
+            for campo, (guardado, real) in drift.items():
+                click.echo(f'  {campo}: guardado={guardado} real={real}')
+
+    click.echo(f'✓ {len(user_ids)} usuarios reconstruidos, {con_drift} con diferencias')
@@ -0,0 +1,143 @@
+"""
+Generador de datos sintéticos a escala (usuarios × contactos × interacciones).
+
+Usa distribuciones parecidas a las de producción: pocas etiquetas y empresas
+concentran la mayoría de los contactos (Zipf), la cantidad de interacciones por
+contacto es exponencial y las fechas se cargan hacia lo reciente. Inserta con
+INSERT múltiples por lote y al final recalcula los contadores materializados.
+Con la misma semilla genera siempre los mismos datos.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from models import db, User, Interaccion, contacto_etiquetas
+from utils.contadores import reconstruir
+from utils.importacion import insertar_contactos, ids_etiquetas
+from utils import analitica
+from utils.passwords import hash_password
+
+DOMINIO = 'minicrm.test'
+PASSWORD = 'demo123'
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Ana', 'Roberto', 'Lucía', 'Pedro', 'Laura', 'Diego', 'Sofía',
+           'Javier', 'Valentina', 'Miguel', 'Camila', 'Andrés', 'Paula', 'Fernando', 'Elena', 'Pablo',
+           'Isabel', 'Jorge', 'Daniela', 'Luis', 'Carmen', 'Raúl', 'Gabriela', 'Sergio', 'Martina']
+APELLIDOS = ['Pérez', 'García', 'López', 'Martínez', 'Silva', 'González', 'Rodríguez', 'Fernández',
+             'Sánchez', 'Romero', 'Torres', 'Díaz', 'Ruiz', 'Morales', 'Castro', 'Ortiz', 'Vargas',
+             'Herrera', 'Medina', 'Rojas', 'Navarro', 'Molina', 'Suárez', 'Delgado']
+ETIQUETAS = ['cliente', 'prospecto', 'proveedor', 'importante', 'tecnología', 'consultor',
+             'freelancer', 'diseño', 'estrategia', 'confiable', 'inversor', 'socio', 'evento',
+             'referido', 'marketing', 'ventas', 'legal', 'finanzas', 'recursos humanos', 'logística',
+             'internacional', 'gobierno', 'educación', 'salud', 'retail']
+PREFIJOS_EMPRESA = ['Grupo', 'Soluciones', 'Consultora', 'Industrias', 'Servicios', 'Tecnologías',
+                    'Distribuidora', 'Estudio', 'Comercial', 'Inversiones', 'Laboratorios', 'Logística']
+SUFIJOS_EMPRESA = ['Andina', 'del Sur', 'Global', 'Norte', 'Integral', 'Digital', 'Pacífico',
+                   'Atlántica', 'Central', 'Horizonte', 'Delta', 'Omega', 'Nexo', 'Altamira']
+NOTAS = ['Llamada de seguimiento sobre {tema}.', 'Reunión para revisar {tema}.',
+         'Envié propuesta de {tema} por email.', 'Consulta sobre {tema}; quedó en responder.',
+         'Almuerzo de trabajo, conversamos de {tema}.', 'Demo de {tema} con su equipo.']
+TEMAS = ['presupuesto', 'renovación del contrato', 'el nuevo proyecto', 'facturación', 'la integración',
+         'capacitación', 'precios', 'soporte técnico', 'la expansión regional', 'una alianza']
+
+def _pesos_zipf(cantidad, s=1.1):
+    return [1 / (rango ** s) for rango in range(1, cantidad + 1)]
+
+class GeneradorSintetico:
+    """Genera y carga datos para `usuarios` usuarios con `contactos` contactos cada uno"""
+
+    def __init__(self, semilla=42, lote=2000, dias=730):
+        self.rng = random.Random(semilla)
+        self.lote = lote
+        self.dias = dias
+        self.empresas = [f'{prefijo} {sufijo}' for prefijo in PREFIJOS_EMPRESA for sufijo in SUFIJOS_EMPRESA]
+        self.rng.shuffle(self.empresas)
+        self._pesos_empresas = _pesos_zipf(len(self.empresas))
+        self._pesos_etiquetas = _pesos_zipf(len(ETIQUETAS))
+
+    def _etiquetas(self):
+        cantidad = self.rng.choices([0, 1, 2, 3, 4], weights=[20, 35, 25, 15, 5])[0]
+        return sorted(set(self.rng.choices(ETIQUETAS, weights=self._pesos_etiquetas, k=cantidad)))
+
+    def _empresa(self):
+        if self.rng.random() < 0.15:
+            return None
+        return self.rng.choices(self.empresas, weights=self._pesos_empresas)[0]
+
+    def _fechas_interacciones(self, creado, ahora, promedio):
+        cantidad = int(self.rng.expovariate(1 / promedio) + 0.5) if promedio > 0 else 0
+        rango = (ahora - creado).total_seconds()
+        # raíz del azar: más interacciones cerca del presente
+        return sorted(creado + timedelta(seconds=rango * self.rng.random() ** 0.5) for _ in range(cantidad))
+
+    def crear_usuarios(self, cantidad, password=PASSWORD):
+        """Inserta usuarios sintetico<N>@minicrm.test (todos con la misma contraseña); devuelve sus ids"""
+        patron = f'sintetico%@{DOMINIO}'
+        existentes = db.session.query(func.count(User.id)).filter(User.email.like(patron)).scalar()
+        hashed = hash_password(password)
+        filas = [{'nombre': f'Usuario Sintético {n}', 'email': f'sintetico{n}@{DOMINIO}',
+                  'password_hash': hashed, 'fecha_creacion': datetime.utcnow(), 'activo': True}
+                 for n in range(existentes + 1, existentes + cantidad + 1)]
+        db.session.execute(insert(User.__table__), filas)
+        db.session.commit()
+        emails = [fila['email'] for fila in filas]
+        return [fila.id for fila in db.session.query(User.id).filter(User.email.in_(emails)).order_by(User.id)]
+
+    def poblar_usuario(self, user_id, contactos, interacciones_promedio=5):
+        """Inserta los contactos, etiquetas e interacciones de un usuario y recalcula sus contadores"""
+        ahora = datetime.now()
+        etiquetas_conocidas = {}
+        total_interacciones = 0
+        for inicio in range(0, contactos, self.lote):
+            fin = min(inicio + self.lote, contactos)
+            filas, etiquetas_por_contacto, fechas_por_contacto = [], [], []
+            for i in range(inicio, fin):
+                nombre, apellido = self.rng.choice(NOMBRES), self.rng.choice(APELLIDOS)
+                creado = ahora - timedelta(seconds=self.rng.uniform(0, self.dias * 86400))
+                fechas = self._fechas_interacciones(creado, ahora, interacciones_promedio)
+                filas.append({
+                    'user_id': user_id,
+                    'nombre': f'{nombre} {apellido}',
+                    'email': f'{nombre}.{apellido}.{i}@ejemplo.com'.lower(),
+                    'telefono': f'+56 9 {self.rng.randint(1000, 9999)} {self.rng.randint(1000, 9999)}',
+                    'empresa': self._empresa(),
+                    'notas': None,
+                    'ultima_interaccion': fechas[-1] if fechas else creado,
+                    'fecha_creacion': creado,
+                    'fecha_actualizacion': creado,
+                    'interacciones_count': len(fechas),
+                })
+                etiquetas_por_contacto.append(self._etiquetas())
+                fechas_por_contacto.append(fechas)
+
+            ids = insertar_contactos(filas)
+            nombres = sorted({nombre for etiquetas in etiquetas_por_contacto for nombre in etiquetas})
+            por_nombre = ids_etiquetas(user_id, nombres, etiquetas_conocidas) if nombres else {}
+
+            asociaciones, interacciones = [], []
+            for contacto_id, etiquetas, fechas in zip(ids, etiquetas_por_contacto, fechas_por_contacto):
+                asociaciones.extend({'contacto_id': contacto_id, 'etiqueta_id': por_nombre[nombre]}
+                                    for nombre in etiquetas)
+                interacciones.extend({'contacto_id': contacto_id, 'user_id': user_id, 'fecha': fecha, 'fecha_creacion': fecha,
+                                      'nota': self.rng.choice(NOTAS).format(tema=self.rng.choice(TEMAS))}
+                                     for fecha in fechas)
+            if asociaciones:
+                db.session.execute(insert(contacto_etiquetas), asociaciones)
+            if interacciones:
+                db.session.execute(insert(Interaccion.__table__), interacciones)
+            total_interacciones += len(interacciones)
+            db.session.commit()
+
+        reconstruir(user_id)
+        analitica.reconstruir(user_id)
+        db.session.commit()
+        return total_interacciones
+
+    def generar(self, usuarios, contactos, interacciones_promedio=5, progreso=None):
+        """Crea `usuarios` usuarios y los puebla; devuelve (ids de usuarios, total de interacciones)"""
+        user_ids = self.crear_usuarios(usuarios)
+        total = 0
+        for numero, user_id in enumerate(user_ids, start=1):
+            total += self.poblar_usuario(user_id, contactos, interacciones_promedio)
+            if progreso:
+                progreso(numero, len(user_ids))
+        return user_ids, total
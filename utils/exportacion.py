@@ -0,0 +1,213 @@
+"""
+Exportación en streaming de contactos e interacciones.
+
+Todo sale de una sola consulta ordenada (contactos LEFT JOIN interacciones)
+leída con un cursor del lado del servidor (yield_per), y se emite como un
+generador de fragmentos de texto; la memoria no crece con la cantidad de filas.
+Las columnas coinciden con las que acepta utils.importacion, así que un archivo
+exportado se puede volver a importar.
+
+Formatos:
+- 'csv': UTF-8, separado por comas.
+- 'excel': CSV para Excel (BOM, ';' y fin de línea CRLF; celdas que empiezan con
+  =, +, - o @ se escapan para que no se evalúen como fórmulas).
+- 'jsonl': un objeto por línea; los contactos incluyen sus interacciones.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import JSON, select, func, type_coerce
+from models import db, User, Contacto, Interaccion, Etiqueta, contacto_etiquetas
+
+FORMATOS = ('csv', 'excel', 'jsonl')
+TIPOS = ('contactos', 'interacciones')
+FILAS_POR_CURSOR = 1000
+FILAS_POR_FRAGMENTO = 500
+
+COLUMNAS_CONTACTOS = ['nombre', 'email', 'telefono', 'empresa', 'etiquetas', 'notas',
+                      'ultima_interaccion', 'fecha_creacion', 'interacciones']
+COLUMNAS_INTERACCIONES = ['email', 'nombre', 'fecha', 'nota']
+
+def extension(formato):
+    return 'jsonl' if formato == 'jsonl' else 'csv'
+
+def mimetype(formato):
+    return 'application/x-ndjson' if formato == 'jsonl' else 'text/csv'
+
+def _etiquetas_por_contacto(user_id):
+    """
+    Subconsulta (contacto_id, etiquetas) con los nombres como arreglo JSON, agregada
+    una sola vez: un separador de texto partiría los nombres que lo contengan
+    """
+    nombre = Etiqueta.__table__.c.nombre
+    if db.session.get_bind().dialect.name == 'postgresql':
+        agregado = func.json_agg(nombre)
+    else:
+        agregado = func.json_group_array(nombre)
+    return select(contacto_etiquetas.c.contacto_id, type_coerce(agregado, JSON).label('etiquetas'))\
+        .join(Etiqueta.__table__, Etiqueta.__table__.c.id == contacto_etiquetas.c.etiqueta_id)\
+        .where(Etiqueta.__table__.c.user_id == user_id)\
+        .group_by(contacto_etiquetas.c.contacto_id)\
+        .subquery('etiquetas_contacto')
+
+def _consulta(user_id, con_interacciones, solo_con_interacciones=False):
+    contactos = Contacto.__table__
+    interacciones = Interaccion.__table__
+    etiquetas = _etiquetas_por_contacto(user_id)
+
+    columnas = [contactos.c.id, contactos.c.nombre, contactos.c.email, contactos.c.telefono,
+                contactos.c.empresa, contactos.c.notas, contactos.c.ultima_interaccion,
+                contactos.c.fecha_creacion, contactos.c.interacciones_count,
+                etiquetas.c.etiquetas]
+    origen = contactos
+    orden = [contactos.c.id]
+    if con_interacciones:
+        columnas += [interacciones.c.id.label('interaccion_id'),
+                     interacciones.c.fecha, interacciones.c.nota]
+        origen = origen.join(interacciones, interacciones.c.contacto_id == contactos.c.id,
+                             isouter=not solo_con_interacciones)
+        orden += [interacciones.c.fecha, interacciones.c.id]
+    # Las etiquetas al final, para que se busquen por contacto_id y no se recorran por fila
+    origen = origen.outerjoin(etiquetas, etiquetas.c.contacto_id == contactos.c.id)
+
+    stmt = select(*columnas).select_from(origen).where(contactos.c.user_id == user_id).order_by(*orden)
+    return db.session.execute(stmt.execution_options(yield_per=FILAS_POR_CURSOR))
+
+def _fecha(valor, iso=False):
+    if valor is None:
+        return ''
+    return valor.isoformat() if iso else valor.strftime('%Y-%m-%d %H:%M:%S')
+
+def _celda_excel(valor):
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    return valor
+
+def _filas_csv(user_id, tipo):
+    if tipo == 'contactos':
+        yield COLUMNAS_CONTACTOS
+        for fila in _consulta(user_id, con_interacciones=False):
+            yield [fila.nombre, fila.email or '', fila.telefono or '', fila.empresa or '',
+                   ', '.join(fila.etiquetas or ()), fila.notas or '', _fecha(fila.ultima_interaccion),
+                   _fecha(fila.fecha_creacion), fila.interacciones_count]
+    else:
+        yield COLUMNAS_INTERACCIONES
+        for fila in _consulta(user_id, con_interacciones=True, solo_con_interacciones=True):
+            yield [fila.email or '', fila.nombre, _fecha(fila.fecha), fila.nota]
+
+def _exportar_csv(user_id, tipo, excel=False):
+    buffer = io.StringIO()
+    if excel:
+        buffer.write('\ufeff')
+        escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    else:
+        escritor = csv.writer(buffer, lineterminator='\n')
+
+    for numero, fila in enumerate(_filas_csv(user_id, tipo), start=1):
+        escritor.writerow([_celda_excel(valor) for valor in fila] if excel else fila)
+        if numero % FILAS_POR_FRAGMENTO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _contacto_json(fila):
+    return {
+        'nombre': fila.nombre,
+        'email': fila.email,
+        'telefono': fila.telefono,
+        'empresa': fila.empresa,
+        'etiquetas': fila.etiquetas or [],
+        'notas': fila.notas,
+        'ultima_interaccion': _fecha(fila.ultima_interaccion, iso=True),
+        'fecha_creacion': _fecha(fila.fecha_creacion, iso=True),
+        'interacciones': []
+    }
+
+def _exportar_jsonl(user_id, tipo):
+    lineas = []
+
+    def linea(objeto):
+        lineas.append(json.dumps(objeto, ensure_ascii=False) + '\n')
+
+    if tipo == 'interacciones':
+        for fila in _consulta(user_id, con_interacciones=True, solo_con_interacciones=True):
+            linea({'email': fila.email, 'nombre': fila.nombre,
+                   'fecha': _fecha(fila.fecha, iso=True), 'nota': fila.nota})
+            if len(lineas) >= FILAS_POR_FRAGMENTO:
+                yield ''.join(lineas)
+                lineas.clear()
+    else:
+        # Las filas llegan ordenadas por contacto: se agrupan sin cargar más de un contacto
+        actual, actual_id = None, None
+        for fila in _consulta(user_id, con_interacciones=True):
+            if fila.id != actual_id:
+                if actual is not None:
+                    linea(actual)
+                    if len(lineas) >= FILAS_POR_FRAGMENTO:
+                        yield ''.join(lineas)
+                        lineas.clear()
+                actual, actual_id = _contacto_json(fila), fila.id
+            if fila.interaccion_id is not None:
+                actual['interacciones'].append({'fecha': _fecha(fila.fecha, iso=True), 'nota': fila.nota})
+        if actual is not None:
+            linea(actual)
+    if lineas:
+        yield ''.join(lineas)
+
+def exportar(user_id, tipo='contactos', formato='csv'):
+    """Generador de fragmentos de texto con la exportación del usuario"""
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo desconocido: {tipo}')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconocido: {formato}')
+    if formato == 'jsonl':
+        return _exportar_jsonl(user_id, tipo)
+    return _exportar_csv(user_id, tipo, excel=formato == 'excel')
+
+def nombre_archivo(tipo, formato):
+    return f"{tipo}-{datetime.now().strftime('%Y%m%d')}.{extension(formato)}"
+
+@click.group('export')
+def export_cli():
+    """Exportación de contactos e interacciones"""
+
+def _opciones_exportacion(funcion):
+    funcion = click.option('--salida', type=click.Path(dir_okay=False, writable=True), default=None,
+                           help='Archivo de salida (por defecto, la salida estándar)')(funcion)
+    funcion = click.option('--formato', type=click.Choice(FORMATOS), default='csv', show_default=True)(funcion)
+    funcion = click.option('--usuario', required=True, help='Email del usuario a exportar')(funcion)
+    return funcion
+
+@export_cli.command('contactos')
+@_opciones_exportacion
+@with_appcontext
+def exportar_contactos_command(usuario, formato, salida):
+    """Exporta los contactos de un usuario (en JSON Lines, con sus interacciones)"""
+    _exportar_desde_cli('contactos', usuario, formato, salida)
+
+@export_cli.command('interacciones')
+@_opciones_exportacion
+@with_appcontext
+def exportar_interacciones_command(usuario, formato, salida):
+    """Exporta las interacciones de un usuario, una por fila"""
+    _exportar_desde_cli('interacciones', usuario, formato, salida)
+
+def _exportar_desde_cli(tipo, usuario, formato, salida):
+    user = User.query.filter_by(email=usuario).first()
+    if user is None:
+        raise click.ClickException(f'No existe el usuario {usuario}')
+
+    destino = open(salida, 'w', encoding='utf-8', newline='') if salida else click.get_text_stream('stdout')
+    try:
+        for fragmento in exportar(user.id, tipo, formato):
+            destino.write(fragmento)
+    finally:
+        if salida:
+            destino.close()
+    if salida:
+        click.echo(f'✓ Exportado a {salida}', err=True)
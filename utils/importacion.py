@@ -0,0 +1,393 @@
+"""
+Importación masiva de contactos e interacciones desde CSV o JSON Lines.
+
+El archivo se lee como flujo y se procesa en lotes (LOTE filas): por lote se
+hace una sola consulta para detectar emails ya existentes, un INSERT múltiple
+de contactos (con RETURNING para obtener los ids), otro de etiquetas asociadas
+y otro de interacciones; luego se ajustan los contadores materializados y se
+hace commit. La memoria usada no depende del tamaño del archivo.
+
+Columnas de contactos: nombre, email, telefono, empresa, etiquetas, notas.
+En JSON Lines un contacto puede traer "interacciones": [{"fecha", "nota"}].
+Columnas de interacciones: email (del contacto), fecha, nota.
+"""
+import csv
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field, asdict, fields
+from itertools import islice
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, update, func
+from models import db, User, Contacto, Interaccion, Etiqueta, contacto_etiquetas, parse_etiquetas
+from utils.contadores import ajustar_contadores, asegurar as asegurar_contadores, clave_empresa
+from utils.cache import cache
+from utils import analitica
+
+LOTE = 1000
+MAX_ERRORES = 20
+FORMATOS = ('csv', 'jsonl')
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede importar (formato o encabezados inválidos)"""
+
+@dataclass
+class ResultadoImportacion:
+    """Resumen de una importación"""
+    leidas: int = 0
+    importadas: int = 0
+    duplicadas: int = 0
+    invalidas: int = 0
+    interacciones: int = 0
+    errores: list = field(default_factory=list)
+    segundos: float = 0
+
+    @property
+    def filas_por_segundo(self):
+        return round(self.leidas / self.segundos, 1) if self.segundos else 0
+
+    def registrar_error(self, linea, mensaje):
+        self.invalidas += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append((linea, mensaje))
+
+    def resumen(self):
+        return (f'{self.leidas} filas leídas, {self.importadas} importadas, '
+                f'{self.duplicadas} duplicadas, {self.invalidas} inválidas, '
+                f'{self.interacciones} interacciones ({self.filas_por_segundo} filas/s)')
+
+    def como_dict(self):
+        return {**asdict(self), 'filas_por_segundo': self.filas_por_segundo}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        nombres = {campo.name for campo in fields(cls)}
+        return cls(**{clave: valor for clave, valor in (datos or {}).items() if clave in nombres})
+
+def formato_por_nombre(nombre_archivo):
+    """'csv' o 'jsonl' según la extensión del archivo"""
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ErrorImportacion('Formato no reconocido: usa un archivo .csv o .jsonl')
+
+def leer_registros(texto, formato):
+    """Genera (número de línea, dict) desde un flujo de texto"""
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        if not lector.fieldnames:
+            raise ErrorImportacion('El CSV no tiene encabezados')
+        lector.fieldnames = [nombre.strip().lower() for nombre in lector.fieldnames]
+        for registro in lector:
+            yield lector.line_num, registro
+    elif formato == 'jsonl':
+        for numero, linea in enumerate(texto, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            if numero == 1 and linea.startswith('['):
+                raise ErrorImportacion('Se esperaba JSON Lines (un objeto por línea), no un arreglo JSON')
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                yield numero, None
+                continue
+            yield numero, registro if isinstance(registro, dict) else None
+    else:
+        raise ErrorImportacion(f'Formato desconocido: {formato}')
+
+def _lotes(registros, tamano):
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _texto(valor, columna=None):
+    """Texto sin espacios sobrantes o None; valida el largo de la columna"""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    if not valor:
+        return None
+    if columna is not None:
+        largo = columna.type.length
+        if largo and len(valor) > largo:
+            raise ValueError(f'{columna.name} supera {largo} caracteres')
+    return valor
+
+def _fecha(valor):
+    if valor in (None, ''):
+        return datetime.now()
+    if isinstance(valor, (int, float)):
+        try:
+            return datetime.fromtimestamp(valor)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f'fecha inválida: {valor}')
+    try:
+        fecha = datetime.fromisoformat(str(valor).strip())
+    except ValueError:
+        raise ValueError(f'fecha inválida: {valor}')
+    # Las columnas guardan hora local sin zona
+    return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo else fecha
+
+def _interaccion(datos):
+    if not isinstance(datos, dict):
+        raise ValueError('interacción inválida')
+    nota = _texto(datos.get('nota'))
+    if not nota:
+        raise ValueError('interacción sin nota')
+    return {'fecha': _fecha(datos.get('fecha')), 'nota': nota}
+
+def _contacto(registro):
+    """Datos normalizados de un contacto; ValueError si la fila no es válida"""
+    if registro is None:
+        raise ValueError('JSON inválido')
+    columnas = Contacto.__table__.c
+    nombre = _texto(registro.get('nombre'), columnas.nombre)
+    if not nombre:
+        raise ValueError('falta el nombre')
+    interacciones = registro.get('interacciones') or []
+    if not isinstance(interacciones, list):
+        raise ValueError('interacciones debe ser una lista')
+    return {
+        'nombre': nombre,
+        'email': _texto(registro.get('email'), columnas.email),
+        'telefono': _texto(registro.get('telefono'), columnas.telefono),
+        'empresa': _texto(registro.get('empresa'), columnas.empresa),
+        'notas': _texto(registro.get('notas')),
+        'etiquetas': parse_etiquetas(registro.get('etiquetas')),
+        'interacciones': [_interaccion(datos) for datos in interacciones],
+    }
+
+def ids_etiquetas(user_id, nombres, conocidas):
+    """Ids de las etiquetas `nombres`, creando las que falten; `conocidas` se reutiliza entre lotes"""
+    faltan = [nombre for nombre in nombres if nombre not in conocidas]
+    if faltan:
+        tabla = Etiqueta.__table__
+        consulta = select(tabla.c.nombre, tabla.c.id).where(tabla.c.user_id == user_id,
+                                                            tabla.c.nombre.in_(faltan))
+        conocidas.update(db.session.execute(consulta).all())
+        nuevas = [nombre for nombre in faltan if nombre not in conocidas]
+        if nuevas:
+            db.session.execute(insert(tabla), [{'user_id': user_id, 'nombre': nombre} for nombre in nuevas])
+            conocidas.update(db.session.execute(consulta).all())
+    return {nombre: conocidas[nombre] for nombre in nombres}
+
+def insertar_contactos(filas):
+    """INSERT múltiple que devuelve los ids en el orden de `filas`"""
+    tabla = Contacto.__table__
+    if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True)
+        return db.session.execute(stmt, filas).scalars().all()
+    return [db.session.execute(insert(tabla), fila).inserted_primary_key[0] for fila in filas]
+
+def _procesar_contactos(user_id, lote, resultado, etiquetas_conocidas):
+    validos = []
+    for linea, registro in lote:
+        try:
+            validos.append((linea, _contacto(registro)))
+        except ValueError as e:
+            resultado.registrar_error(linea, str(e))
+
+    # Una consulta por lote para los emails que ya existen
+    emails = {datos['email'] for _, datos in validos if datos['email']}
+    existentes = set()
+    if emails:
+        existentes = set(db.session.execute(
+            select(Contacto.email).where(Contacto.user_id == user_id, Contacto.email.in_(emails))
+        ).scalars())
+
+    ahora = datetime.utcnow()
+    nuevos = []
+    for linea, datos in validos:
+        email = datos['email']
+        if email and email in existentes:
+            resultado.duplicadas += 1
+            continue
+        if email:
+            existentes.add(email)
+        nuevos.append(datos)
+    if not nuevos:
+        return
+
+    filas = []
+    for datos in nuevos:
+        fechas = [interaccion['fecha'] for interaccion in datos['interacciones']]
+        filas.append({
+            'user_id': user_id,
+            'nombre': datos['nombre'],
+            'email': datos['email'],
+            'telefono': datos['telefono'],
+            'empresa': datos['empresa'],
+            'notas': datos['notas'],
+            'ultima_interaccion': max(fechas) if fechas else ahora,
+            'fecha_creacion': ahora,
+            'fecha_actualizacion': ahora,
+            'interacciones_count': len(fechas),
+        })
+    ids = insertar_contactos(filas)
+
+    nombres = sorted({nombre for datos in nuevos for nombre in datos['etiquetas']})
+    etiqueta_por_nombre = ids_etiquetas(user_id, nombres, etiquetas_conocidas) if nombres else {}
+    asociaciones, interacciones = [], []
+    for contacto_id, datos in zip(ids, nuevos):
+        asociaciones.extend({'contacto_id': contacto_id, 'etiqueta_id': etiqueta_por_nombre[nombre]}
+                            for nombre in datos['etiquetas'])
+        interacciones.extend({'contacto_id': contacto_id, 'user_id': user_id, 'fecha': i['fecha'], 'nota': i['nota'],
+                              'fecha_creacion': datetime.now()}
+                             for i in datos['interacciones'])
+    if asociaciones:
+        db.session.execute(insert(contacto_etiquetas), asociaciones)
+    if interacciones:
+        db.session.execute(insert(Interaccion.__table__), interacciones)
+        analitica.registrar_interacciones(user_id, [(i['contacto_id'], i['fecha'], 1) for i in interacciones])
+
+    ajustar_contadores(
+        user_id,
+        contactos=len(nuevos),
+        interacciones=len(interacciones),
+        etiquetas=Counter(nombre for datos in nuevos for nombre in datos['etiquetas']),
+        empresas=Counter(clave_empresa(datos['empresa']) for datos in nuevos)
+    )
+    resultado.importadas += len(nuevos)
+    resultado.interacciones += len(interacciones)
+
+def _procesar_interacciones(user_id, lote, resultado):
+    validas = []
+    for linea, registro in lote:
+        try:
+            if registro is None:
+                raise ValueError('JSON inválido')
+            email = _texto(registro.get('email') or registro.get('contacto_email'))
+            if not email:
+                raise ValueError('falta el email del contacto')
+            validas.append((linea, email, _interaccion(registro)))
+        except ValueError as e:
+            resultado.registrar_error(linea, str(e))
+
+    emails = {email for _, email, _ in validas}
+    if not emails:
+        return
+    ids = dict(db.session.execute(
+        select(Contacto.email, Contacto.id).where(Contacto.user_id == user_id, Contacto.email.in_(emails))
+    ).all())
+
+    filas = []
+    for linea, email, interaccion in validas:
+        contacto_id = ids.get(email)
+        if contacto_id is None:
+            resultado.registrar_error(linea, f'no existe un contacto con email {email}')
+            continue
+        filas.append({'contacto_id': contacto_id, 'user_id': user_id, 'fecha': interaccion['fecha'],
+                      'nota': interaccion['nota'], 'fecha_creacion': datetime.now()})
+    if not filas:
+        return
+    db.session.execute(insert(Interaccion.__table__), filas)
+
+    # Los INSERT masivos no pasan por los eventos del modelo: recalcular los contactos afectados
+    afectados = {fila['contacto_id'] for fila in filas}
+    interacciones = Interaccion.__table__
+    db.session.execute(
+        update(Contacto.__table__)
+        .where(Contacto.__table__.c.id.in_(afectados))
+        .values(
+            interacciones_count=select(func.count(interacciones.c.id))
+                                .where(interacciones.c.contacto_id == Contacto.__table__.c.id)
+                                .scalar_subquery(),
+            ultima_interaccion=func.coalesce(
+                select(func.max(interacciones.c.fecha))
+                .where(interacciones.c.contacto_id == Contacto.__table__.c.id)
+                .scalar_subquery(),
+                Contacto.__table__.c.fecha_creacion
+            )
+        )
+    )
+    ajustar_contadores(user_id, interacciones=len(filas))
+    analitica.registrar_interacciones(user_id, [(fila['contacto_id'], fila['fecha'], 1) for fila in filas])
+    resultado.interacciones += len(filas)
+
+def importar(user_id, texto, formato, tipo='contactos', lote=LOTE, progreso=None, resultado=None):
+    """
+    Importa contactos o interacciones desde el flujo de texto `texto`.
+    Hace commit por lote; devuelve un ResultadoImportacion.
+
+    `progreso(resultado)` se llama después de cada commit. Para reanudar una
+    importación interrumpida se pasa el `resultado` del último lote guardado:
+    se saltean las resultado.leidas filas ya procesadas.
+    """
+    if formato not in FORMATOS:
+        raise ErrorImportacion(f'Formato desconocido: {formato}')
+    if tipo not in ('contactos', 'interacciones'):
+        raise ErrorImportacion(f'Tipo desconocido: {tipo}')
+
+    resultado = resultado or ResultadoImportacion()
+    etiquetas_conocidas = {}
+    inicio = time.perf_counter() - resultado.segundos
+    registros_archivo = islice(leer_registros(texto, formato), resultado.leidas, None)
+    try:
+        asegurar_contadores(user_id)
+        for registros in _lotes(registros_archivo, lote):
+            resultado.leidas += len(registros)
+            if tipo == 'contactos':
+                _procesar_contactos(user_id, registros, resultado, etiquetas_conocidas)
+            else:
+                _procesar_interacciones(user_id, registros, resultado)
+            db.session.commit()
+            if progreso:
+                resultado.segundos = time.perf_counter() - inicio
+                progreso(resultado)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        cache.invalidar_usuario(user_id)
+        resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+@click.group('import')
+def import_cli():
+    """Importación masiva de contactos e interacciones"""
+
+def _importar_desde_cli(tipo, archivo, usuario, formato, lote):
+    user = User.query.filter_by(email=usuario).first()
+    if user is None:
+        raise click.ClickException(f'No existe el usuario {usuario}')
+    formato = formato or formato_por_nombre(archivo)
+    with open(archivo, encoding='utf-8-sig', newline='') as texto:
+        try:
+            resultado = importar(user.id, texto, formato, tipo=tipo, lote=lote)
+        except ErrorImportacion as e:
+            raise click.ClickException(str(e))
+        except UnicodeDecodeError:
+            raise click.ClickException('El archivo debe estar codificado en UTF-8')
+    for linea, mensaje in resultado.errores:
+        click.echo(f'  línea {linea}: {mensaje}')
+    click.echo(f'✓ {resultado.resumen()}')
+
+@import_cli.command('contactos')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--usuario', required=True, help='Email del usuario dueño de los contactos')
+@click.option('--formato', type=click.Choice(FORMATOS), default=None, help='Por defecto, según la extensión')
+@click.option('--lote', type=int, default=LOTE, show_default=True, help='Filas por transacción')
+@with_appcontext
+def importar_contactos_command(archivo, usuario, formato, lote):
+    """Importa contactos desde un CSV o JSON Lines"""
+    _importar_desde_cli('contactos', archivo, usuario, formato, lote)
+
+@import_cli.command('interacciones')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--usuario', required=True, help='Email del usuario dueño de los contactos')
+@click.option('--formato', type=click.Choice(FORMATOS), default=None, help='Por defecto, según la extensión')
+@click.option('--lote', type=int, default=LOTE, show_default=True, help='Filas por transacción')
+@with_appcontext
+def importar_interacciones_command(archivo, usuario, formato, lote):
+    """Importa interacciones (email del contacto, fecha, nota) desde un CSV o JSON Lines"""
+    _importar_desde_cli('interacciones', archivo, usuario, formato, lote)
@@ -0,0 +1,144 @@
+"""
+Motor de migraciones de datos por lotes (backfills) reanudables.
+
+Una migración hereda de MigracionPorLotes, indica la tabla y las columnas a
+leer y define procesar(filas, simulacion). El motor recorre la tabla por id
+con paginación keyset (WHERE id > último ORDER BY id LIMIT lote): cada lote
+lee solo esas columnas como tuplas, se procesa y se confirma en su propia
+transacción junto con el punto de control (tabla puntos_control). Si el
+proceso se cae, la próxima ejecución sigue después del último lote confirmado;
+la memoria y el tiempo de bloqueo no dependen del tamaño de la tabla.
+
+En simulación (dry-run) cada lote se revierte y el punto de control no se mueve.
+"""
+import time
+from dataclasses import dataclass
+from sqlalchemy import select
+from models import db, PuntoControl
+
+LOTE = 1000
+
+@dataclass
+class ResultadoLotes:
+    """Avance de una migración por lotes (acumulado entre ejecuciones)"""
+    leidas: int = 0
+    modificadas: int = 0
+    # Lotes y filas de esta ejecución (la velocidad no cuenta lo hecho antes de reanudar)
+    lotes: int = 0
+    leidas_ejecucion: int = 0
+    ultimo_id: int = 0
+    segundos: float = 0
+    simulacion: bool = False
+    terminada: bool = False
+
+    @property
+    def filas_por_segundo(self):
+        return round(self.leidas_ejecucion / self.segundos, 1) if self.segundos else 0
+
+    def resumen(self):
+        prefijo = '[simulación] ' if self.simulacion else ''
+        return (f'{prefijo}{self.leidas} filas leídas, {self.modificadas} modificadas, '
+                f'{self.lotes} lotes hasta id {self.ultimo_id} ({self.filas_por_segundo} filas/s)')
+
+class MigracionPorLotes:
+    """Base de las migraciones de datos por lotes"""
+
+    # Clave del punto de control
+    nombre = None
+    # Tabla (db.Table o sa.table) con una columna entera `id`
+    tabla = None
+    # Columnas a leer además del id
+    columnas = ()
+
+    def __init__(self, lote=LOTE, simulacion=False, reiniciar=False, progreso=None):
+        self.lote = lote
+        self.simulacion = simulacion
+        self.reiniciar = reiniciar
+        self.progreso = progreso
+
+    def condicion(self):
+        """Filtro opcional de las filas a procesar"""
+        return None
+
+    def procesar(self, filas, simulacion):
+        """Procesa un lote de filas; devuelve cuántas modificó (o modificaría)"""
+        raise NotImplementedError
+
+    def despues_del_lote(self):
+        """Se llama tras confirmar cada lote (p. ej. para invalidar cachés)"""
+
+    def _punto_control(self):
+        PuntoControl.__table__.create(db.engine, checkfirst=True)
+        punto = db.session.get(PuntoControl, self.nombre)
+        if punto is None:
+            punto = PuntoControl(nombre=self.nombre, ultimo_id=0, leidas=0, modificadas=0, terminada=False)
+            if not self.simulacion:
+                db.session.add(punto)
+        elif self.reiniciar:
+            punto.ultimo_id, punto.leidas, punto.modificadas, punto.terminada = 0, 0, 0, False
+        return punto
+
+    def ejecutar(self):
+        """Procesa los lotes pendientes; devuelve un ResultadoLotes"""
+        punto = self._punto_control()
+        resultado = ResultadoLotes(leidas=punto.leidas, modificadas=punto.modificadas,
+                                   ultimo_id=punto.ultimo_id, simulacion=self.simulacion,
+                                   terminada=punto.terminada)
+        if not self.simulacion:
+            db.session.commit()
+        if resultado.terminada:
+            return resultado
+
+        id_columna = self.tabla.c.id
+        consulta = select(id_columna, *(self.tabla.c[nombre] for nombre in self.columnas))
+        if self.condicion() is not None:
+            consulta = consulta.where(self.condicion())
+        consulta = consulta.order_by(id_columna).limit(self.lote)
+
+        inicio = time.perf_counter()
+        try:
+            while True:
+                filas = db.session.execute(consulta.where(id_columna > resultado.ultimo_id)).all()
+                if not filas:
+                    break
+                modificadas = self.procesar(filas, self.simulacion)
+                resultado.ultimo_id = filas[-1].id
+                resultado.leidas += len(filas)
+                resultado.leidas_ejecucion += len(filas)
+                resultado.modificadas += modificadas or 0
+                resultado.lotes += 1
+
+                if self.simulacion:
+                    db.session.rollback()
+                else:
+                    punto.ultimo_id = resultado.ultimo_id
+                    punto.leidas = resultado.leidas
+                    punto.modificadas = resultado.modificadas
+                    db.session.commit()
+                    self.despues_del_lote()
+
+                resultado.segundos = time.perf_counter() - inicio
+                if self.progreso:
+                    self.progreso(resultado)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        resultado.terminada = True
+        resultado.segundos = time.perf_counter() - inicio
+        if not self.simulacion:
+            punto.terminada = True
+            db.session.commit()
+        return resultado
+
+def imprimir_progreso(intervalo=2.0, imprimir=print):
+    """Callback de progreso que escribe una línea con filas/s cada `intervalo` segundos"""
+    ultimo = [0.0]
+
+    def progreso(resultado):
+        if resultado.segundos - ultimo[0] < intervalo:
+            return
+        ultimo[0] = resultado.segundos
+        imprimir(f'  {resultado.leidas} filas ({resultado.modificadas} modificadas), '
+                 f'id {resultado.ultimo_id}, {resultado.filas_por_segundo} filas/s')
+    return progreso
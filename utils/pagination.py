@@ -0,0 +1,104 @@
+"""
+Paginación por cursor (keyset) para listados ordenados por columnas indexadas.
+
+En lugar de OFFSET + COUNT(*), cada página filtra con una comparación de tupla
+contra la última fila de la página anterior, así la página N cuesta lo mismo
+que la primera. Los cursores viajan en la URL como tokens firmados y opacos.
+"""
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import tuple_
+
+class KeysetPage:
+    """Página de resultados con cursores para la siguiente y la anterior"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # Total estimado (contadores materializados); None si no se conoce
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+def _codificar_valor(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    return valor
+
+def _decodificar_valor(valor):
+    if isinstance(valor, dict) and 'dt' in valor:
+        return datetime.fromisoformat(valor['dt'])
+    return valor
+
+def encode_cursor(valores, direccion='next'):
+    """Token opaco con los valores de la clave de orden y la dirección"""
+    return _serializer().dumps({'v': [_codificar_valor(v) for v in valores], 'd': direccion})
+
+def decode_cursor(token):
+    """(valores, dirección) o (None, 'next') si el token falta o no es válido"""
+    if not token:
+        return None, 'next'
+    try:
+        datos = _serializer().loads(token)
+        return [_decodificar_valor(v) for v in datos['v']], datos.get('d', 'next')
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None, 'next'
+
+def paginate_keyset(query, columnas, cursor=None, per_page=10, total=None, descendente=True):
+    """
+    Pagina `query` en orden descendente (o ascendente) por `columnas` (la última
+    debe ser única, normalmente el id). `cursor` es el token recibido en la URL.
+    """
+    valores, direccion = decode_cursor(cursor)
+    clave = tuple_(*columnas)
+    # Hacia atrás se recorre el índice en el sentido contrario
+    hacia_abajo = descendente == (direccion != 'prev')
+
+    if valores is not None and len(valores) == len(columnas):
+        if hacia_abajo:
+            query = query.filter(clave < tuple_(*valores))
+        else:
+            query = query.filter(clave > tuple_(*valores))
+    else:
+        valores, direccion = None, 'next'
+        hacia_abajo = descendente
+
+    if hacia_abajo:
+        orden = [columna.desc() for columna in columnas]
+    else:
+        orden = [columna.asc() for columna in columnas]
+
+    filas = query.order_by(*orden).limit(per_page + 1).all()
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    if direccion == 'prev':
+        filas.reverse()
+
+    def valores_de(fila):
+        return [getattr(fila, columna.key) for columna in columnas]
+
+    next_cursor = prev_cursor = None
+    if filas:
+        if direccion == 'next':
+            if hay_mas:
+                next_cursor = encode_cursor(valores_de(filas[-1]), 'next')
+            if valores is not None:
+                prev_cursor = encode_cursor(valores_de(filas[0]), 'prev')
+        else:
+            next_cursor = encode_cursor(valores_de(filas[-1]), 'next')
+            if hay_mas:
+                prev_cursor = encode_cursor(valores_de(filas[0]), 'prev')
+
+    return KeysetPage(filas, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total)
@@ -0,0 +1,107 @@
+"""
+Servicio de hashing de contraseñas con bcrypt.
+
+Los hashes se calculan en un pool acotado (hilos o procesos) en lugar de en el
+hilo de la petición, con un límite de trabajos pendientes: si el pool está
+saturado (por ejemplo, una ráfaga de intentos de login) se lanza
+ServicioSaturado de inmediato en vez de encolar peticiones sin fin.
+
+Configuración:
+- BCRYPT_ROUNDS: costo de los hashes nuevos (12 por defecto). Los hashes con
+  otro costo se regeneran en el siguiente login correcto.
+- BCRYPT_POOL: 'thread' (por defecto; bcrypt libera el GIL), 'process' o 'inline'.
+- BCRYPT_WORKERS: tamaño del pool (número de CPUs por defecto).
+- BCRYPT_MAX_PENDING: trabajos en curso + en cola antes de rechazar (4 por worker).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import bcrypt
+from flask import current_app, has_app_context
+
+ROUNDS_POR_DEFECTO = 12
+
+class ServicioSaturado(Exception):
+    """El pool de hashing tiene demasiados trabajos pendientes"""
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+class PasswordHasher:
+    """Pool acotado con contrapresión por cantidad de trabajos pendientes"""
+
+    def __init__(self, tipo='thread', workers=None, max_pendientes=None):
+        self.tipo = tipo
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pendientes = max_pendientes or self.workers * 4
+        self._cupos = threading.BoundedSemaphore(self.max_pendientes)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Se crea en el primer uso, después del fork de los workers de gunicorn
+        with self._lock:
+            if self._pool is None:
+                clase = ProcessPoolExecutor if self.tipo == 'process' else ThreadPoolExecutor
+                self._pool = clase(max_workers=self.workers)
+            return self._pool
+
+    def ejecutar(self, funcion, *args):
+        if self.tipo == 'inline':
+            return funcion(*args)
+        if not self._cupos.acquire(blocking=False):
+            raise ServicioSaturado('Demasiadas operaciones de contraseña en curso')
+        try:
+            return self._executor().submit(funcion, *args).result()
+        finally:
+            self._cupos.release()
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+_servicios = {}
+_servicios_lock = threading.Lock()
+
+def _config(clave, default):
+    return current_app.config.get(clave, default) if has_app_context() else default
+
+def servicio():
+    """PasswordHasher de este proceso para la configuración actual"""
+    tipo = _config('BCRYPT_POOL', 'thread')
+    workers = _config('BCRYPT_WORKERS', None)
+    max_pendientes = _config('BCRYPT_MAX_PENDING', None)
+    clave = (tipo, workers, max_pendientes)
+    with _servicios_lock:
+        if clave not in _servicios:
+            _servicios[clave] = PasswordHasher(tipo, workers, max_pendientes)
+        return _servicios[clave]
+
+def rounds_configurados():
+    return int(_config('BCRYPT_ROUNDS', ROUNDS_POR_DEFECTO))
+
+def hash_password(password, rounds=None):
+    """Hash bcrypt (str) de `password` con el costo configurado"""
+    rounds = rounds or rounds_configurados()
+    hashed = servicio().ejecutar(_hashpw, password.encode('utf-8'), rounds)
+    return hashed.decode('utf-8')
+
+def verify_password(password, hashed):
+    """True si `password` corresponde al hash"""
+    return servicio().ejecutar(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+def costo(hashed):
+    """Costo (log2 de rondas) de un hash bcrypt '$2b$12$...', o None si no se reconoce"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def necesita_rehash(hashed, rounds=None):
+    """True si el hash no usa el costo configurado"""
+    return costo(hashed) != (rounds or rounds_configurados())
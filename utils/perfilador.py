@@ -0,0 +1,213 @@
+"""
+Perfilador de consultas SQL por petición.
+
+Con SQL_PROFILER activado, cada petición cuenta sus consultas, el tiempo total
+en la base, las sentencias repetidas (el patrón N+1: la misma sentencia muchas
+veces con distintos parámetros) y las más lentas. El resultado:
+- se devuelve en la cabecera Server-Timing (visible en las devtools del navegador);
+- se registra con sus campos en el logger 'minicrm.perfilador' (WARNING si la
+  petición supera SQL_PROFILER_SLOW_MS o tiene sentencias repetidas);
+- se acumula por endpoint y se publica en /metrics en formato de texto de
+  Prometheus (ver routes/main.py).
+
+Los acumulados son de cada proceso: con varios workers, Prometheus debe
+consultar cada uno o sumarlos.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('minicrm.perfilador')
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+LENTAS_POR_ENDPOINT = 5
+LARGO_SENTENCIA = 200
+
+def _compactar(sentencia):
+    return ' '.join(sentencia.split())[:LARGO_SENTENCIA]
+
+def _antes_de_ejecutar(conn, cursor, sentencia, parametros, contexto, executemany):
+    if has_request_context() and 'perfil_sql' in g:
+        conn.info.setdefault('perfil_inicio', []).append(time.perf_counter())
+
+def _despues_de_ejecutar(conn, cursor, sentencia, parametros, contexto, executemany):
+    inicios = conn.info.get('perfil_inicio')
+    if not inicios or not has_request_context() or 'perfil_sql' not in g:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    perfil = g.perfil_sql
+    perfil['consultas'] += 1
+    perfil['tiempo_db'] += duracion
+    perfil['sentencias'][sentencia] += 1
+    perfil['lentas'].append((duracion, sentencia))
+    if len(perfil['lentas']) > LENTAS_POR_ENDPOINT:
+        perfil['lentas'].sort(reverse=True)
+        perfil['lentas'].pop()
+
+_escuchando = False
+_escuchando_lock = threading.Lock()
+
+def _escuchar_engine():
+    """Los eventos se registran una sola vez sobre la clase Engine (todas las apps)"""
+    global _escuchando
+    with _escuchando_lock:
+        if not _escuchando:
+            event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+            event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+            _escuchando = True
+
+def _etiqueta(valor):
+    """Escapa un valor de etiqueta para el formato de texto de Prometheus"""
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class EstadisticasEndpoint:
+    """Acumulados de un endpoint en este proceso"""
+
+    def __init__(self):
+        self.peticiones = Counter()
+        self.buckets = [0] * len(BUCKETS)
+        self.duracion = 0.0
+        self.tiempo_db = 0.0
+        self.consultas = 0
+        self.max_consultas = 0
+        self.duplicadas = 0
+        self.lentas = {}
+
+    def registrar(self, estado, duracion, perfil, duplicadas):
+        self.peticiones[estado] += 1
+        for indice, limite in enumerate(BUCKETS):
+            if duracion <= limite:
+                self.buckets[indice] += 1
+        self.duracion += duracion
+        self.tiempo_db += perfil['tiempo_db']
+        self.consultas += perfil['consultas']
+        self.max_consultas = max(self.max_consultas, perfil['consultas'])
+        self.duplicadas += len(duplicadas)
+        for segundos, sentencia in perfil['lentas']:
+            clave = _compactar(sentencia)
+            self.lentas[clave] = max(self.lentas.get(clave, 0), segundos)
+        if len(self.lentas) > LENTAS_POR_ENDPOINT:
+            mayores = sorted(self.lentas.items(), key=lambda item: item[1], reverse=True)
+            self.lentas = dict(mayores[:LENTAS_POR_ENDPOINT])
+
+class Perfilador:
+    """Extensión de Flask: instrumenta peticiones y consultas si SQL_PROFILER está activo"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_PROFILER', False)
+        app.config.setdefault('SQL_PROFILER_SLOW_MS', 500)
+        app.config.setdefault('SQL_PROFILER_DUPLICATE_MIN', 3)
+        if not app.config['SQL_PROFILER']:
+            return
+
+        _escuchar_engine()
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+
+    def _iniciar(self):
+        g.perfil_sql = {'inicio': time.perf_counter(), 'consultas': 0, 'tiempo_db': 0.0,
+                        'sentencias': Counter(), 'lentas': []}
+
+    def _finalizar(self, response):
+        perfil = g.pop('perfil_sql', None)
+        if perfil is None:
+            return response
+
+        duracion = time.perf_counter() - perfil['inicio']
+        minimo = current_app.config['SQL_PROFILER_DUPLICATE_MIN']
+        duplicadas = {sentencia: veces for sentencia, veces in perfil['sentencias'].items() if veces >= minimo}
+        endpoint = request.endpoint or 'sin_endpoint'
+
+        with self._lock:
+            estadisticas = self.endpoints.setdefault(endpoint, EstadisticasEndpoint())
+            estadisticas.registrar(response.status_code, duracion, perfil, duplicadas)
+
+        response.headers.add('Server-Timing',
+                             f'db;dur={perfil["tiempo_db"] * 1000:.1f};desc="{perfil["consultas"]} consultas"')
+        response.headers.add('Server-Timing', f'app;dur={duracion * 1000:.1f}')
+
+        lenta = duracion * 1000 >= current_app.config['SQL_PROFILER_SLOW_MS']
+        nivel = logging.WARNING if lenta or duplicadas else logging.DEBUG
+        if logger.isEnabledFor(nivel):
+            campos = {
+                'endpoint': endpoint,
+                'estado': response.status_code,
+                'duracion_ms': round(duracion * 1000, 1),
+                'db_ms': round(perfil['tiempo_db'] * 1000, 1),
+                'consultas': perfil['consultas'],
+                'duplicadas': [{'sentencia': _compactar(sentencia), 'veces': veces}
+                               for sentencia, veces in duplicadas.items()],
+                'mas_lentas': [{'sentencia': _compactar(sentencia), 'ms': round(segundos * 1000, 1)}
+                               for segundos, sentencia in sorted(perfil['lentas'], reverse=True)[:3]],
+            }
+            logger.log(nivel, '%s %s', request.method, request.path, extra={'campos': campos})
+        return response
+
+    def prometheus(self, extras=None):
+        """Acumulados por endpoint en formato de texto de Prometheus (más métricas `extras`)"""
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            lineas = [
+                '# HELP minicrm_http_requests_total Peticiones atendidas por endpoint y estado.',
+                '# TYPE minicrm_http_requests_total counter',
+            ]
+            for endpoint, datos in endpoints:
+                for estado, cantidad in sorted(datos.peticiones.items()):
+                    lineas.append(f'minicrm_http_requests_total{{endpoint="{_etiqueta(endpoint)}",'
+                                  f'status="{estado}"}} {cantidad}')
+
+            lineas += ['# HELP minicrm_http_request_duration_seconds Duración de las peticiones.',
+                       '# TYPE minicrm_http_request_duration_seconds histogram']
+            for endpoint, datos in endpoints:
+                etiqueta = _etiqueta(endpoint)
+                for limite, cantidad in zip(BUCKETS, datos.buckets):
+                    lineas.append(f'minicrm_http_request_duration_seconds_bucket{{endpoint="{etiqueta}",'
+                                  f'le="{limite}"}} {cantidad}')
+                total = sum(datos.peticiones.values())
+                lineas.append(f'minicrm_http_request_duration_seconds_bucket{{endpoint="{etiqueta}",'
+                              f'le="+Inf"}} {total}')
+                lineas.append(f'minicrm_http_request_duration_seconds_sum{{endpoint="{etiqueta}"}} '
+                              f'{datos.duracion:.6f}')
+                lineas.append(f'minicrm_http_request_duration_seconds_count{{endpoint="{etiqueta}"}} {total}')
+
+            metricas = [
+                ('minicrm_db_queries_total', 'counter', 'Consultas SQL emitidas.', 'consultas', '{}'),
+                ('minicrm_db_duration_seconds_total', 'counter', 'Tiempo total en la base de datos.',
+                 'tiempo_db', '{:.6f}'),
+                ('minicrm_db_duplicate_statements_total', 'counter',
+                 'Sentencias repetidas dentro de una misma petición (posible N+1).', 'duplicadas', '{}'),
+                ('minicrm_db_queries_per_request_max', 'gauge', 'Máximo de consultas en una petición.',
+                 'max_consultas', '{}'),
+            ]
+            for nombre, tipo, ayuda, atributo, formato in metricas:
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+                for endpoint, datos in endpoints:
+                    valor = formato.format(getattr(datos, atributo))
+                    lineas.append(f'{nombre}{{endpoint="{_etiqueta(endpoint)}"}} {valor}')
+
+            lineas += ['# HELP minicrm_db_slowest_statement_seconds Sentencias más lentas por endpoint.',
+                       '# TYPE minicrm_db_slowest_statement_seconds gauge']
+            for endpoint, datos in endpoints:
+                for sentencia, segundos in sorted(datos.lentas.items(), key=lambda item: item[1], reverse=True):
+                    lineas.append(f'minicrm_db_slowest_statement_seconds{{endpoint="{_etiqueta(endpoint)}",'
+                                  f'statement="{_etiqueta(sentencia)}"}} {segundos:.6f}')
+
+        for nombre, tipo, ayuda, valor in extras or []:
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}', f'{nombre} {valor}']
+        return '\n'.join(lineas) + '\n'
+
+    def reiniciar(self):
+        with self._lock:
+            self.endpoints.clear()
+
+perfilador = Perfilador()
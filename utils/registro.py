@@ -0,0 +1,141 @@
+"""
+Logging de la aplicación: niveles, formato estructurado y escritura fuera del hilo de la petición.
+
+configurar_logging(app) instala en el logger raíz un QueueHandler: el hilo que
+registra solo encola el registro y un QueueListener en segundo plano lo formatea
+y lo escribe en stderr. Los mensajes usan formato diferido (logger.info('x %s', y)),
+así que por debajo de LOG_LEVEL no se construye ningún texto.
+
+Cada petición recibe un id (el de la cabecera X-Request-ID si viene una válida,
+o uno nuevo) que se agrega a todos sus registros y se devuelve en la respuesta.
+Los datos estructurados se pasan con extra={'campos': {...}}.
+
+Configuración:
+- LOG_LEVEL: DEBUG, INFO (por defecto), WARNING...
+- LOG_FORMAT: 'json' (una línea JSON por registro, por defecto) o 'texto'.
+- LOG_ASYNC: False para escribir directamente, sin cola (útil al depurar).
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, has_request_context
+
+_REQUEST_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_handler = None
+_listener = None
+
+def request_id():
+    """Id de la petición en curso, o '-' fuera de una petición"""
+    if has_request_context():
+        return g.get('request_id', '-')
+    return '-'
+
+class FiltroRequestId(logging.Filter):
+    """Agrega request_id al registro; corre en el hilo de la petición, antes de encolar"""
+
+    def filter(self, record):
+        record.request_id = request_id()
+        return True
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra={'campos': ...}"""
+
+    def format(self, record):
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'mensaje': record.getMessage(),
+        }
+        datos.update(getattr(record, 'campos', None) or {})
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible para desarrollo: campos como clave=valor al final"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        texto = super().format(record)
+        campos = getattr(record, 'campos', None)
+        if campos:
+            texto += ' ' + ' '.join(f'{clave}={valor}' for clave, valor in campos.items())
+        return texto
+
+class ManejadorCola(QueueHandler):
+    """
+    QueueHandler que deja el formato al listener: el QueueHandler estándar
+    formatea en el hilo de la petición y descarta exc_info, así que el
+    formateador nunca vería la excepción
+    """
+
+    def prepare(self, record):
+        registro = copy.copy(record)
+        # Los argumentos se resuelven ya: podrían cambiar antes de que se escriba
+        registro.msg = record.getMessage()
+        registro.args = None
+        return registro
+
+def _detener_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _instalar_handler(nivel, formato, asincrono):
+    """Instala (una sola vez por proceso) el handler del logger raíz"""
+    global _handler, _listener
+    raiz = logging.getLogger()
+    if _handler is not None:
+        raiz.setLevel(nivel)
+        return
+
+    salida = logging.StreamHandler(sys.stderr)
+    salida.setFormatter(FormatoJSON() if formato == 'json' else FormatoTexto())
+    if asincrono:
+        _handler = ManejadorCola(queue.SimpleQueue())
+        _listener = QueueListener(_handler.queue, salida, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_detener_listener)
+    else:
+        _handler = salida
+    _handler.addFilter(FiltroRequestId())
+    raiz.addHandler(_handler)
+    raiz.setLevel(nivel)
+
+def _asignar_request_id():
+    recibido = request.headers.get('X-Request-ID', '')
+    g.request_id = recibido if _REQUEST_ID_VALIDO.match(recibido) else uuid.uuid4().hex
+
+def _devolver_request_id(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+def configurar_logging(app):
+    """Configura niveles, formato y cola de logging, e ids de petición para la app"""
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_FORMAT', 'json')
+    app.config.setdefault('LOG_ASYNC', True)
+
+    nivel = logging.getLevelName(str(app.config['LOG_LEVEL']).upper())
+    if not isinstance(nivel, int):
+        raise ValueError(f"LOG_LEVEL desconocido: {app.config['LOG_LEVEL']}")
+    _instalar_handler(nivel, app.config['LOG_FORMAT'], app.config['LOG_ASYNC'])
+
+    app.before_request(_asignar_request_id)
+    app.after_request(_devolver_request_id)
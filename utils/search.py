@@ -0,0 +1,199 @@
+"""
+Búsqueda de texto completo sobre contactos y notas de interacciones.
+
+- PostgreSQL: índices GIN sobre expresiones to_tsvector('spanish', ...) y ts_rank.
+- SQLite: tablas virtuales FTS5 (contactos_fts, interacciones_fts) con triggers y bm25.
+- Otros motores (o SQLite sin FTS5): ILIKE sobre los mismos campos, sin ranking.
+
+Todo pasa por search_contacts(), que usan tanto el listado como /contactos/api/buscar.
+"""
+import re
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, text, DDL, Integer, Float
+from models import db, Contacto, Interaccion, contacto_etiquetas
+
+# Expresiones tsvector: el índice y las consultas deben usar exactamente la misma
+VECTOR_CONTACTO = ("to_tsvector('spanish'::regconfig, coalesce({t}nombre, '') || ' ' || "
+                   "coalesce({t}email, '') || ' ' || coalesce({t}empresa, '') || ' ' || "
+                   "coalesce({t}notas, ''))")
+VECTOR_INTERACCION = "to_tsvector('spanish'::regconfig, coalesce({t}nota, ''))"
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_contactos_busqueda ON contactos USING gin ({VECTOR_CONTACTO.format(t='')})",
+    f"CREATE INDEX IF NOT EXISTS ix_interacciones_busqueda ON interacciones USING gin ({VECTOR_INTERACCION.format(t='')})",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contactos_fts USING fts5(
+           nombre, email, empresa, notas,
+           content='contactos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ai AFTER INSERT ON contactos BEGIN
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_ad AFTER DELETE ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS contactos_fts_au AFTER UPDATE OF nombre, email, empresa, notas ON contactos BEGIN
+           INSERT INTO contactos_fts(contactos_fts, rowid, nombre, email, empresa, notas)
+           VALUES ('delete', old.id, old.nombre, old.email, old.empresa, old.notas);
+           INSERT INTO contactos_fts(rowid, nombre, email, empresa, notas)
+           VALUES (new.id, new.nombre, new.email, new.empresa, new.notas);
+       END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS interacciones_fts USING fts5(
+           nota, content='interacciones', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ai AFTER INSERT ON interacciones BEGIN
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_ad AFTER DELETE ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS interacciones_fts_au AFTER UPDATE OF nota ON interacciones BEGIN
+           INSERT INTO interacciones_fts(interacciones_fts, rowid, nota) VALUES ('delete', old.id, old.nota);
+           INSERT INTO interacciones_fts(rowid, nota) VALUES (new.id, new.nota);
+       END""",
+]
+
+SQLITE_REBUILD = [
+    "INSERT INTO contactos_fts(contactos_fts) VALUES ('rebuild')",
+    "INSERT INTO interacciones_fts(interacciones_fts) VALUES ('rebuild')",
+]
+
+# Peso de una coincidencia que solo aparece en las notas de interacciones
+PESO_INTERACCIONES = 0.5
+
+# Crear los índices junto con db.create_all() (interacciones se crea después de contactos)
+for _sentencia in POSTGRES_DDL:
+    event.listen(Interaccion.__table__, 'after_create', DDL(_sentencia).execute_if(dialect='postgresql'))
+for _sentencia in SQLITE_DDL:
+    event.listen(Interaccion.__table__, 'after_create', DDL(_sentencia).execute_if(dialect='sqlite'))
+
+_modos = {}
+
+def modo_busqueda():
+    """'postgresql', 'fts5' o 'like' según el motor y las estructuras disponibles"""
+    engine = db.engine
+    if engine.url not in _modos:
+        dialecto = engine.dialect.name
+        if dialecto == 'postgresql':
+            modo = 'postgresql'
+        elif dialecto == 'sqlite':
+            with engine.connect() as conn:
+                existe = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contactos_fts'"
+                )).first()
+            modo = 'fts5' if existe else 'like'
+        else:
+            modo = 'like'
+        _modos[engine.url] = modo
+    return _modos[engine.url]
+
+def _terminos(q):
+    """Palabras de la búsqueda, sin operadores ni comillas"""
+    return [t for t in re.findall(r'\w+', q.lower()) if t][:10]
+
+def _coincidencias_postgresql(terminos):
+    consulta = ' & '.join(f'{t}:*' for t in terminos)
+    return text(f"""
+        SELECT contacto_id, MAX(puntaje) AS puntaje FROM (
+            SELECT c.id AS contacto_id,
+                   ts_rank({VECTOR_CONTACTO.format(t='c.')}, to_tsquery('spanish', :consulta)) AS puntaje
+              FROM contactos c
+             WHERE c.user_id = :user_id
+               AND {VECTOR_CONTACTO.format(t='c.')} @@ to_tsquery('spanish', :consulta)
+            UNION ALL
+            SELECT i.contacto_id,
+                   :peso * ts_rank({VECTOR_INTERACCION.format(t='i.')}, to_tsquery('spanish', :consulta))
+              FROM interacciones i
+             WHERE i.user_id = :user_id
+               AND {VECTOR_INTERACCION.format(t='i.')} @@ to_tsquery('spanish', :consulta)
+        ) AS coincidencias
+        GROUP BY contacto_id
+    """).bindparams(consulta=consulta)
+
+def _coincidencias_fts5(terminos):
+    consulta = ' '.join(f'"{t}"*' for t in terminos)
+    return text("""
+        SELECT contacto_id, MAX(puntaje) AS puntaje FROM (
+            SELECT c.id AS contacto_id, -bm25(contactos_fts) AS puntaje
+              FROM contactos_fts
+              JOIN contactos c ON c.id = contactos_fts.rowid
+             WHERE contactos_fts MATCH :consulta
+               AND c.user_id = :user_id
+            UNION ALL
+            SELECT i.contacto_id, -bm25(interacciones_fts) * :peso
+              FROM interacciones_fts
+              JOIN interacciones i ON i.id = interacciones_fts.rowid
+             WHERE interacciones_fts MATCH :consulta
+               AND i.user_id = :user_id
+        )
+        GROUP BY contacto_id
+    """).bindparams(consulta=consulta)
+
+def _filtro_like(q):
+    patron = f'%{q}%'
+    en_interacciones = db.exists().where(Interaccion.contacto_id == Contacto.id,
+                                         Interaccion.nota.ilike(patron))
+    return db.or_(
+        Contacto.nombre.ilike(patron),
+        Contacto.email.ilike(patron),
+        Contacto.empresa.ilike(patron),
+        Contacto.notas.ilike(patron),
+        en_interacciones
+    )
+
+def search_contacts(user_id, q, page=1, per_page=10, etiqueta_id=None):
+    """
+    Busca contactos del usuario por nombre, email, empresa, notas y notas de
+    interacciones. Devuelve una paginación ordenada por relevancia.
+    """
+    terminos = _terminos(q)
+    query = Contacto.query.filter(Contacto.user_id == user_id)
+    if etiqueta_id is not None:
+        query = query.join(contacto_etiquetas, contacto_etiquetas.c.contacto_id == Contacto.id)\
+                     .filter(contacto_etiquetas.c.etiqueta_id == etiqueta_id)
+
+    modo = modo_busqueda()
+    if not terminos:
+        query = query.filter(db.false())
+        orden = [Contacto.ultima_interaccion.desc()]
+    elif modo == 'like':
+        query = query.filter(_filtro_like(q))
+        orden = [Contacto.ultima_interaccion.desc()]
+    else:
+        coincidencias = _coincidencias_postgresql(terminos) if modo == 'postgresql' else _coincidencias_fts5(terminos)
+        coincidencias = coincidencias.bindparams(peso=PESO_INTERACCIONES, user_id=user_id)
+        coincidencias = coincidencias.columns(contacto_id=Integer, puntaje=Float).subquery('coincidencias')
+        query = query.join(coincidencias, coincidencias.c.contacto_id == Contacto.id)
+        orden = [coincidencias.c.puntaje.desc(), Contacto.ultima_interaccion.desc()]
+
+    total = query.with_entities(db.func.count(Contacto.id)).scalar()
+    resultados = query.order_by(*orden).paginate(page=page, per_page=per_page, error_out=False, count=False)
+    resultados.total = total
+    return resultados
+
+def instalar_indices():
+    """Crea (si faltan) los índices de búsqueda y reindexa el contenido existente"""
+    dialecto = db.engine.dialect.name
+    if dialecto == 'postgresql':
+        for sentencia in POSTGRES_DDL:
+            db.session.execute(text(sentencia))
+    elif dialecto == 'sqlite':
+        for sentencia in SQLITE_DDL + SQLITE_REBUILD:
+            db.session.execute(text(sentencia))
+    db.session.commit()
+    _modos.pop(db.engine.url, None)
+    return modo_busqueda()
+
+@click.group('search')
+def search_cli():
+    """Comandos del índice de búsqueda"""
+
+@search_cli.command('reindex')
+@with_appcontext
+def reindex_command():
+    """Crea los índices de búsqueda que falten y reindexa contactos e interacciones"""
+    modo = instalar_indices()
+    click.echo(f'✓ Índice de búsqueda listo (modo: {modo})')
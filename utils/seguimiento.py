@@ -0,0 +1,61 @@
+"""
+Contactos que necesitan seguimiento: sin interacciones en los últimos N días.
+
+Contacto.ultima_interaccion (mantenida por los eventos del modelo; la fecha de
+alta si nunca hubo interacciones) es la segunda columna del índice
+ix_contactos_user_ultima_interaccion (user_id, ultima_interaccion, id). La
+lista es un rango de ese índice recorrido del contacto más olvidado al más
+reciente con paginación por cursor, y el contador del menú lee como mucho
+FOLLOWUP_BADGE_MAX + 1 entradas del mismo rango y queda cacheado hasta la
+próxima escritura del usuario (o el TTL, porque el paso del tiempo también
+cambia el resultado). Ninguna de las dos depende de cuántos contactos haya.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func
+from models import db, Contacto
+from utils.cache import cache
+from utils.pagination import paginate_keyset
+
+DIAS_MAXIMO = 3650
+
+def dias_validos(dias=None):
+    """`dias` acotado a [1, DIAS_MAXIMO]; FOLLOWUP_DAYS si no se indica"""
+    if not dias:
+        dias = current_app.config['FOLLOWUP_DAYS']
+    return max(1, min(int(dias), DIAS_MAXIMO))
+
+def fecha_limite(dias):
+    # Misma hora local que las fechas de las interacciones
+    return datetime.now() - timedelta(days=dias)
+
+def consulta(user_id, dias):
+    """Contactos del usuario cuya última interacción es anterior a hace `dias` días"""
+    return Contacto.query.filter(Contacto.user_id == user_id,
+                                 Contacto.ultima_interaccion < fecha_limite(dias))
+
+def pagina(user_id, dias, cursor=None, per_page=10, opciones=()):
+    """Página de contactos pendientes, del más antiguo al más reciente"""
+    return paginate_keyset(consulta(user_id, dias).options(*opciones), [Contacto.ultima_interaccion, Contacto.id],
+                           cursor=cursor, per_page=per_page, descendente=False)
+
+def contar(user_id, dias, maximo):
+    """Contactos pendientes, contando como mucho `maximo` + 1"""
+    rango = select(Contacto.id).where(Contacto.user_id == user_id,
+                                      Contacto.ultima_interaccion < fecha_limite(dias))\
+                               .limit(maximo + 1)\
+                               .subquery()
+    return db.session.execute(select(func.count()).select_from(rango)).scalar()
+
+def pendientes(user_id, dias=None):
+    """Cantidad cacheada de contactos pendientes (acotada a FOLLOWUP_BADGE_MAX + 1)"""
+    dias = dias_validos(dias)
+    maximo = current_app.config['FOLLOWUP_BADGE_MAX']
+    return cache.obtener(user_id, f'seguimiento:{dias}', lambda: contar(user_id, dias, maximo))
+
+def texto_pendientes(cantidad):
+    """'12' o '99+' para el contador del menú; None si no hay pendientes"""
+    if not cantidad:
+        return None
+    maximo = current_app.config['FOLLOWUP_BADGE_MAX']
+    return f'{maximo}+' if cantidad > maximo else str(cantidad)
@@ -0,0 +1,91 @@
+"""
+Principal de sesión liviano para Flask-Login.
+
+load_user devuelve un UsuarioSesion con solo id, nombre y activo, leído de la
+caché (utils/cache.py) y, si falta, con una consulta restringida a esas columnas.
+La entrada se descarta al cerrar sesión y cuando cambia el nombre o el estado
+`activo` del usuario (tras el commit), así que la mayoría de las peticiones
+autenticadas no consultan la tabla users.
+
+Esa invalidación solo llega a todos los workers con una caché compartida
+(redis). Con la caché en memoria cada proceso guarda su copia, y un usuario
+desactivado seguiría entrando por los demás workers hasta que venza: ahí el
+principal dura CACHE_PRINCIPAL_LOCAL_TTL segundos (5 por defecto).
+"""
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, User
+from utils.cache import cache
+
+def _clave(user_id):
+    return f'principal:{user_id}'
+
+def _ttl():
+    """TTL del principal: el general con caché compartida, unos segundos si es local al proceso"""
+    if cache.compartida:
+        return None
+    return current_app.config.get('CACHE_PRINCIPAL_LOCAL_TTL', 5)
+
+class UsuarioSesion(UserMixin):
+    """Lo que las rutas y plantillas necesitan de current_user"""
+
+    def __init__(self, id, nombre, activo=True):
+        self.id = id
+        self.nombre = nombre
+        self.activo = activo
+
+    @property
+    def is_active(self):
+        return self.activo
+
+    def __repr__(self):
+        return f'<UsuarioSesion {self.id}>'
+
+def cargar_principal(user_id):
+    """UsuarioSesion del usuario, o None si no existe o está desactivado"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    datos = cache.leer(_clave(user_id), grupo='principal')
+    if datos is None:
+        fila = db.session.query(User.id, User.nombre, User.activo)\
+                         .filter(User.id == user_id).first()
+        if fila is None:
+            return None
+        # activo NULL en filas antiguas equivale a activo
+        datos = {'id': fila.id, 'nombre': fila.nombre, 'activo': fila.activo is not False}
+        cache.guardar(_clave(user_id), datos, _ttl())
+
+    if not datos['activo']:
+        return None
+    return UsuarioSesion(**datos)
+
+def invalidar_principal(user_id):
+    """Descarta el principal cacheado (logout, desactivación, cambio de nombre)"""
+    cache.borrar(_clave(user_id))
+
+# Invalidación automática tras el commit cuando cambia un usuario
+@event.listens_for(User, 'after_update')
+def _usuario_actualizado(mapper, connection, target):
+    estado = inspect(target)
+    if estado.attrs.nombre.history.has_changes() or estado.attrs.activo.history.has_changes():
+        estado.session.info.setdefault('principales_modificados', set()).add(target.id)
+
+@event.listens_for(User, 'after_delete')
+def _usuario_eliminado(mapper, connection, target):
+    inspect(target).session.info.setdefault('principales_modificados', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_principales(session):
+    user_ids = session.info.pop('principales_modificados', None)
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            invalidar_principal(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_principales(session):
+    session.info.pop('principales_modificados', None)
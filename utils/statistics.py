@@ -1,174 +1,241 @@
 """
 Utilidades para generar estadísticas del CRM (versión optimizada para Vercel)
 """
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import Counter
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from flask import current_app
-from models import Contacto, Interaccion, db
-from sqlalchemy import func, extract
+from models import Contacto, Etiqueta, UserStatsEtiqueta, UserStatsEmpresa, db, contacto_etiquetas
+from utils import contadores, analitica
+from sqlalchemy import Integer, cast, func, extract, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import load_only, selectinload
 
-def generar_grafico_etiquetas(user_id):
+logger = logging.getLogger('minicrm.estadisticas')
+
+@dataclass
+class EstadisticasDashboard:
+    """Resultado tipado con todas las cifras del dashboard"""
+    total_contactos: int = 0
+    total_interacciones: int = 0
+    contactos_mes: int = 0
+    interacciones_mes: int = 0
+    promedio_interacciones: float = 0
+    top_etiquetas: list = field(default_factory=list)
+    etiquetas: dict = None
+    interacciones_tiempo: dict = None
+    empresas: dict = None
+    
+    def generales(self):
+        """Cifras generales como diccionario (el formato que espera la plantilla del dashboard)"""
+        return {
+            'total_contactos': self.total_contactos,
+            'total_interacciones': self.total_interacciones,
+            'contactos_mes': self.contactos_mes,
+            'interacciones_mes': self.interacciones_mes,
+            'promedio_interacciones': self.promedio_interacciones,
+            'top_etiquetas': self.top_etiquetas
+        }
+
+class DashboardStats:
     """
-    Genera datos de distribución de etiquetas (versión simplificada)
+    Calcula todas las cifras del dashboard con un número fijo de consultas:
+    los totales, empresas y etiquetas salen de los contadores materializados
+    (utils.contadores), la actividad de interacciones de los agregados diarios
+    (utils.analitica) y solo los contactos del mes se cuentan sobre la tabla.
     """
-    try:
-        # Obtener contactos del usuario
-        contactos = Contacto.query.filter_by(user_id=user_id).all()
-        
-        # Recopilar todas las etiquetas
-        todas_etiquetas = []
-        for contacto in contactos:
-            if contacto.get_etiquetas_list():
-                todas_etiquetas.extend(contacto.get_etiquetas_list())
-        
-        if not todas_etiquetas:
-            return None, None
-        
-        # Contar frecuencias
-        contador = Counter(todas_etiquetas)
-        etiquetas_top = contador.most_common(10)
-        
-        if not etiquetas_top:
-            return None, None
-        
-        # Retornar solo los datos, sin gráfico
-        return None, dict(etiquetas_top)
-        
-    except Exception as e:
-        current_app.logger.error(f'Error generando datos de etiquetas: {str(e)}')
-        return None, None
+    CONSULTAS = 5
+    TOP_ETIQUETAS = 10
+    TOP_EMPRESAS = 8
+    DIAS_ACTIVIDAD = 30
+    
+    def __init__(self, user_id):
+        self.user_id = user_id
+    
+    def calcular(self):
+        """Ejecuta las consultas y devuelve un EstadisticasDashboard"""
+        ahora = datetime.now()
+        inicio_mes = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        fecha_limite = ahora - timedelta(days=self.DIAS_ACTIVIDAD)
+        
+        resultado = EstadisticasDashboard()
+        self._totales(resultado)
+        self._contactos_mes(resultado, inicio_mes)
+        self._interacciones_recientes(resultado, inicio_mes, fecha_limite)
+        self._empresas(resultado)
+        self._etiquetas(resultado)
+        
+        if resultado.total_contactos > 0:
+            resultado.promedio_interacciones = round(resultado.total_interacciones / resultado.total_contactos, 1)
+        return resultado
+    
+    def _totales(self, resultado):
+        stats = contadores.leer(self.user_id)
+        resultado.total_contactos = stats.total_contactos
+        resultado.total_interacciones = stats.total_interacciones
+    
+    def _contactos_mes(self, resultado, inicio_mes):
+        resultado.contactos_mes = db.session.query(func.count(Contacto.id))\
+                                            .filter(Contacto.user_id == self.user_id,
+                                                    Contacto.fecha_creacion >= inicio_mes)\
+                                            .scalar() or 0
+    
+    def _interacciones_recientes(self, resultado, inicio_mes, fecha_limite):
+        # Una sola serie diaria cubre el mes en curso y los últimos DIAS_ACTIVIDAD días
+        inicio_mes, fecha_limite = inicio_mes.date(), fecha_limite.date()
+        fin_mes = analitica.siguiente_periodo(inicio_mes, 'mes') - timedelta(days=1)
+        serie = analitica.serie(self.user_id, min(inicio_mes, fecha_limite), fin_mes)
+        
+        resultado.interacciones_mes = sum(cantidad for dia, cantidad in serie if dia >= inicio_mes)
+        
+        activos = [cantidad for dia, cantidad in serie if dia >= fecha_limite and cantidad]
+        total_recientes, dias_activos = sum(activos), len(activos)
+        if dias_activos:
+            resultado.interacciones_tiempo = {
+                'total_interacciones': total_recientes,
+                'dias_activos': dias_activos,
+                'promedio_diario': round(total_recientes / dias_activos, 1)
+            }
+    
+    def _empresas(self, resultado):
+        filas = db.session.query(UserStatsEmpresa.empresa, UserStatsEmpresa.cantidad)\
+                          .filter(UserStatsEmpresa.user_id == self.user_id)\
+                          .all()
+        
+        sin_empresa = sum(fila.cantidad for fila in filas if fila.empresa == '')
+        empresas_ordenadas = sorted(
+            ((fila.empresa, fila.cantidad) for fila in filas if fila.empresa != ''),
+            key=lambda x: x[1], reverse=True
+        )
+        resultado.empresas = _agrupar_empresas(empresas_ordenadas, sin_empresa, self.TOP_EMPRESAS)
+    
+    def _etiquetas(self, resultado):
+        filas = db.session.query(UserStatsEtiqueta.nombre, UserStatsEtiqueta.cantidad)\
+                          .filter(UserStatsEtiqueta.user_id == self.user_id)\
+                          .order_by(UserStatsEtiqueta.cantidad.desc(), UserStatsEtiqueta.nombre)\
+                          .limit(self.TOP_ETIQUETAS)\
+                          .all()
+        etiquetas_top = [(fila.nombre, fila.cantidad) for fila in filas]
+        resultado.top_etiquetas = etiquetas_top[:3]
+        resultado.etiquetas = dict(etiquetas_top) if etiquetas_top else None
+
+def _agrupar_empresas(empresas_ordenadas, sin_empresa, top):
+    """Top de empresas + 'Otras empresas' + 'Sin empresa', o None si no hay datos"""
+    if not empresas_ordenadas and sin_empresa == 0:
+        return None
+    
+    if len(empresas_ordenadas) > top:
+        top_empresas = empresas_ordenadas[:top - 1]
+        otros_total = sum(count for _, count in empresas_ordenadas[top - 1:])
+        top_empresas.append(('Otras empresas', otros_total))
+    else:
+        top_empresas = list(empresas_ordenadas)
+    
+    if sin_empresa > 0:
+        top_empresas.append(('Sin empresa', sin_empresa))
+    
+    return dict(top_empresas)
 
-def generar_grafico_interacciones_tiempo(user_id):
+@dataclass
+class DistribucionContactos:
+    """Distribución de los contactos de un usuario por empresa, etiqueta y mes de alta"""
+    total: int = 0
+    empresas: dict = None
+    etiquetas: list = field(default_factory=list)
+    contactos_por_mes: dict = field(default_factory=dict)
+
+def _contar_columna(columna):
     """
-    Genera datos de interacciones en el tiempo (versión simplificada)
+    {valor: cantidad} de una columna completa, en orden: se ordena una vez y cada
+    valor distinto se cuenta con dos búsquedas binarias, sin visitar en Python
+    cada elemento (todo el trabajo por elemento lo hacen sort y dict.fromkeys)
     """
-    try:
-        # Obtener interacciones de los últimos 30 días
-        fecha_limite = datetime.now() - timedelta(days=30)
-        
-        interacciones = db.session.query(
-            func.date(Interaccion.fecha).label('fecha'),
-            func.count(Interaccion.id).label('cantidad')
-        ).join(Contacto)\
-         .filter(Contacto.user_id == user_id)\
-         .filter(Interaccion.fecha >= fecha_limite)\
-         .group_by(func.date(Interaccion.fecha))\
-         .order_by(func.date(Interaccion.fecha))\
-         .all()
-        
-        if not interacciones:
-            return None
-        
-        # Retornar datos básicos en lugar de gráfico
-        datos = {
-            'total_interacciones': sum(item.cantidad for item in interacciones),
-            'dias_activos': len(interacciones),
-            'promedio_diario': round(sum(item.cantidad for item in interacciones) / len(interacciones), 1)
-        }
-        
-        return datos
-        
-    except Exception as e:
-        current_app.logger.error(f'Error generando datos de interacciones: {str(e)}')
-        return None
+    ordenada = sorted(columna)
+    return {valor: bisect_right(ordenada, valor) - bisect_left(ordenada, valor)
+            for valor in dict.fromkeys(ordenada)}
+
+def _meses(por_indice):
+    """{'AAAA-MM': cantidad} a partir de {año * 12 + mes - 1: cantidad} ordenado"""
+    return {f'{indice // 12:04d}-{indice % 12 + 1:02d}': cantidad for indice, cantidad in por_indice.items()}
 
-def generar_grafico_contactos_empresa(user_id):
+def _resumir(total, empresas_crudas, etiquetas, meses, top_empresas, top_etiquetas):
+    """Arma la DistribucionContactos a partir de los conteos crudos de cada camino"""
+    empresas = Counter()
+    for empresa, cantidad in empresas_crudas.items():
+        # Se normaliza una vez por valor distinto, no una vez por contacto
+        empresas[contadores.clave_empresa(empresa)] += cantidad
+    sin_empresa = empresas.pop('', 0)
+    empresas_ordenadas = sorted(empresas.items(), key=lambda x: (-x[1], x[0]))
+    return DistribucionContactos(
+        total=total,
+        empresas=_agrupar_empresas(empresas_ordenadas, sin_empresa, top_empresas),
+        etiquetas=sorted(etiquetas.items(), key=lambda x: (-x[1], x[0]))[:top_etiquetas],
+        contactos_por_mes=meses,
+    )
+
+def _distribucion_columnar(user_id, top_empresas, top_etiquetas):
     """
-    Genera datos de distribución por empresa (versión simplificada)
+    Camino columnar: cada columna (empresa, índice de mes de alta calculado en
+    la base, id de etiqueta) llega como un vector plano en su propia consulta,
+    sin tuplas por fila ni objetos del ORM, y se cuenta completa con _contar_columna
     """
-    try:
-        # Obtener contactos agrupados por empresa
-        contactos = Contacto.query.filter_by(user_id=user_id).all()
-        
-        empresas = {}
-        sin_empresa = 0
-        
-        for contacto in contactos:
-            if contacto.empresa and contacto.empresa.strip():
-                empresa = contacto.empresa.strip()
-                empresas[empresa] = empresas.get(empresa, 0) + 1
-            else:
-                sin_empresa += 1
-        
-        if not empresas and sin_empresa == 0:
-            return None
-        
-        # Preparar datos (top 8 empresas + otros)
-        empresas_ordenadas = sorted(empresas.items(), key=lambda x: x[1], reverse=True)
-        
-        if len(empresas_ordenadas) > 8:
-            top_empresas = empresas_ordenadas[:7]
-            otros_total = sum(count for _, count in empresas_ordenadas[7:])
-            top_empresas.append(('Otras empresas', otros_total))
-        else:
-            top_empresas = empresas_ordenadas
-        
-        if sin_empresa > 0:
-            top_empresas.append(('Sin empresa', sin_empresa))
-        
-        # Retornar datos en lugar de gráfico
-        return dict(top_empresas)
-        
-    except Exception as e:
-        current_app.logger.error(f'Error generando datos de empresas: {str(e)}')
-        return None
+    contactos = Contacto.__table__
+    del_usuario = contactos.c.user_id == user_id
+    empresas = db.session.execute(
+        select(func.coalesce(contactos.c.empresa, '')).where(del_usuario)
+    ).scalars().all()
+    fecha = contactos.c.fecha_creacion
+    meses = array('l', db.session.execute(
+        select(cast(extract('year', fecha) * 12 + extract('month', fecha) - 1, Integer))
+        .where(del_usuario, fecha.isnot(None))
+    ).scalars())
+    ids_etiquetas = array('l', db.session.execute(
+        select(contacto_etiquetas.c.etiqueta_id)
+        .join(contactos, contactos.c.id == contacto_etiquetas.c.contacto_id)
+        .where(del_usuario)
+    ).scalars())
+
+    por_id = _contar_columna(ids_etiquetas)
+    nombres = dict(db.session.execute(
+        select(Etiqueta.id, Etiqueta.nombre).where(Etiqueta.user_id == user_id)
+    ).all()) if por_id else {}
+    etiquetas = {nombres[etiqueta_id]: cantidad for etiqueta_id, cantidad in por_id.items()}
+
+    return _resumir(len(empresas), _contar_columna(empresas), etiquetas, _meses(_contar_columna(meses)),
+                    top_empresas, top_etiquetas)
+
+def _distribucion_orm(user_id, top_empresas, top_etiquetas):
+    """Camino de referencia: recorre los contactos como objetos del ORM"""
+    contactos = Contacto.query.filter_by(user_id=user_id)\
+                              .options(load_only(Contacto.empresa, Contacto.fecha_creacion),
+                                       selectinload(Contacto.etiquetas))\
+                              .all()
+    empresas, etiquetas, meses = Counter(), Counter(), Counter()
+    for contacto in contactos:
+        empresas[contacto.empresa] += 1
+        etiquetas.update(etiqueta.nombre for etiqueta in contacto.etiquetas)
+        if contacto.fecha_creacion is not None:
+            meses[contacto.fecha_creacion.year * 12 + contacto.fecha_creacion.month - 1] += 1
+    return _resumir(len(contactos), empresas, etiquetas, _meses(dict(sorted(meses.items()))),
+                    top_empresas, top_etiquetas)
 
-def obtener_estadisticas_generales(user_id):
+def distribucion_contactos(user_id, top_empresas=8, top_etiquetas=10, columnar=None):
     """
-    Obtiene estadísticas generales del usuario
+    Distribución de los contactos del usuario. Usa el camino columnar salvo que
+    STATS_COLUMNAR esté desactivado (o columnar=False); si sus consultas fallan
+    (por ejemplo, una expresión que la base no soporta) recurre al ORM.
     """
-    try:
-        # Estadísticas básicas
-        total_contactos = Contacto.query.filter_by(user_id=user_id).count()
-        
-        total_interacciones = db.session.query(func.count(Interaccion.id))\
-                                       .join(Contacto)\
-                                       .filter(Contacto.user_id == user_id)\
-                                       .scalar()
-        
-        # Contactos agregados este mes
-        inicio_mes = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        contactos_mes = Contacto.query.filter(
-            Contacto.user_id == user_id,
-            Contacto.fecha_creacion >= inicio_mes
-        ).count()
-        
-        # Interacciones este mes
-        interacciones_mes = db.session.query(func.count(Interaccion.id))\
-                                     .join(Contacto)\
-                                     .filter(
-                                         Contacto.user_id == user_id,
-                                         Interaccion.fecha >= inicio_mes
-                                     ).scalar()
-        
-        # Promedio de interacciones por contacto
-        promedio_interacciones = round(total_interacciones / total_contactos, 1) if total_contactos > 0 else 0
-        
-        # Top 3 etiquetas
-        contactos = Contacto.query.filter_by(user_id=user_id).all()
-        todas_etiquetas = []
-        for contacto in contactos:
-            if contacto.get_etiquetas_list():
-                todas_etiquetas.extend(contacto.get_etiquetas_list())
-        
-        top_etiquetas = Counter(todas_etiquetas).most_common(3) if todas_etiquetas else []
-        
-        return {
-            'total_contactos': total_contactos,
-            'total_interacciones': total_interacciones,
-            'contactos_mes': contactos_mes,
-            'interacciones_mes': interacciones_mes,
-            'promedio_interacciones': promedio_interacciones,
-            'top_etiquetas': top_etiquetas
-        }
-        
-    except Exception as e:
-        current_app.logger.error(f'Error obteniendo estadísticas generales: {str(e)}')
-        return {
-            'total_contactos': 0,
-            'total_interacciones': 0,
-            'contactos_mes': 0,
-            'interacciones_mes': 0,
-            'promedio_interacciones': 0,
-            'top_etiquetas': []
-        }
\ No newline at end of file
+    if columnar is None:
+        columnar = current_app.config.get('STATS_COLUMNAR', True)
+    if columnar:
+        try:
+            # Un savepoint: en PostgreSQL un error deja abortada toda la transacción
+            with db.session.begin_nested():
+                return _distribucion_columnar(user_id, top_empresas, top_etiquetas)
+        except (SQLAlchemyError, TypeError) as error:
+            logger.warning('Distribución columnar no disponible, se usa el ORM',
+                           extra={'campos': {'user_id': user_id, 'error': repr(error)}})
+    return _distribucion_orm(user_id, top_empresas, top_etiquetas)
@@ -0,0 +1,387 @@
+"""
+Trabajos en segundo plano con la cola en la base de datos (tabla trabajos).
+
+La petición web encola el trabajo (encolar) y responde enseguida; un worker
+(`flask --app app jobs worker` o `python worker.py`) reclama el siguiente
+pendiente, lo ejecuta e informa el avance en la misma fila, que la interfaz
+consulta en /api/v1/trabajos/<id>. Los workers escalan aparte de los procesos web.
+
+- Reclamo: SELECT ... FOR UPDATE SKIP LOCKED en PostgreSQL más un UPDATE
+  condicionado al estado, así dos workers nunca toman el mismo trabajo.
+- Reintentos: un trabajo que falla vuelve a pendiente con espera exponencial
+  (JOBS_BACKOFF_SECONDS × 2^(intento-1), hasta JOBS_BACKOFF_MAX) hasta
+  agotar max_intentos. ErrorPermanente no se reintenta.
+- Latido: cada reporte de avance renueva `latido`; un trabajo en curso sin
+  latido durante JOBS_LEASE_SECONDS (worker caído) se vuelve a reclamar.
+
+Con JOBS_ENABLED desactivado (sin workers, p. ej. en Vercel) el trabajo se
+ejecuta en la misma petición que lo encola, con un solo intento.
+
+Los archivos que procesa un trabajo (importaciones) no viajan en la fila: se
+guardan en JOBS_UPLOAD_DIR (guardar_adjunto) y los parámetros llevan solo el
+nombre. La tarea los lee como flujo y los borra al terminar o fallar del todo.
+"""
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, and_, update
+from models import db, Trabajo, User
+
+logger = logging.getLogger('minicrm.trabajos')
+
+TAREAS = {}
+LARGO_ERROR = 4000
+
+class ErrorPermanente(Exception):
+    """El trabajo no puede completarse: no se reintenta"""
+
+def tarea(nombre, max_intentos=None):
+    """Registra la función que ejecuta los trabajos de tipo `nombre`"""
+    def registrar(funcion):
+        TAREAS[nombre] = (funcion, max_intentos)
+        return funcion
+    return registrar
+
+def _ahora():
+    return datetime.utcnow()
+
+def _config(clave, default):
+    return current_app.config.get(clave, default)
+
+def identificador_worker():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def _directorio_adjuntos():
+    directorio = _config('JOBS_UPLOAD_DIR', None)
+    if not directorio:
+        raise ErrorPermanente('JOBS_UPLOAD_DIR no está configurado')
+    return directorio
+
+def guardar_adjunto(flujo, sufijo=''):
+    """
+    Copia el flujo binario `flujo` (p. ej. un archivo subido) a JOBS_UPLOAD_DIR
+    por bloques y devuelve el nombre con que referenciarlo en los parámetros
+    """
+    directorio = _directorio_adjuntos()
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f'{uuid.uuid4().hex}{sufijo}'
+    with open(os.path.join(directorio, nombre), 'xb') as destino:
+        shutil.copyfileobj(flujo, destino)
+    return nombre
+
+def ruta_adjunto(nombre):
+    """Ruta del adjunto `nombre`; solo nombres creados por guardar_adjunto"""
+    if not nombre or os.path.basename(nombre) != nombre:
+        raise ErrorPermanente('El trabajo no tiene un archivo válido')
+    return os.path.join(_directorio_adjuntos(), nombre)
+
+def borrar_adjunto(nombre):
+    try:
+        os.remove(ruta_adjunto(nombre))
+    except (OSError, ErrorPermanente):
+        pass
+
+def encolar(tipo, user_id=None, parametros=None, max_intentos=None):
+    """Crea un trabajo pendiente (hace commit); sin workers lo ejecuta en el acto"""
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    en_linea = not _config('JOBS_ENABLED', False)
+    if en_linea:
+        max_intentos = 1
+    elif max_intentos is None:
+        max_intentos = TAREAS[tipo][1] or _config('JOBS_MAX_ATTEMPTS', 3)
+
+    trabajo = Trabajo(tipo=tipo, user_id=user_id, parametros=parametros or {},
+                      estado=Trabajo.PENDIENTE, max_intentos=max_intentos, intentos=0, progreso=0,
+                      disponible_en=_ahora())
+    db.session.add(trabajo)
+    db.session.commit()
+    logger.info('Trabajo encolado', extra={'campos': {'trabajo': trabajo.id, 'tipo': tipo}})
+
+    if en_linea:
+        trabajo = _tomar(trabajo.id, Trabajo.PENDIENTE, 'en-linea')
+        if trabajo is not None:
+            procesar(trabajo)
+    return trabajo
+
+def _tomar(trabajo_id, estado, worker):
+    """UPDATE condicionado al estado: None si otro worker lo tomó antes"""
+    ahora = _ahora()
+    tomado = db.session.execute(
+        update(Trabajo)
+        .where(Trabajo.id == trabajo_id, Trabajo.estado == estado)
+        .values(estado=Trabajo.EN_CURSO, worker=worker, latido=ahora, fecha_inicio=ahora,
+                intentos=Trabajo.intentos + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if tomado != 1:
+        return None
+    trabajo = db.session.get(Trabajo, trabajo_id)
+    db.session.refresh(trabajo)
+    return trabajo
+
+def reclamar(worker=None):
+    """Toma el próximo trabajo disponible (o uno en curso sin latido), o None"""
+    ahora = _ahora()
+    vencido = ahora - timedelta(seconds=_config('JOBS_LEASE_SECONDS', 300))
+    candidato = db.session.query(Trabajo.id, Trabajo.estado)\
+                          .filter(or_(and_(Trabajo.estado == Trabajo.PENDIENTE, Trabajo.disponible_en <= ahora),
+                                      and_(Trabajo.estado == Trabajo.EN_CURSO, Trabajo.latido < vencido)))\
+                          .order_by(Trabajo.disponible_en, Trabajo.id)\
+                          .limit(1)\
+                          .with_for_update(skip_locked=True)\
+                          .first()
+    if candidato is None:
+        db.session.commit()
+        return None
+    return _tomar(candidato.id, candidato.estado, worker or identificador_worker())
+
+def reportar(trabajo, progreso, total=None, mensaje=None, resultado=None):
+    """Guarda el avance y renueva el latido (hace commit: llamar entre transacciones)"""
+    trabajo.progreso = progreso
+    if total is not None:
+        trabajo.total = total
+    if mensaje is not None:
+        trabajo.mensaje = mensaje[:255]
+    if resultado is not None:
+        trabajo.resultado = resultado
+    trabajo.latido = _ahora()
+    db.session.commit()
+
+def espera_reintento(intentos):
+    """Segundos hasta el próximo intento: exponencial con un 10% de variación"""
+    base = _config('JOBS_BACKOFF_SECONDS', 10)
+    segundos = min(base * 2 ** max(intentos - 1, 0), _config('JOBS_BACKOFF_MAX', 600))
+    return segundos * random.uniform(0.9, 1.1)
+
+def procesar(trabajo):
+    """Ejecuta un trabajo ya reclamado y registra el resultado o el fallo"""
+    funcion, _ = TAREAS.get(trabajo.tipo, (None, None))
+    inicio = time.perf_counter()
+    campos = {'trabajo': trabajo.id, 'tipo': trabajo.tipo, 'intento': trabajo.intentos}
+    try:
+        if funcion is None:
+            raise ErrorPermanente(f'Tipo de trabajo desconocido: {trabajo.tipo}')
+        if trabajo.intentos > trabajo.max_intentos:
+            # Reclamado por falta de latido después del último intento permitido
+            raise ErrorPermanente('El worker dejó de responder y se agotaron los intentos')
+        resultado = funcion(trabajo)
+    except Exception as e:
+        db.session.rollback()
+        permanente = isinstance(e, ErrorPermanente)
+        trabajo.error = (str(e) if permanente else traceback.format_exc())[-LARGO_ERROR:]
+        trabajo.mensaje = str(e)[:255]
+        if not permanente and trabajo.intentos < trabajo.max_intentos:
+            espera = espera_reintento(trabajo.intentos)
+            trabajo.estado = Trabajo.PENDIENTE
+            trabajo.disponible_en = _ahora() + timedelta(seconds=espera)
+            logger.warning('Trabajo falló, se reintentará', extra={'campos': {
+                **campos, 'espera_s': round(espera, 1), 'error': str(e)}})
+        else:
+            trabajo.estado = Trabajo.FALLIDO
+            trabajo.fecha_fin = _ahora()
+            logger.error('Trabajo fallido', extra={'campos': {**campos, 'error': str(e)}})
+        db.session.commit()
+        return trabajo
+
+    trabajo.estado = Trabajo.TERMINADO
+    trabajo.resultado = resultado if resultado is not None else trabajo.resultado
+    trabajo.error = None
+    trabajo.fecha_fin = _ahora()
+    db.session.commit()
+    logger.info('Trabajo terminado', extra={'campos': {
+        **campos, 'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1)}})
+    return trabajo
+
+def trabajar(app, intervalo=None, una_vez=False, max_trabajos=None):
+    """
+    Bucle del worker: reclama y procesa trabajos hasta recibir SIGTERM/SIGINT
+    (termina el trabajo en curso antes de salir). Devuelve los trabajos procesados.
+    """
+    detener = False
+
+    def al_recibir_senal(signum, frame):
+        nonlocal detener
+        detener = True
+
+    anteriores = {senal: signal.signal(senal, al_recibir_senal) for senal in (signal.SIGTERM, signal.SIGINT)}
+    worker = identificador_worker()
+    procesados = 0
+    with app.app_context():
+        intervalo = intervalo or app.config.get('JOBS_POLL_SECONDS', 2)
+        logger.info('Worker iniciado', extra={'campos': {'worker': worker}})
+        try:
+            while not detener:
+                trabajo = reclamar(worker)
+                if trabajo is None:
+                    if una_vez:
+                        break
+                    time.sleep(intervalo)
+                    continue
+                procesar(trabajo)
+                db.session.remove()
+                procesados += 1
+                if max_trabajos and procesados >= max_trabajos:
+                    break
+        finally:
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
+            logger.info('Worker detenido', extra={'campos': {'worker': worker, 'procesados': procesados}})
+    return procesados
+
+# Tareas
+
+@tarea('importar')
+def _importar(trabajo):
+    """
+    Importación de contactos o interacciones desde el adjunto `parametros['adjunto']`,
+    leído como flujo; se reanuda desde el último lote guardado
+    """
+    from utils.importacion import importar, ResultadoImportacion, ErrorImportacion
+
+    parametros = trabajo.parametros or {}
+    adjunto = parametros.get('adjunto')
+    previo = ResultadoImportacion.desde_dict(trabajo.resultado)
+
+    def progreso(resultado):
+        reportar(trabajo, resultado.leidas, mensaje=resultado.resumen(), resultado=resultado.como_dict())
+
+    try:
+        try:
+            with open(ruta_adjunto(adjunto), encoding='utf-8-sig', newline='') as texto:
+                resultado = importar(trabajo.user_id, texto, parametros.get('formato'),
+                                     tipo=parametros.get('tipo', 'contactos'), progreso=progreso,
+                                     resultado=previo)
+        except FileNotFoundError:
+            raise ErrorPermanente('El archivo subido ya no está disponible')
+        except ErrorImportacion as e:
+            raise ErrorPermanente(str(e))
+        except UnicodeDecodeError:
+            raise ErrorPermanente('El archivo debe estar codificado en UTF-8')
+    except Exception as e:
+        # El archivo se conserva mientras queden reintentos
+        if isinstance(e, ErrorPermanente) or trabajo.intentos >= trabajo.max_intentos:
+            borrar_adjunto(adjunto)
+        raise
+    borrar_adjunto(adjunto)
+    trabajo.mensaje = resultado.resumen()
+    return resultado.como_dict()
+
+@tarea('reconstruir_estadisticas')
+def _reconstruir_estadisticas(trabajo):
+    """`flask stats rebuild` como trabajo: un commit por usuario"""
+    from utils.contadores import reconstruir
+    from utils.cache import cache
+
+    user_id = (trabajo.parametros or {}).get('user_id') or trabajo.user_id
+    if user_id:
+        user_ids = [user_id]
+    else:
+        user_ids = [fila.id for fila in db.session.query(User.id).order_by(User.id)]
+
+    con_drift = 0
+    for numero, uid in enumerate(user_ids, start=1):
+        if reconstruir(uid):
+            con_drift += 1
+        db.session.commit()
+        cache.invalidar_usuario(uid)
+        reportar(trabajo, numero, total=len(user_ids))
+    trabajo.mensaje = f'{len(user_ids)} usuarios reconstruidos, {con_drift} con diferencias'
+    return {'usuarios': len(user_ids), 'con_diferencias': con_drift}
+
+@tarea('reconstruir_analitica')
+def _reconstruir_analitica(trabajo):
+    """`flask analytics rebuild` como trabajo: un commit por usuario"""
+    from utils import analitica
+
+    user_id = (trabajo.parametros or {}).get('user_id') or trabajo.user_id
+    if user_id:
+        user_ids = [user_id]
+    else:
+        user_ids = [fila.id for fila in db.session.query(User.id).order_by(User.id)]
+
+    total = 0
+    for numero, uid in enumerate(user_ids, start=1):
+        total += analitica.reconstruir(uid)
+        db.session.commit()
+        reportar(trabajo, numero, total=len(user_ids))
+    trabajo.mensaje = f'{len(user_ids)} usuarios reconstruidos ({total} interacciones)'
+    return {'usuarios': len(user_ids), 'interacciones': total}
+
+@tarea('migrar_etiquetas')
+def _migrar_etiquetas(trabajo):
+    """Migración de la columna legacy contactos.etiquetas; un reintento sigue desde el último lote"""
+    from migrate_tags import migrar_etiquetas
+
+    parametros = trabajo.parametros or {}
+    resultado = migrar_etiquetas(lote=int(parametros.get('lote', 1000)),
+                                 progreso=lambda avance: reportar(trabajo, avance.leidas, mensaje=avance.resumen()))
+    if resultado is None:
+        trabajo.mensaje = 'La columna contactos.etiquetas no existe: nada que migrar'
+        return {}
+    trabajo.progreso = resultado.leidas
+    trabajo.mensaje = resultado.resumen()
+    return {'leidas': resultado.leidas, 'modificadas': resultado.modificadas}
+
+# Comandos CLI
+
+@click.group('jobs')
+def jobs_cli():
+    """Cola de trabajos en segundo plano"""
+
+@jobs_cli.command('worker')
+@click.option('--intervalo', type=float, default=None, help='Segundos entre consultas con la cola vacía')
+@click.option('--una-vez', is_flag=True, help='Procesar lo pendiente y salir')
+@click.option('--max-trabajos', type=int, default=None, help='Salir después de N trabajos')
+@with_appcontext
+def worker_command(intervalo, una_vez, max_trabajos):
+    """Procesa trabajos de la cola hasta recibir SIGTERM"""
+    procesados = trabajar(current_app._get_current_object(), intervalo, una_vez, max_trabajos)
+    click.echo(f'✓ {procesados} trabajos procesados')
+
+@jobs_cli.command('enqueue')
+@click.argument('tipo', type=click.Choice(sorted(TAREAS)))
+@click.option('--usuario', default=None, help='Email del usuario dueño del trabajo')
+@click.option('--param', 'parametros', multiple=True, help='Parámetro clave=valor (repetible)')
+@with_appcontext
+def enqueue_command(tipo, usuario, parametros):
+    """Encola un trabajo"""
+    user_id = None
+    if usuario:
+        user = User.query.filter_by(email=usuario).first()
+        if user is None:
+            raise click.ClickException(f'No existe el usuario {usuario}')
+        user_id = user.id
+    try:
+        valores = dict(parametro.split('=', 1) for parametro in parametros)
+    except ValueError:
+        raise click.ClickException('Los parámetros van como clave=valor')
+    trabajo = encolar(tipo, user_id=user_id, parametros=valores)
+    click.echo(f'✓ Trabajo {trabajo.id} ({trabajo.estado})')
+
+@jobs_cli.command('list')
+@click.option('--estado', type=click.Choice([Trabajo.PENDIENTE, Trabajo.EN_CURSO, Trabajo.TERMINADO,
+                                             Trabajo.FALLIDO]), default=None)
+@click.option('--limite', type=int, default=20, show_default=True)
+@with_appcontext
+def list_command(estado, limite):
+    """Muestra los últimos trabajos"""
+    query = Trabajo.query.order_by(Trabajo.id.desc())
+    if estado:
+        query = query.filter_by(estado=estado)
+    for trabajo in query.limit(limite):
+        avance = f'{trabajo.progreso}/{trabajo.total}' if trabajo.total else str(trabajo.progreso)
+        click.echo(f'{trabajo.id:>6} {trabajo.tipo:<26} {trabajo.estado:<10} '
+                   f'intento {trabajo.intentos}/{trabajo.max_intentos} avance {avance} '
+                   f'{trabajo.mensaje or ""}')
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker de trabajos en segundo plano para Mini CRM Personal
+
+Reclama trabajos de la tabla trabajos (importaciones, reconstrucción de
+estadísticas, migración de etiquetas) y los ejecuta; se detiene con SIGTERM
+después de terminar el trabajo en curso. Equivale a `flask --app app jobs worker`.
+Requiere JOBS_ENABLED=1 en los procesos web para que encolen en lugar de
+ejecutar en la petición.
+
+Uso:
+    python worker.py [--config production] [--intervalo 2] [--una-vez]
+"""
+
+import argparse
+from app import create_app
+from utils.trabajos import trabajar
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker de trabajos en segundo plano')
+    parser.add_argument('--config', default='production',
+                        help='Configuración de la app (development, production...)')
+    parser.add_argument('--intervalo', type=float, default=None,
+                        help='Segundos entre consultas con la cola vacía (JOBS_POLL_SECONDS)')
+    parser.add_argument('--una-vez', action='store_true',
+                        help='Procesar lo pendiente y salir')
+    parser.add_argument('--max-trabajos', type=int, default=None,
+                        help='Salir después de N trabajos (para reciclar el proceso)')
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    procesados = trabajar(app, args.intervalo, args.una_vez, args.max_trabajos)
+    print(f'✓ {procesados} trabajos procesados')
+
+if __name__ == '__main__':
+    main()